@@ -1,14 +1,25 @@
-import requests
-import re
-import openai
 import os
 import threading
 import time
-import tempfile
-from deepgram import DeepgramClient, LiveTranscriptionEvents, LiveOptions, Microphone
-import pygame
+from deepgram import LiveTranscriptionEvents, LiveOptions, Microphone
+from audio_player import AudioPlayer
 from dotenv import load_dotenv
 import speech_recognition as sr
+import provider_client
+from llm_providers import make_router
+from session_store import make_session_store
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
+from tts_cache import TTSCache
+from barge_in import BargeInController
+from turn_worker import TurnWorker
+from speculative import SpeculativePrefetch
+from console_turn import ConsoleReplies, segment_text_by_sentence
+from tracing import Tracer, metrics, serve_metrics
+from keyword_spotter import load_spotter
+from knowledge_fastpath import make_fast_path
+from wake_word import LocalWakeWordDetector
 
 # Force load environment variables from .env file, overriding system variables
 load_dotenv(override=True)
@@ -28,99 +39,110 @@ if not OPENAI_API_KEY or OPENAI_API_KEY == 'openai-api-key' or len(OPENAI_API_KE
 print(f"✅ API Keys loaded: Deepgram ({len(DEEPGRAM_API_KEY)} chars), OpenAI ({len(OPENAI_API_KEY)} chars)")
 
 # Initialize clients
-dg_client = DeepgramClient(api_key=DEEPGRAM_API_KEY)
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+dg_client = provider_client.make_deepgram_client(DEEPGRAM_API_KEY)
+client = provider_client.make_openai_client(OPENAI_API_KEY)
 
-DEEPGRAM_TTS_URL = 'https://api.deepgram.com/v1/speak?model=aura-helios-en'
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
+
+DEEPGRAM_TTS_MODEL = 'aura-helios-en'
+DEEPGRAM_TTS_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model={DEEPGRAM_TTS_MODEL}'
 headers = {
     "Authorization": f"Token {DEEPGRAM_API_KEY}",
     "Content-Type": "application/json"
 }
 
-conversation_memory = []
+# Bounded conversation history for the local caller
+sessions = make_session_store()
+LOCAL_SESSION_ID = "local"
 
-# Global flags
-mute_microphone = threading.Event()
-wake_word_detected = threading.Event()
-is_in_conversation = False
-
-prompt = """##Objective
-You are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible
+# Prompt stays within CONTEXT_MAX_TOKENS; older turns are folded into a summary
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(client))
 
-## Role
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
 
-Personality: Your name is James and you are a receptionist in AI restaurant. Maintain a pleasant and friendly demeanor throughout all interactions. This approach helps in building a positive rapport with customers and colleagues, ensuring effective and enjoyable communication.
+# Audio device stays open for the whole session
+player = AudioPlayer()
 
-Task: As a receptionist for a restaurant, your tasks include table reservation which involves asking customers their preferred date and time to visit restaurant and asking number of people who will come. Once confirm by customer. end up saying that your table has been reserved, we are looking forward to assist you.
+# Caller speech during a reply stops playback and cancels the rest of the turn (BARGE_IN in .env)
+barge_in = BargeInController(player)
 
-You are also responsible for taking orders related to menu items given below. Menu items has name, available quantity & its price per item. You have to refer to these menu items & their prices while placing the order. Follow these steps to get the order & confirm it:
+# Stream the LLM reply into TTS sentence by sentence (set STREAMING_TTS=false for the old batch mode)
+STREAMING_TTS = os.getenv('STREAMING_TTS', 'true').lower() != 'false'
 
-1. Let customer select the item, if selected item has a variation like size or quantity, get it confirm. Add items to order as per customers choice. Also while adding item say the total itemised price and then move ahead.
-2. You have to repeat each item along with its price & quantity to get the order confirm from customer. Make sure you mention itemised value and then a total order value.
-3. You have to mention total order value by adding each item value from order. Don’t add any more cost to the item price or total order value as all the items are inclusive of taxes.
-4. it is mandatory for you to repeat the order and the itemised price with the customer confirming the order
-5. Ask customer for their delivery address.
-6. once address is received then say that order will be delivered in 30 to 45 min
-Menu Items [name (available quantity) - price]:
-Appetizers:
+# Maximum number of sentences synthesized concurrently
+TTS_MAX_WORKERS = int(os.getenv('TTS_MAX_WORKERS', '4'))
 
-1. Roast Pork Egg Roll (3pcs) - $5.25
-2. Vegetable Spring Roll (3pcs) - $5.25
-3. Chicken Egg Roll (3pcs) - $5.25
-4. BBQ Chicken - $7.75
+ACTIVATION_TEXT = "Hello! I'm James, how can I help you today?"
 
-Conversational Style: Your communication style should be proactive and lead the conversation, asking targeted questions to better understand customer needs. Ensure your responses are concise, clear, and maintain a conversational tone. If there’s no initial response, continue engaging with relevant questions to gain clarity on their requirements. Keep your prose succinct and to the point.
+# FAQ questions found in the knowledge base (KNOWLEDGE_DB) are answered without the LLM
+fast_path = make_fast_path(menu=orders.menu)
 
-## Response Guideline
+# On-device wake word when samples are enrolled (python keyword_spotter.py enroll);
+# otherwise, or with WAKE_WORD_ENGINE=cloud, phrases go to Google speech recognition
+wake_spotter = load_spotter()
 
-- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say, then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn't catch that", "some noise", "pardon", "you're coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don't repeat yourself.
-- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don't repeat yourself in doing this. You should still be creative, human-like, and lively.
-- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.
-## Style Guardrails
+# Global flags
+mute_microphone = threading.Event()
+wake_word_detected = threading.Event()
+is_in_conversation = False
 
-- [Be concise] Keep your response succinct, short, and get to the point quickly. Address one question or action item at a time. Don't pack everything you want to say into one utterance.
-- [Do not repeat] Don't repeat what's in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.
-- [Be conversational] Speak like a human as though you're speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.
-- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don't be a pushover.
-- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step."""
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
 
-def segment_text_by_sentence(text):
-    sentence_boundaries = re.finditer(r'(?<=[.!?])\s+', text)
-    boundaries_indices = [boundary.start() for boundary in sentence_boundaries]
+def synthesize_audio(text):
+    payload = {"text": text}
+    with metrics.time('tts', 'deepgram'):
+        with provider_client.post(DEEPGRAM_TTS_URL, stream=True, headers=headers, json=payload) as r:
+            r.raise_for_status()
+            return r.content
 
-    segments = []
-    start = 0
-    for boundary_index in boundaries_indices:
-        segments.append(text[start:boundary_index + 1].strip())
-        start = boundary_index + 1
-    segments.append(text[start:].strip())
+# Cached TTS front end: fixed phrases and repeated replies skip Deepgram
+tts_cache = TTSCache(synthesize_audio, model=DEEPGRAM_TTS_MODEL)
 
-    return segments
+# Per-turn timelines (speech final -> LLM -> TTS -> playback), written to TRACE_FILE
+tracer = Tracer()
+metrics.register('llm', llm.stats)
+metrics.register('tts_cache', tts_cache.stats)
+metrics.register('knowledge', fast_path.stats)
 
-def synthesize_audio(text):
-    payload = {"text": text}
-    with requests.post(DEEPGRAM_TTS_URL, stream=True, headers=headers, json=payload) as r:
-        return r.content
 
+# Reply half of each turn: knowledge fast path, history, order tools, LLM and pipelined TTS
+replies = ConsoleReplies(llm, orders, fast_path, context_manager, prompt, tts_cache.synthesize, player,
+                         barge_in=barge_in, streamed=STREAMING_TTS, max_workers=TTS_MAX_WORKERS)
 
-def play_audio(file_path):
-    pygame.mixer.init()
-    pygame.mixer.music.load(file_path)
-    pygame.mixer.music.play()
 
-    while pygame.mixer.music.get_busy():
-        pygame.time.Clock().tick(10)
+def build_speculative_messages(text):
+    """Messages for a turn the caller hasn't finished yet; history is not touched"""
+    return replies.speculative_messages(LOCAL_SESSION_ID, text)
 
-    # Stop the mixer and release resources
-    pygame.mixer.music.stop()
-    pygame.mixer.quit()
 
-    # Signal that playback is finished
-    mute_microphone.clear()
+def local_wake_word_listener():
+    """Block until the on-device spotter hears the wake word; False if it could not start"""
+    heard = threading.Event()
+    detector = LocalWakeWordDetector(heard.set, spotter=wake_spotter)
+    detector.start_listening()
+    if not detector.is_listening:
+        return False
+    
+    heard.wait()
+    detector.stop_listening()
+    
+    audio_data = tts_cache.synthesize(ACTIVATION_TEXT)
+    player.play(audio_data)
+    wake_word_detected.set()
+    return True
 
 
 def wake_word_listener():
     """Simple wake word detection using speech recognition"""
+    if wake_spotter is not None and local_wake_word_listener():
+        return
+    
     print("🎤 Wake word detection started. Say 'Hey James' or 'James' to activate!")
     
     recognizer = sr.Recognizer()
@@ -151,14 +173,8 @@ def wake_word_listener():
                         print(f"🎯 Wake word detected: '{wake_word}'!")
                         
                         # Play activation sound or response
-                        activation_text = "Hello! I'm James, how can I help you today?"
-                        audio_data = synthesize_audio(activation_text)
-                        
-                        # Save and play activation response
-                        with open("activation.mp3", "wb") as f:
-                            f.write(audio_data)
-                        play_audio("activation.mp3")
-                        os.remove("activation.mp3")
+                        audio_data = tts_cache.synthesize(ACTIVATION_TEXT)
+                        player.play(audio_data)
                         
                         # Signal wake word detected
                         wake_word_detected.set()
@@ -181,6 +197,10 @@ def wake_word_listener():
 
 def main():
     global is_in_conversation
+
+    knowledge_sentences = [sentence for answer in fast_path.answers() for sentence in segment_text_by_sentence(answer)]
+    tts_cache.prewarm([ACTIVATION_TEXT] + knowledge_sentences)
+    serve_metrics()
     
     # Start with wake word detection
     while True:
@@ -205,6 +225,7 @@ def main():
             
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
+            player.close()
             break
         except Exception as e:
             print(f"❌ Error in main loop: {e}")
@@ -214,16 +235,58 @@ def main():
 def start_conversation():
     """Start the main conversation system after wake word detection"""
     try:
-        deepgram = DeepgramClient(DEEPGRAM_API_KEY)
+        deepgram = provider_client.make_deepgram_client(DEEPGRAM_API_KEY)
         dg_connection = deepgram.listen.websocket.v("1")
 
         is_finals = []
+        speech_final_at = None
+
+        def process_turn(utterance, cancelled):
+            # Timeline starts at the speech final that completed this turn
+            turn = tracer.start_turn(LOCAL_SESSION_ID, started=speech_final_at, words=len(utterance.split()))
+            turn.mark('turn_start')
+            # Keep what the caller said even if a newer utterance already superseded this turn
+            sessions.append(LOCAL_SESSION_ID, "user", utterance)
+            answer, messages, speculation = replies.prepare(LOCAL_SESSION_ID, utterance, turn, prefetch.take(utterance))
+            if cancelled.is_set():
+                if speculation is not None:
+                    speculation.close()
+                turn.finish(cancelled=True)
+                return
+
+            # Without barge-in, mute the microphone while James is speaking
+            if not barge_in.enabled:
+                mute_microphone.set()
+                microphone.mute()
+            try:
+                processed_text = replies.speak(LOCAL_SESSION_ID, answer, messages, cancelled, turn, speculation)
+                if processed_text:
+                    sessions.append(LOCAL_SESSION_ID, "assistant", processed_text)
+            except Exception as e:
+                print(f"❌ Turn error: {e}")
+                turn.set(error=str(e))
+            finally:
+                turn.finish(cancelled=cancelled.is_set())
+                barge_in.end_turn(cancelled)
+                if not barge_in.enabled:
+                    time.sleep(0.5)
+                    microphone.unmute()
+                    mute_microphone.clear()
+
+        # Turns run on one worker thread; this receive thread only enqueues utterances
+        turns = TurnWorker(process_turn)
+        metrics.register('turns', turns.stats)
+
+        # Replies to stable interims start before speech_final (SPECULATIVE=llm or tts in .env)
+        prefetch = SpeculativePrefetch(llm, build_speculative_messages, synthesize=tts_cache.synthesize,
+                                       llm_params=orders.params())
+        metrics.register('speculative', prefetch.stats)
 
         def on_open(self, open, **kwargs):
             print("Connection Open")
 
         def on_message(self, result, **kwargs):
-            nonlocal is_finals
+            nonlocal is_finals, speech_final_at
             if mute_microphone.is_set():
                 return  # Ignore messages while microphone is muted
             
@@ -236,46 +299,37 @@ def start_conversation():
                     utterance = " ".join(is_finals)
                     print(f"Speech Final: {utterance}")
                     is_finals = []
-                    conversation_memory.append({"role": "user", "content": sentence.strip()})
-                    messages = [{"role": "system", "content": prompt}]
-                    messages.extend(conversation_memory)
-                    chat_completion = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=messages
-                    )
-                    print(chat_completion)
-                    processed_text = chat_completion.choices[0].message.content.strip()
-                    text_segments = segment_text_by_sentence(processed_text)
-                    with open(output_audio_file, "wb") as output_file:
-                        for segment_text in text_segments:
-                            audio_data = synthesize_audio(segment_text)
-                            output_file.write(audio_data)
-                    
-                    # Mute the microphone and play the audio
-                    mute_microphone.set()
-                    microphone.mute()
-                    play_audio(output_audio_file)
-                    time.sleep(0.5)
-                    microphone.unmute()
-                    # Delete the audio file after playing
-                    if os.path.exists(output_audio_file):
-                        os.remove(output_audio_file)
+                    speech_final_at = time.monotonic()
+                    prefetch.finalize(utterance.strip())
+
+                    # Hand off and return at once so SpeechStarted and transcripts keep
+                    # flowing while James talks; a newer utterance supersedes a stale turn
+                    turns.submit(utterance.strip(), barge_in.start_turn())
+                else:
+                    prefetch.observe(" ".join(is_finals), final=True)
             else:
                 print(f"Interim Results: {sentence}")
+                barge_in.on_interim(sentence)
+                prefetch.observe(" ".join(is_finals + [sentence]))
 
         def on_metadata(self, metadata, **kwargs):
             print(f"Metadata: {metadata}")
 
         def on_speech_started(self, speech_started, **kwargs):
             print("Speech Started")
+            barge_in.on_speech_started()
 
         def on_utterance_end(self, utterance_end, **kwargs):
             print("Utterance End")
-            nonlocal is_finals
+            nonlocal is_finals, speech_final_at
             if len(is_finals) > 0:
                 utterance = " ".join(is_finals)
                 print(f"Utterance End: {utterance}")
                 is_finals = []
+                speech_final_at = time.monotonic()
+                prefetch.finalize(utterance.strip())
+                # speech_final never came (e.g. background noise); answer anyway
+                turns.submit(utterance.strip(), barge_in.start_turn())
 
         def on_close(self, close, **kwargs):
             print("Connection Closed")
@@ -323,6 +377,8 @@ def start_conversation():
         input("")
         microphone.finish()
         dg_connection.finish()
+        prefetch.cancel()
+        turns.close()
 
         print("Finished")
 
@@ -330,5 +386,4 @@ def start_conversation():
         print(f"Could not open socket: {e}")
 
 if __name__ == "__main__":
-    output_audio_file = 'output_audio.mp3'
     main()
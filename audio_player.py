@@ -0,0 +1,85 @@
+"""
+In-memory audio playback for AI Voice Agent
+Keeps the pygame mixer open between replies and plays MP3 bytes without touching disk
+"""
+
+import io
+import threading
+import time
+
+import pygame
+
+
+class AudioPlayer:
+    def __init__(self, poll_interval=0.01):
+        """
+        Persistent playback engine
+        poll_interval: Seconds between checks for playback end or stop requests
+        """
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop_requested = threading.Event()
+        self._initialized = False
+
+    def _ensure_mixer(self):
+        """Open the audio device once and keep it open"""
+        if not self._initialized:
+            pygame.mixer.init()
+            self._initialized = True
+
+    def play(self, audio_data):
+        """
+        Play one MP3 buffer and block until it finishes or stop() is called
+        Returns False if playback was stopped early
+        """
+        self._stop_requested.clear()
+        return self._play(audio_data)
+
+    def play_stream(self, chunks):
+        """
+        Play a stream of MP3 buffers back to back as they arrive
+        Returns False if playback was stopped before the stream ended
+        """
+        self._stop_requested.clear()
+        for audio_data in chunks:
+            if not self._play(audio_data):
+                return False
+        return True
+
+    def _play(self, audio_data):
+        if self._stop_requested.is_set():
+            return False
+        if not audio_data:
+            return True
+
+        with self._lock:
+            self._ensure_mixer()
+            pygame.mixer.music.load(io.BytesIO(audio_data), "mp3")
+            pygame.mixer.music.play()
+
+            finished = True
+            while pygame.mixer.music.get_busy():
+                if self._stop_requested.is_set():
+                    pygame.mixer.music.stop()
+                    finished = False
+                    break
+                time.sleep(self.poll_interval)
+
+            pygame.mixer.music.unload()
+            return finished
+
+    def stop(self):
+        """Interrupt the current playback (safe to call from any thread)"""
+        self._stop_requested.set()
+
+    def is_playing(self):
+        """Check whether audio is currently coming out of the speaker"""
+        return self._initialized and pygame.mixer.music.get_busy()
+
+    def close(self):
+        """Release the audio device"""
+        self.stop()
+        with self._lock:
+            if self._initialized:
+                pygame.mixer.quit()
+                self._initialized = False
@@ -0,0 +1,33 @@
+"""
+Audio payload helpers for the web voice servers
+Browsers send raw binary (Socket.IO binary frames or octet-stream POST bodies); older
+pages still send base64 data URLs, which keep working
+"""
+
+import base64
+
+
+def is_binary_payload(payload):
+    """True when the client sent raw bytes and can take raw bytes back"""
+    if isinstance(payload, dict):
+        payload = payload.get('audio')
+    return isinstance(payload, (bytes, bytearray, memoryview))
+
+
+def decode_audio_payload(payload):
+    """Return audio bytes from a raw binary payload or a legacy data URL"""
+    if isinstance(payload, dict):
+        payload = payload.get('audio')
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return base64.b64decode(payload.split(',', 1)[-1])
+    raise ValueError("No audio in request")
+
+
+def encode_audio_payload(audio_data, binary, mime_type='audio/mp3'):
+    """Raw bytes for binary clients, a base64 data URL for legacy ones"""
+    if binary:
+        return audio_data
+    audio_b64 = base64.b64encode(audio_data).decode('utf-8')
+    return f"data:{mime_type};base64,{audio_b64}"
@@ -0,0 +1,97 @@
+"""
+Barge-in for AI Voice Agent
+Keeps listening while James talks and cuts the reply short when the caller starts speaking
+"""
+
+import os
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# speech: stop on Deepgram's SpeechStarted VAD event (fastest, needs a headset or echo cancellation)
+# words:  stop on the first interim transcript that isn't James's own voice leaking into the mic
+# off:    mute the microphone while James talks (the old behaviour)
+BARGE_IN = os.getenv('BARGE_IN', 'speech').lower()
+
+_WORDS = re.compile(r"[a-z0-9']+")
+ECHO_TAIL_SECONDS = 1.5     # transcripts of the reply can still arrive this long after it ends
+
+
+def _words(text):
+    return _WORDS.findall(text.lower())
+
+
+class BargeInController:
+    def __init__(self, player, mode=BARGE_IN):
+        """
+        Tracks the reply in progress and interrupts it
+        player: AudioPlayer that is speaking the reply
+        mode: 'speech', 'words' or 'off'
+        """
+        self.player = player
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._turn = None
+        self._spoken_words = set()
+        self._echo_until = 0.0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def start_turn(self):
+        """Interrupt any reply in progress and return the cancel event for a new one"""
+        self.interrupt()
+        cancelled = threading.Event()
+        with self._lock:
+            self._turn = cancelled
+            self._spoken_words = set()
+        return cancelled
+
+    def end_turn(self, cancelled):
+        with self._lock:
+            if self._turn is cancelled:
+                self._turn = None
+                self._echo_until = time.monotonic() + ECHO_TAIL_SECONDS
+
+    def speaking(self, text):
+        """Remember what James is saying so it can be told apart from the caller"""
+        with self._lock:
+            self._spoken_words.update(_words(text))
+
+    def is_echo(self, transcript):
+        """
+        True if every word heard is part of the reply currently being spoken
+        Only decides whether an interim interrupts James; finals always reach the caller's turn,
+        since a caller picking one of the options James just read out repeats his words
+        """
+        with self._lock:
+            if self._turn is None and time.monotonic() > self._echo_until:
+                return False
+            heard = _words(transcript)
+            return bool(heard) and all(word in self._spoken_words for word in heard)
+
+    def interrupt(self):
+        """Cancel the reply in progress: stop the speaker now, drop pending LLM/TTS work"""
+        with self._lock:
+            turn = self._turn
+        if turn is not None and not turn.is_set():
+            turn.set()
+            self.player.stop()
+            return True
+        return False
+
+    def on_speech_started(self):
+        """Deepgram VAD heard the caller start talking"""
+        # Only while audio is playing: a cough during the LLM wait would otherwise drop the reply
+        if self.mode == 'speech' and self.player.is_playing() and self.interrupt():
+            print("✋ Barge-in: caller started talking")
+
+    def on_interim(self, transcript):
+        """An interim transcript arrived while James may be talking"""
+        if self.mode == 'words' and not self.is_echo(transcript) and self.interrupt():
+            print(f"✋ Barge-in: '{transcript}'")
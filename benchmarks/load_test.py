@@ -0,0 +1,465 @@
+"""
+Load generator for the web voice servers
+Opens N concurrent Socket.IO sessions (or HTTPS /voice_chat clients) that behave like callers:
+record a wake-word clip, upload it, speak an utterance, wait for James, listen, pause, repeat.
+Per-event latency, errors and the server's resident memory (from /metrics) are recorded for each
+step of concurrency, giving a capacity curve
+
+Fully offline - the server is started against the mock providers:
+    python benchmarks/load_test.py --server mobile_https_app.py --steps 1,5,10,20 --step-seconds 60
+
+Against a server that is already running:
+    python benchmarks/load_test.py --url https://127.0.0.1:5443 --protocol http --steps 5
+"""
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import random
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import unquote
+
+import requests
+import urllib3
+
+from mock_providers import MockServer, add_config_arguments, config_from_args
+from run_benchmarks import (FIXTURES_DIR, MOCK_API_KEY, ROOT, WAKE_FIXTURE, Fixture, load_fixtures,
+                            percentile, synthetic_wav)
+
+# Server script -> (URL it listens on, event protocol its page speaks)
+SERVERS = {
+    'mobile_app.py': ('http://127.0.0.1:5000', 'socketio-basic'),
+    'mobile_https_app.py': ('https://127.0.0.1:5443', 'socketio'),
+    'mobile_async_app.py': ('https://127.0.0.1:5443', 'socketio'),
+    'simple_https_app.py': ('https://127.0.0.1:5443', 'http'),
+}
+# Utterance upload event for each Socket.IO page
+UTTERANCE_EVENTS = {'socketio': 'james_activation', 'socketio-basic': 'audio_data'}
+
+# Runs a server script with every load_dotenv call made non-overriding: the servers call
+# load_dotenv(override=True), which would put the .env keys back over the mock ones. Python re-runs
+# this same command line for the debug reloader's child, so the child is covered too
+SERVER_RUNNER = (
+    "import runpy, sys, dotenv\n"
+    "load_dotenv = dotenv.load_dotenv\n"
+    "dotenv.load_dotenv = lambda *args, **kwargs: load_dotenv(*args, **dict(kwargs, override=False))\n"
+    "sys.argv = sys.argv[1:]\n"
+    "runpy.run_path(sys.argv[0], run_name='__main__')\n"
+)
+
+WAKE_TRANSCRIPT = "Hey James"
+SPEAKING_RATE = 15.0        # characters per second of reply a caller listens to
+MEMORY_METRIC = re.compile(r'^process_resident_memory_bytes\s+([0-9.e+]+)', re.MULTILINE)
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+def insecure_session():
+    """HTTP session that accepts the servers' self-signed certificates"""
+    session = requests.Session()
+    session.verify = False
+    # Otherwise REQUESTS_CA_BUNDLE in the environment silently re-enables verification
+    session.trust_env = False
+    return session
+
+
+class Recorder:
+    def __init__(self):
+        """Thread-safe log of (time, event, seconds, error) for every caller action"""
+        self._lock = threading.Lock()
+        self.events = []
+        self.memory = []
+
+    def record(self, event, seconds, error=None):
+        with self._lock:
+            self.events.append((time.monotonic(), event, seconds, error))
+
+    def sample_memory(self, value):
+        with self._lock:
+            self.memory.append((time.monotonic(), value))
+
+    def window(self, start, end):
+        with self._lock:
+            events = [e for e in self.events if start <= e[0] < end]
+            memory = [m for m in self.memory if start <= m[0] < end]
+        return events, memory
+
+
+class Caller:
+    def __init__(self, url, fixtures, wake, recorder, args):
+        """
+        One simulated caller
+        fixtures: Utterance Fixtures, spoken in rotation
+        wake: Fixture with the wake word
+        recorder: Recorder shared by every caller
+        """
+        self.url = url
+        self.fixtures = itertools.cycle(random.sample(fixtures, len(fixtures)))
+        self.wake = wake
+        self.recorder = recorder
+        self.args = args
+
+    def pause(self, stop, seconds):
+        """Sleep for human time, with +/-50% variation; False once the step is over"""
+        return not stop.wait(seconds * random.uniform(0.5, 1.5))
+
+    def timed(self, event, action):
+        """Run one request/response exchange and record it; returns its result or None"""
+        started = time.perf_counter()
+        try:
+            result = action()
+        except Exception as e:
+            self.recorder.record(event, time.perf_counter() - started, str(e) or type(e).__name__)
+            return None
+        self.recorder.record(event, time.perf_counter() - started)
+        return result
+
+    def run(self, stop):
+        if self.timed('connect', self.connect) is None:
+            return
+        try:
+            # Callers join at different moments of their conversations
+            if not self.pause(stop, self.args.think):
+                return
+            while not stop.is_set():
+                # The page records a clip, then uploads it for wake-word matching
+                if stop.wait(self.wake.seconds) or self.timed('wake', self.wake_check) is None:
+                    continue
+                for _ in range(self.args.turns_per_wake):
+                    fixture = next(self.fixtures)
+                    if stop.wait(fixture.seconds):
+                        return
+                    reply = self.timed('turn', lambda: self.turn(fixture))
+                    if reply is None:
+                        break
+                    # Listen to James, then think before answering
+                    if not self.pause(stop, len(reply) / SPEAKING_RATE + self.args.think):
+                        return
+        finally:
+            self.close()
+
+
+class SocketIOCaller(Caller):
+    def __init__(self, url, fixtures, wake, recorder, args, protocol='socketio'):
+        super().__init__(url, fixtures, wake, recorder, args)
+        import socketio
+        self.utterance_event = UTTERANCE_EVENTS[protocol]
+        self.socket = socketio.Client(http_session=insecure_session(), ssl_verify=False, reconnection=False)
+        self.inbox = queue.Queue()
+        for name in ('wake_word_detected', 'transcription', 'ai_response', 'error'):
+            self.socket.on(name, self._receiver(name))
+        self.socket.on('disconnect', lambda *args: self.inbox.put(('disconnect', None)))
+
+    def _receiver(self, name):
+        def receive(data=None):
+            self.inbox.put((name, data))
+        return receive
+
+    def connect(self):
+        self.socket.connect(self.url, wait_timeout=self.args.timeout)
+        return True
+
+    def wait_for(self, *names):
+        """Next event among names; raises on an error event, disconnect or timeout"""
+        deadline = time.monotonic() + self.args.timeout
+        while True:
+            try:
+                name, data = self.inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"no {'/'.join(names)} within {self.args.timeout}s")
+            if name in names:
+                return data
+            if name in ('error', 'disconnect'):
+                message = data.get('message') if isinstance(data, dict) else data
+                raise RuntimeError(f"{name}: {message}")
+
+    def drain(self):
+        while not self.inbox.empty():
+            self.inbox.get_nowait()
+
+    def wake_check(self):
+        self.drain()
+        self.socket.emit('wake_word_check', self.wake.wav_data)
+        result = self.wait_for('wake_word_detected')
+        if isinstance(result, dict) and result.get('detected') is False:
+            raise RuntimeError("wake word missed")
+        return result
+
+    def turn(self, fixture):
+        self.drain()
+        self.socket.emit(self.utterance_event, fixture.wav_data)
+        started = time.perf_counter()
+        if self.utterance_event == 'james_activation':
+            self.wait_for('transcription')
+            self.recorder.record('stt', time.perf_counter() - started)
+        reply = self.wait_for('ai_response')
+        text = reply.get('message') or reply.get('response_text') or ''
+        if not reply.get('audio'):
+            raise RuntimeError("reply without audio")
+        return text
+
+    def close(self):
+        try:
+            self.socket.disconnect()
+        except Exception:
+            pass
+
+
+class HTTPCaller(Caller):
+    def __init__(self, url, fixtures, wake, recorder, args):
+        super().__init__(url, fixtures, wake, recorder, args)
+        # One cookie jar per caller, so each keeps its own server-side session
+        self.http = insecure_session()
+        self.headers = {'Content-Type': 'application/octet-stream'}
+
+    def connect(self):
+        response = self.http.get(f"{self.url}/", timeout=self.args.timeout)
+        response.raise_for_status()
+        return True
+
+    def wake_check(self):
+        response = self.http.post(f"{self.url}/wake_word_check", data=self.wake.wav_data,
+                                  headers=self.headers, timeout=self.args.timeout)
+        response.raise_for_status()
+        if not response.json().get('detected'):
+            raise RuntimeError("wake word missed")
+        return True
+
+    def turn(self, fixture):
+        response = self.http.post(f"{self.url}/voice_chat", data=fixture.wav_data,
+                                  headers=self.headers, timeout=self.args.timeout)
+        response.raise_for_status()
+        if not response.headers.get('Content-Type', '').startswith('audio/'):
+            raise RuntimeError("reply without audio")
+        return unquote(response.headers.get('X-Response', ''))
+
+    def close(self):
+        self.http.close()
+
+
+def sample_memory(url, recorder, stop, every):
+    """Poll the server's resident memory from /metrics until stop is set"""
+    session = insecure_session()
+    while not stop.is_set():
+        try:
+            match = MEMORY_METRIC.search(session.get(f"{url}/metrics", timeout=5).text)
+            if match:
+                recorder.sample_memory(float(match.group(1)))
+        except requests.RequestException:
+            pass
+        stop.wait(every)
+
+
+def start_server(script, mock, args):
+    """Run a voice server against the mock providers; returns the process once /metrics answers"""
+    env = dict(os.environ, **mock.env())
+    for key in ('DEEPGRAM_API_KEY', 'OPENAI_API_KEY', 'GROQ_API_KEY'):
+        env[key] = MOCK_API_KEY
+    env['VAD_ENABLED'] = 'true' if args.vad else 'false'
+    env['WAKE_WORD_ENGINE'] = 'cloud'
+    if args.knowledge:
+        env['KNOWLEDGE_DB'] = os.path.abspath(args.knowledge)
+    else:
+        env['KNOWLEDGE_FAST_PATH'] = 'false'
+    if not args.tts_cache:
+        env['TTS_CACHE_MEMORY_ITEMS'] = '0'
+        env['TTS_CACHE_DISK'] = 'false'
+    log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    # Flask-SocketIO refuses to start its dev server without a terminal on stdin; give it one
+    _, terminal = os.openpty()
+    process = subprocess.Popen([sys.executable, '-c', SERVER_RUNNER, script], cwd=ROOT, env=env, stdin=terminal, stdout=log,
+                               stderr=subprocess.STDOUT, start_new_session=True)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"❌ {script} exited with code {process.returncode} (see --server-log)")
+        try:
+            if requests.get(f"{args.url}/metrics", verify=False, timeout=2).ok:
+                print(f"🚀 {script} is up on {args.url}")
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    sys.exit(f"❌ {script} did not answer on {args.url} within 60s")
+
+
+def stop_server(process):
+    # The debug reloader forks a child; signal the whole process group
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def summarize_step(clients, events, memory, seconds, baseline):
+    summary = {'clients': clients, 'seconds': round(seconds, 1)}
+    for event in ('connect', 'wake', 'stt', 'turn'):
+        ok = [e[2] * 1000 for e in events if e[1] == event and e[3] is None]
+        failed = [e for e in events if e[1] == event and e[3] is not None]
+        if not ok and not failed:
+            continue
+        summary[event] = {
+            'count': len(ok),
+            'errors': len(failed),
+            'error_rate': round(len(failed) / (len(ok) + len(failed)), 3),
+        }
+        if ok:
+            summary[event].update({f'p{p}': round(percentile(ok, p), 1) for p in (50, 95, 99)})
+    turns = summary.get('turn', {}).get('count', 0)
+    summary['turns_per_minute'] = round(turns * 60.0 / seconds, 1) if seconds else 0.0
+    if memory:
+        values = [m[1] for m in memory]
+        summary['rss_mb'] = round(values[-1] / 2 ** 20, 1)
+        summary['rss_peak_mb'] = round(max(values) / 2 ** 20, 1)
+        if baseline:
+            summary['rss_growth_mb'] = round((values[-1] - baseline) / 2 ** 20, 1)
+    errors = sorted({e[3] for e in events if e[3] is not None})
+    summary['error_kinds'] = errors[:5]
+    return summary
+
+
+def within_slo(summary, args):
+    turn = summary.get('turn')
+    return bool(turn and turn.get('p95') is not None
+                and turn['p95'] <= args.slo_ms and turn['error_rate'] <= args.max_error_rate)
+
+
+def print_curve(steps, args):
+    print(f"\n📈 Capacity curve (SLO: turn p95 <= {args.slo_ms:.0f} ms, errors <= {args.max_error_rate:.0%})")
+    print(f"   {'callers':>7}{'turns/min':>11}{'turn p50':>10}{'turn p95':>10}{'wake p95':>10}"
+          f"{'errors':>8}{'RSS MB':>9}{'growth':>8}")
+    for step in steps:
+        turn, wake = step.get('turn', {}), step.get('wake', {})
+        events = [step[k] for k in ('connect', 'wake', 'turn') if k in step]
+        attempts = sum(e['count'] + e['errors'] for e in events)
+        error_rate = sum(e['errors'] for e in events) / attempts if attempts else 0.0
+        print(f"   {step['clients']:>7}{step['turns_per_minute']:>11}{str(turn.get('p50', '-')):>10}"
+              f"{str(turn.get('p95', '-')):>10}{str(wake.get('p95', '-')):>10}{error_rate:>8.1%}"
+              f"{str(step.get('rss_mb', '-')):>9}{str(step.get('rss_growth_mb', '-')):>8}"
+              f"  {'✅' if within_slo(step, args) else '❌'}")
+    passing = [step['clients'] for step in steps if within_slo(step, args)]
+    if passing:
+        print(f"🎯 Capacity: {max(passing)} concurrent callers within the SLO")
+    else:
+        print("🎯 No step met the SLO")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Socket.IO and HTTPS voice servers")
+    parser.add_argument('--server', choices=sorted(SERVERS),
+                        help='Start this server against the mock providers (fully offline)')
+    parser.add_argument('--url', help='Server to load (default: where --server listens)')
+    parser.add_argument('--protocol', choices=['socketio', 'socketio-basic', 'http'],
+                        help='Events to speak (default: from --server, else socketio)')
+    parser.add_argument('--steps', default='1,5,10,20', help='Concurrent callers per step')
+    parser.add_argument('--step-seconds', type=float, default=60, help='Duration of each step')
+    parser.add_argument('--ramp-seconds', type=float, default=5, help='Spread caller start-up over this time')
+    parser.add_argument('--turns-per-wake', type=int, default=2, help='Utterances after each wake word')
+    parser.add_argument('--think', type=float, default=2.0, help='Mean pause between listening and speaking')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for each reply')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Utterance WAVs (plus wake.wav)')
+    parser.add_argument('--sample-every', type=float, default=2.0, help='Seconds between /metrics samples')
+    parser.add_argument('--slo-ms', type=float, default=3000, help='Turn p95 a step must stay under')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Turn error rate a step may have')
+    parser.add_argument('--server-log', help='Write the started server output here')
+    parser.add_argument('--tts-cache', action='store_true', help='Keep the server TTS cache on')
+    parser.add_argument('--vad', action='store_true', help='Keep the server voice activity gate on')
+    parser.add_argument('--knowledge', help='Knowledge database for the pre-LLM fast path (off by default)')
+    parser.add_argument('--json', help='Write the curve to this file')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    default_url, default_protocol = SERVERS.get(args.server, ('https://127.0.0.1:5443', 'socketio'))
+    args.url = (args.url or default_url).rstrip('/')
+    args.protocol = args.protocol or default_protocol
+    steps = [int(n) for n in args.steps.split(',') if n.strip()]
+
+    fixtures = load_fixtures(args.fixtures)
+    wake_path = os.path.join(args.fixtures, WAKE_FIXTURE)
+    if os.path.exists(wake_path):
+        with open(wake_path, 'rb') as f:
+            wake = Fixture(WAKE_FIXTURE, f.read(), WAKE_TRANSCRIPT)
+    else:
+        wake = Fixture(WAKE_FIXTURE, synthetic_wav(seconds=0.8, frequency=440), WAKE_TRANSCRIPT)
+
+    mock = process = None
+    if args.server:
+        config = config_from_args(args)
+        config.add_fixture(wake.wav_data, wake.transcript)
+        for fixture in fixtures:
+            if fixture.transcript:
+                config.add_fixture(fixture.wav_data, fixture.transcript)
+        mock = MockServer(config).start()
+        print(f"🧪 Mock providers on {mock.url}")
+        process = start_server(args.server, mock, args)
+
+    recorder = Recorder()
+    sampling = threading.Event()
+    threading.Thread(target=sample_memory, args=(args.url, recorder, sampling, args.sample_every),
+                     daemon=True).start()
+
+    def make_caller():
+        if args.protocol == 'http':
+            return HTTPCaller(args.url, fixtures, wake, recorder, args)
+        return SocketIOCaller(args.url, fixtures, wake, recorder, args, protocol=args.protocol)
+
+    curve = []
+    baseline = None
+    try:
+        time.sleep(min(args.sample_every, 2.0))
+        _, memory = recorder.window(0, time.monotonic())
+        baseline = memory[-1][1] if memory else None
+        for clients in steps:
+            print(f"📞 {clients} callers for {args.step_seconds:.0f}s ({args.protocol} → {args.url})")
+            stop = threading.Event()
+            threads = []
+            started = time.monotonic()
+            for i in range(clients):
+                caller = make_caller()
+                thread = threading.Thread(target=caller.run, args=(stop,), daemon=True)
+                thread.start()
+                threads.append(thread)
+                if args.ramp_seconds and clients > 1:
+                    time.sleep(args.ramp_seconds / clients)
+            stop.wait(max(0.0, args.step_seconds - (time.monotonic() - started)))
+            stop.set()
+            ended = time.monotonic()
+            for thread in threads:
+                thread.join(timeout=args.timeout + 5)
+            events, memory = recorder.window(started, time.monotonic())
+            # Replies still in flight when the step ended count towards it, not the next one
+            curve.append(summarize_step(clients, events, memory, ended - started, baseline))
+            step = curve[-1]
+            turn = step.get('turn', {})
+            print(f"   {step['turns_per_minute']} turns/min, turn p95 {turn.get('p95', '-')} ms, "
+                  f"errors {turn.get('errors', 0)}, RSS {step.get('rss_mb', '-')} MB")
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopped")
+    finally:
+        sampling.set()
+        if process is not None:
+            stop_server(process)
+        if mock is not None:
+            mock.stop()
+
+    print_curve(curve, args)
+    if args.json:
+        report = {'config': vars(args), 'steps': curve}
+        if mock is not None:
+            report['mock'] = dict(mock.providers.counts)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""
+Local stand-ins for Deepgram, OpenAI and Groq
+Emulates the endpoints the voice agent calls (prerecorded and live listen, speak, chat
+completions with and without streaming) with configurable latency, jitter, streaming chunking
+and error rate, so pipelines can be benchmarked without spending API credits
+
+Run standalone:  python benchmarks/mock_providers.py --port 8900 --ttft-ms 350
+Then point the agent at it:
+    DEEPGRAM_API_URL=http://127.0.0.1:8900
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    GROQ_BASE_URL=http://127.0.0.1:8900/openai/v1
+    LOCAL_LLM_BASE_URL=http://127.0.0.1:8900/local/v1
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from array import array
+
+from aiohttp import web, WSMsgType
+
+DEFAULT_TRANSCRIPTS = [
+    "Hi, I'd like to order two roast pork egg rolls please.",
+    "Yes, and one BBQ chicken.",
+    "Can I book a table for four tomorrow at seven?",
+    "That's all, thanks.",
+]
+DEFAULT_REPLY = (
+    "Sure thing! Two roast pork egg rolls come to ten fifty. "
+    "Would you like anything else with that? "
+    "We also have a great BBQ chicken today."
+)
+
+
+class MockConfig:
+    def __init__(self, stt_ms=250, ttft_ms=400, token_ms=15, tts_ms=200, tts_ms_per_char=1.5,
+                 jitter_ms=50, error_rate=0.0, chunk_tokens=1, transcripts=None, reply=DEFAULT_REPLY,
+                 provider_ttft_ms=None, tool_call=None):
+        """
+        Latency and failure model for the stand-in providers
+        stt_ms: Prerecorded transcription time, and the live endpointing-to-final delay
+        ttft_ms: Chat completion time to first token
+        token_ms: Time per generated token (word)
+        tts_ms: Fixed speak latency, plus tts_ms_per_char for each character of text
+        jitter_ms: Uniform +/- noise added to every delay
+        error_rate: Share of requests answered with HTTP 503
+        chunk_tokens: Tokens per streamed SSE chunk
+        transcripts: Transcripts returned in rotation (or by audio hash, see add_fixture)
+        reply: Assistant reply text
+        provider_ttft_ms: Per-backend TTFT overrides, e.g. {'groq': 150, 'local': 900}
+        tool_call: (name, arguments JSON) requested before the reply whenever the request offers
+                   tools, e.g. ('add_item', '{"item": "chicken egg roll"}')
+        """
+        self.stt_ms = stt_ms
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.tts_ms = tts_ms
+        self.tts_ms_per_char = tts_ms_per_char
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.transcripts = list(transcripts or DEFAULT_TRANSCRIPTS)
+        self.reply = reply
+        self.provider_ttft_ms = dict(provider_ttft_ms or {})
+        self.tool_call = tool_call
+        self.fixtures = {}
+
+    def add_fixture(self, audio_data, transcript):
+        """Return this transcript whenever exactly this audio is uploaded"""
+        self.fixtures[hashlib.sha256(audio_data).hexdigest()] = transcript
+
+    def delay(self, ms):
+        """Seconds to sleep for a nominal delay in milliseconds, with jitter"""
+        return max(0.0, ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def fail(self):
+        return random.random() < self.error_rate
+
+
+class MockProviders:
+    def __init__(self, config=None):
+        """
+        aiohttp application serving the mock endpoints
+        config: MockConfig; defaults approximate hosted providers on a good connection
+        """
+        self.config = config or MockConfig()
+        self._next_transcript = 0
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.app = web.Application(client_max_size=50 * 1024 * 1024)
+        self.app.router.add_post('/v1/listen', self.listen)
+        self.app.router.add_get('/v1/listen', self.listen_live)
+        self.app.router.add_post('/v1/speak', self.speak)
+        self.app.router.add_post('/v1/chat/completions', self.chat_handler('openai'))
+        self.app.router.add_post('/openai/v1/chat/completions', self.chat_handler('groq'))
+        self.app.router.add_post('/local/v1/chat/completions', self.chat_handler('local'))
+        self.app.router.add_get('/mock/stats', self.stats)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _transcript(self, audio_data=None):
+        if audio_data is not None:
+            known = self.config.fixtures.get(hashlib.sha256(audio_data).hexdigest())
+            if known:
+                return known
+        with self._lock:
+            transcript = self.config.transcripts[self._next_transcript % len(self.config.transcripts)]
+            self._next_transcript += 1
+        return transcript
+
+    def _overloaded(self, name):
+        if self.config.fail():
+            self._count(f'{name}_errors')
+            return web.json_response({'error': {'message': 'mock overload', 'type': 'server_error'}}, status=503)
+        return None
+
+    # Deepgram prerecorded: POST /v1/listen
+    async def listen(self, request):
+        self._count('stt')
+        audio_data = await request.read()
+        error = self._overloaded('stt')
+        await asyncio.sleep(self.config.delay(self.config.stt_ms))
+        if error is not None:
+            return error
+        transcript = self._transcript(audio_data)
+        return web.json_response({
+            'metadata': {'request_id': str(uuid.uuid4()), 'duration': len(audio_data) / 32000.0, 'channels': 1},
+            'results': {'channels': [{'alternatives': [{'transcript': transcript, 'confidence': 0.98, 'words': []}]}]},
+        })
+
+    # Deepgram live: GET /v1/listen (websocket)
+    async def listen_live(self, request):
+        self._count('stt_live')
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        endpointing = float(request.query.get('endpointing', 300))
+        linear16 = request.query.get('encoding') == 'linear16'
+        request_id = str(uuid.uuid4())
+        state = {'voiced_at': None, 'speech_from': None, 'audio_seconds': 0.0, 'transcript': None}
+
+        def result(transcript, is_final, speech_final):
+            words = transcript.split()
+            return json.dumps({
+                'type': 'Results', 'channel_index': [0, 1], 'start': 0.0,
+                'duration': state['audio_seconds'], 'is_final': is_final, 'speech_final': speech_final,
+                'from_finalize': False,
+                'channel': {'alternatives': [{
+                    'transcript': transcript, 'confidence': 0.98,
+                    'words': [{'word': w.lower().strip('.,!?'), 'punctuated_word': w, 'start': 0.0, 'end': 0.0,
+                               'confidence': 0.98} for w in words],
+                }]},
+                'metadata': {'request_id': request_id, 'model_uuid': request_id,
+                             'model_info': {'name': 'mock', 'version': '0', 'arch': 'mock'}},
+            })
+
+        async def finalize():
+            transcript = state['transcript']
+            state['voiced_at'] = state['speech_from'] = state['transcript'] = None
+            await asyncio.sleep(self.config.delay(self.config.stt_ms))
+            await ws.send_str(result(transcript, True, True))
+            await ws.send_str(json.dumps({'type': 'UtteranceEnd', 'channel': [0, 1],
+                                          'last_word_end': state['audio_seconds']}))
+
+        async def endpointer():
+            # Silence (no voiced audio) for `endpointing` ms ends the utterance
+            while not ws.closed:
+                await asyncio.sleep(0.05)
+                voiced_at = state['voiced_at']
+                if voiced_at is not None and (time.monotonic() - voiced_at) * 1000 >= endpointing:
+                    await finalize()
+
+        watcher = asyncio.create_task(endpointer())
+        interim_at = 0.0
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.BINARY:
+                    chunk = message.data
+                    state['audio_seconds'] += len(chunk) / 32000.0
+                    if linear16:
+                        samples = array('h', chunk[:len(chunk) // 2 * 2])
+                        voiced = bool(samples) and max(abs(s) for s in samples) > 800
+                    else:
+                        voiced = bool(chunk)
+                    if not voiced:
+                        continue
+                    now = time.monotonic()
+                    if state['speech_from'] is None:
+                        state['speech_from'] = now
+                        state['transcript'] = self._transcript()
+                        await ws.send_str(json.dumps({'type': 'SpeechStarted', 'channel': [0],
+                                                      'timestamp': state['audio_seconds']}))
+                    state['voiced_at'] = now
+                    # Interim results grow word by word while the caller keeps talking
+                    if now - interim_at >= 0.25:
+                        interim_at = now
+                        words = state['transcript'].split()
+                        spoken = max(1, min(len(words), int((now - state['speech_from']) / 0.25) + 1))
+                        await ws.send_str(result(" ".join(words[:spoken]), False, False))
+                elif message.type == WSMsgType.TEXT:
+                    kind = json.loads(message.data).get('type')
+                    if kind == 'CloseStream':
+                        if state['transcript']:
+                            await finalize()
+                        await ws.send_str(json.dumps({
+                            'type': 'Metadata', 'transaction_key': 'deprecated', 'request_id': request_id,
+                            'sha256': '', 'created': '', 'duration': state['audio_seconds'], 'channels': 1,
+                            'models': [], 'model_info': {},
+                        }))
+                        break
+        finally:
+            watcher.cancel()
+            await ws.close()
+        return ws
+
+    # Deepgram speak: POST /v1/speak
+    async def speak(self, request):
+        self._count('tts')
+        payload = await request.json()
+        text = payload.get('text', '')
+        error = self._overloaded('tts')
+        await asyncio.sleep(self.config.delay(self.config.tts_ms + self.config.tts_ms_per_char * len(text)))
+        if error is not None:
+            return error
+        # Roughly 32 kbps of silent MP3-looking bytes, about 60 ms of speech per character
+        body = b'ID3\x04\x00\x00\x00\x00\x00\x00' + b'\xff\xfb\x90\x64' + b'\x00' * (240 * max(1, len(text)))
+        return web.Response(body=body, content_type='audio/mpeg')
+
+    # OpenAI-compatible chat completions for the openai, groq and local backends
+    def chat_handler(self, provider):
+        async def chat(request):
+            return await self.chat(request, provider)
+        return chat
+
+    async def chat(self, request, provider):
+        self._count(f'llm_{provider}')
+        payload = await request.json()
+        error = self._overloaded(f'llm_{provider}')
+        ttft = self.config.provider_ttft_ms.get(provider, self.config.ttft_ms)
+        await asyncio.sleep(self.config.delay(ttft))
+        if error is not None:
+            return error
+
+        model = payload.get('model', 'mock')
+        messages = payload.get('messages') or [{}]
+        if self.config.tool_call and payload.get('tools') and payload.get('tool_choice') != 'none' \
+                and messages[-1].get('role') != 'tool':
+            self._count(f'llm_{provider}_tool_calls')
+            return await self._tool_call(request, payload, model)
+        tokens = [word + ' ' for word in self.config.reply.split()]
+        tokens[-1] = tokens[-1].rstrip()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not payload.get('stream'):
+            await asyncio.sleep(len(tokens) * self.config.token_ms / 1000.0)
+            return web.json_response({
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': self.config.reply},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+
+        def chunk(delta, finish_reason=None):
+            data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            return f"data: {json.dumps(data)}\n\n".encode('utf-8')
+
+        try:
+            await response.write(chunk({'role': 'assistant', 'content': ''}))
+            size = self.config.chunk_tokens
+            for i in range(0, len(tokens), size):
+                if i:
+                    await asyncio.sleep(self.config.delay(self.config.token_ms * size) if self.config.token_ms else 0)
+                await response.write(chunk({'content': ''.join(tokens[i:i + size])}))
+            await response.write(chunk({}, 'stop'))
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # The client closed the stream (barge-in, hedge loser); that is the point
+            self._count(f'llm_{provider}_cancelled')
+        return response
+
+    async def _tool_call(self, request, payload, model):
+        name, arguments = self.config.tool_call
+        call_id = f"call_{uuid.uuid4().hex[:12]}"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if not payload.get('stream'):
+            return web.json_response({
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'tool_calls', 'message': {
+                    'role': 'assistant', 'content': None,
+                    'tool_calls': [{'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': arguments}}],
+                }}],
+            })
+
+        # Streamed like the real API: the name first, then the arguments in fragments
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        half = len(arguments) // 2
+        fragments = [
+            {'index': 0, 'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': ''}},
+            {'index': 0, 'function': {'arguments': arguments[:half]}},
+            {'index': 0, 'function': {'arguments': arguments[half:]}},
+        ]
+        for fragment in fragments:
+            data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': {'tool_calls': [fragment]}, 'finish_reason': None}]}
+            await response.write(f"data: {json.dumps(data)}\n\n".encode('utf-8'))
+        data = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'tool_calls'}]}
+        await response.write(f"data: {json.dumps(data)}\n\n".encode('utf-8'))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def stats(self, request):
+        with self._lock:
+            return web.json_response(dict(self.counts))
+
+
+class MockServer:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        """
+        Run MockProviders on a background event loop thread
+        port: 0 picks a free port; read it back from .url
+        """
+        self.providers = MockProviders(config)
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.providers.app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self.url = f"http://{self.host}:{self.port}"
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def env(self):
+        """Environment variables that point the agent at this server"""
+        return {
+            'DEEPGRAM_API_URL': self.url,
+            'OPENAI_BASE_URL': f"{self.url}/v1",
+            'GROQ_BASE_URL': f"{self.url}/openai/v1",
+            'LOCAL_LLM_BASE_URL': f"{self.url}/local/v1",
+        }
+
+    def stop(self):
+        async def shutdown():
+            await self._runner.cleanup()
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def add_config_arguments(parser):
+    """Mock latency flags shared by the benchmark and load-test scripts"""
+    parser.add_argument('--stt-ms', type=float, default=250, help='STT latency (live: delay after endpointing)')
+    parser.add_argument('--ttft-ms', type=float, default=400, help='LLM time to first token')
+    parser.add_argument('--groq-ttft-ms', type=float, default=None, help='Groq TTFT override')
+    parser.add_argument('--local-ttft-ms', type=float, default=None, help='Local LLM TTFT override')
+    parser.add_argument('--token-ms', type=float, default=15, help='Time per generated token')
+    parser.add_argument('--chunk-tokens', type=int, default=1, help='Tokens per streamed chunk')
+    parser.add_argument('--tts-ms', type=float, default=200, help='TTS fixed latency')
+    parser.add_argument('--tts-ms-per-char', type=float, default=1.5, help='TTS latency per character')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='Uniform +/- jitter on every delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--tool-call', help='Tool call made before each reply when tools are offered, '
+                                            'e.g. \'add_item={"item": "chicken egg roll"}\'')
+
+
+def config_from_args(args):
+    overrides = {}
+    if args.groq_ttft_ms is not None:
+        overrides['groq'] = args.groq_ttft_ms
+    if args.local_ttft_ms is not None:
+        overrides['local'] = args.local_ttft_ms
+    return MockConfig(
+        stt_ms=args.stt_ms, ttft_ms=args.ttft_ms, token_ms=args.token_ms, tts_ms=args.tts_ms,
+        tts_ms_per_char=args.tts_ms_per_char, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        chunk_tokens=args.chunk_tokens, provider_ttft_ms=overrides,
+        tool_call=tuple(args.tool_call.split('=', 1)) if args.tool_call else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Deepgram/OpenAI/Groq servers for offline benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    providers = MockProviders(config_from_args(args))
+    base = f"http://{args.host}:{args.port}"
+    print(f"🧪 Mock providers on {base}")
+    print(f"   DEEPGRAM_API_URL={base}")
+    print(f"   OPENAI_BASE_URL={base}/v1")
+    print(f"   GROQ_BASE_URL={base}/openai/v1")
+    print(f"   LOCAL_LLM_BASE_URL={base}/local/v1")
+    web.run_app(providers.app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
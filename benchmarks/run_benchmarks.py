@@ -0,0 +1,418 @@
+"""
+Offline latency benchmark for AI Voice Agent
+Starts the mock providers, points the agent's own modules at them and drives N concurrent
+callers through recorded WAV utterances, reporting time to first audio, turn latency
+percentiles and throughput for each pipeline
+
+    python benchmarks/run_benchmarks.py --scenario streaming --clients 8 --turns 5
+    python benchmarks/run_benchmarks.py --scenario http --ttft-ms 800 --error-rate 0.05 --json out.json
+
+Scenarios
+    streaming: app.py - live STT, streamed LLM, sentence-pipelined TTS
+    batch:     app_groq.py - live STT, whole LLM reply, then TTS per sentence
+    http:      simple_https_app.py - POST /voice_chat through the Flask test client
+    socketio:  mobile_https_app.py - james_activation through the Socket.IO test client
+
+Times are measured from the end of the caller's audio; playback itself is not included
+"""
+
+import argparse
+import glob
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_providers import MockServer, add_config_arguments, config_from_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+WAKE_FIXTURE = 'wake.wav'               # the wake-word clip load_test.py sends; not an utterance
+MOCK_API_KEY = 'mock-' + '0' * 40       # long enough for the apps' key sanity checks
+ORDER_SESSION = 'benchmark'             # live callers' sessions (history and order) are benchmark-1, -2, ...
+CHUNK_MS = 20                           # live audio frame size, like a browser MediaRecorder timeslice
+
+
+class Fixture:
+    def __init__(self, name, wav_data, transcript=None):
+        """
+        One recorded caller utterance
+        wav_data: Complete WAV file (uploaded as is by the HTTP scenarios)
+        transcript: What the mock STT should return for it (optional)
+        """
+        self.name = name
+        self.wav_data = wav_data
+        self.transcript = transcript
+        with wave.open(io.BytesIO(wav_data), 'rb') as wav:
+            self.sample_rate = wav.getframerate()
+            self.frame_bytes = wav.getsampwidth() * wav.getnchannels()
+            self.pcm = wav.readframes(wav.getnframes())
+
+    @property
+    def seconds(self):
+        return len(self.pcm) / (self.sample_rate * self.frame_bytes)
+
+    def chunks(self, ms=CHUNK_MS):
+        size = self.sample_rate * self.frame_bytes * ms // 1000
+        for i in range(0, len(self.pcm), size):
+            yield self.pcm[i:i + size]
+
+
+def synthetic_wav(seconds=1.5, sample_rate=16000, frequency=220):
+    """A tone followed by silence, for runs without recorded fixtures"""
+    samples = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        value = int(3000 * math.sin(2 * math.pi * frequency * i / sample_rate))
+        samples += value.to_bytes(2, 'little', signed=True)
+    samples += b'\x00\x00' * int(0.3 * sample_rate)
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(samples))
+    return out.getvalue()
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    """WAV files in the fixtures directory, each with an optional same-named .txt transcript"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.wav'))):
+        if os.path.basename(path) == WAKE_FIXTURE:
+            continue
+        transcript = None
+        text_path = os.path.splitext(path)[0] + '.txt'
+        if os.path.exists(text_path):
+            with open(text_path, encoding='utf-8') as f:
+                transcript = f.read().strip() or None
+        with open(path, 'rb') as f:
+            fixtures.append(Fixture(os.path.basename(path), f.read(), transcript))
+    if not fixtures:
+        print(f"ℹ️  No WAV files in {directory}, using a synthetic utterance")
+        fixtures.append(Fixture('synthetic.wav', synthetic_wav()))
+    return fixtures
+
+
+def pin_environment():
+    """
+    Keep .env from replacing the injected settings: the agents call load_dotenv(override=True),
+    which would put the real keys back over the mock ones (and fail their sanity checks)
+    """
+    import dotenv
+    load_dotenv = dotenv.load_dotenv
+
+    def pinned(*args, **kwargs):
+        return load_dotenv(*args, **dict(kwargs, override=False))
+
+    dotenv.load_dotenv = pinned
+
+
+def configure_environment(server, args):
+    """Point every provider URL at the mock; must run before the agent modules are imported"""
+    pin_environment()
+    os.environ.update(server.env())
+    for key in ('DEEPGRAM_API_KEY', 'OPENAI_API_KEY', 'GROQ_API_KEY'):
+        os.environ[key] = MOCK_API_KEY
+    os.environ['LLM_BACKENDS'] = args.backends
+    os.environ['LLM_HEDGE_AFTER_MS'] = str(args.hedge_ms)
+    os.environ['VAD_ENABLED'] = 'true' if args.vad else 'false'
+    os.environ['WAKE_WORD_ENGINE'] = 'cloud'
+    if args.knowledge:
+        os.environ['KNOWLEDGE_DB'] = os.path.abspath(args.knowledge)
+    else:
+        # A local nexus_knowledge.db would answer some turns without the LLM
+        os.environ['KNOWLEDGE_FAST_PATH'] = 'false'
+    if not args.tts_cache:
+        # Every caller gets the same mock reply; a warm cache would hide TTS latency
+        os.environ['TTS_CACHE_MEMORY_ITEMS'] = '0'
+        os.environ['TTS_CACHE_DISK'] = 'false'
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def check_routing(server):
+    """Refuse to run if anything still sends traffic to the real APIs"""
+    import provider_client
+    if provider_client.DEEPGRAM_API_URL != server.url:
+        sys.exit(f"❌ DEEPGRAM_API_URL is {provider_client.DEEPGRAM_API_URL}; remove it from .env to benchmark")
+    if provider_client.OPENAI_BASE_URL != server.env()['OPENAI_BASE_URL']:
+        sys.exit(f"❌ OPENAI_BASE_URL is {provider_client.OPENAI_BASE_URL}; remove it from .env to benchmark")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class NullPlayer:
+    def play_stream(self, chunks):
+        # Takes each clip as soon as it is ready; the agents' playback time is not measured
+        for _ in chunks:
+            pass
+
+
+class LivePipeline:
+    def __init__(self, streamed, pace):
+        """
+        The console agents' turn without microphone, wake word and speaker
+        Replies go through console_turn.ConsoleReplies, the code app.py and app_groq.py run, with
+        the same history, knowledge, order tools, prompt and TTS cache; only speculation is off
+        streamed: True for app.py (LLM stream into sentence-pipelined TTS), False for app_groq.py
+        pace: Audio send speed relative to real time; 0 sends as fast as possible
+        """
+        import provider_client
+        from console_turn import ConsoleReplies
+        from context_window import ContextManager
+        from knowledge_fastpath import make_fast_path
+        from live_stt import LiveTranscriber
+        from llm_providers import make_router
+        from order_engine import OrderTools
+        from prompt_registry import load_prompt
+        from session_store import SessionStore
+        from tracing import Tracer
+        from tts_cache import TTSCache
+
+        self.pace = pace
+        self.LiveTranscriber = LiveTranscriber
+        self.dg_client = provider_client.make_deepgram_client(MOCK_API_KEY)
+        self.sessions = SessionStore()
+        self.tracer = Tracer(path=None)
+        self._lock = threading.Lock()
+        self._callers = 0
+        orders = OrderTools(self.sessions)
+        tts_url = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model=aura-helios-en'
+        headers = {"Authorization": f"Token {MOCK_API_KEY}", "Content-Type": "application/json"}
+
+        def synthesize(text):
+            response = provider_client.post(tts_url, headers=headers, json={"text": text})
+            response.raise_for_status()
+            return response.content
+
+        tts_cache = TTSCache(synthesize, model='aura-helios-en')
+        # app_groq.py's whole-reply settings; app.py streams with the defaults
+        llm_params = {} if streamed else {'max_tokens': 150, 'temperature': 0.7}
+        self.replies = ConsoleReplies(
+            make_router(), orders, make_fast_path(menu=orders.menu), ContextManager(self.sessions),
+            load_prompt('receptionist', orders=orders.prompt()).text, tts_cache.synthesize, NullPlayer(),
+            streamed=streamed, llm_params=llm_params,
+        )
+
+    def transcribe(self, fixture):
+        """Stream the utterance into a live socket; returns (transcript, audio end time, STT seconds after it)"""
+        done = threading.Event()
+        result = {}
+
+        def on_final(transcript):
+            result['transcript'] = transcript
+            result['at'] = time.monotonic()
+            done.set()
+
+        transcriber = self.LiveTranscriber(self.dg_client, on_final)
+        if not transcriber.start():
+            raise RuntimeError("live STT refused the connection")
+        try:
+            for chunk in fixture.chunks():
+                transcriber.send(chunk)
+                if self.pace:
+                    time.sleep(CHUNK_MS / 1000.0 / self.pace)
+            ended = time.monotonic()
+            if not done.wait(10):
+                raise RuntimeError("no speech_final from live STT")
+        finally:
+            # Closed off the turn's clock, as LiveSTTRelay.close does
+            threading.Thread(target=transcriber.finish, daemon=True).start()
+        return result['transcript'], ended, result['at'] - ended
+
+    def client(self):
+        """One caller with their own history and order, like a separate console session"""
+        with self._lock:
+            self._callers += 1
+            return LiveCaller(self, f"{ORDER_SESSION}-{self._callers}")
+
+
+class LiveCaller:
+    def __init__(self, pipeline, session_id):
+        self.pipeline = pipeline
+        self.session_id = session_id
+
+    def turn(self, fixture):
+        pipeline = self.pipeline
+        transcript, ended, stt = pipeline.transcribe(fixture)
+        # The agents' process_turn, minus muting and the speaker: the timeline starts when the audio ends
+        turn = pipeline.tracer.start_turn(self.session_id, started=ended)
+        pipeline.sessions.append(self.session_id, "user", transcript)
+        answer, messages, _ = pipeline.replies.prepare(self.session_id, transcript, turn)
+        reply = pipeline.replies.speak(self.session_id, answer, messages, threading.Event(), turn)
+        if reply:
+            pipeline.sessions.append(self.session_id, "assistant", reply)
+        turn.finish()
+        marks = {name: offset for name, (offset, _) in turn.marks.items()}
+        if 'playback_start' not in marks:
+            raise RuntimeError("no audio synthesized")
+        timings = {'stt': stt, 'ttfa': marks['playback_start'], 'turn': marks['playback_end']}
+        # Whole replies have no first token; the reply itself is the LLM's part
+        first_token = marks.get('llm_first_token', marks.get('llm_done'))
+        if first_token is not None:
+            timings['llm_first_token'] = first_token
+        return timings
+
+
+class HTTPClient:
+    def __init__(self, app):
+        # Each caller keeps its own cookie jar, so its Flask session (and history) is separate
+        self.http = app.test_client()
+
+    def turn(self, fixture):
+        started = time.perf_counter()
+        response = self.http.post('/voice_chat', data=fixture.wav_data, content_type='application/octet-stream')
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200 or response.mimetype != 'audio/mpeg':
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return {'ttfa': elapsed, 'turn': elapsed}
+
+
+class SocketIOClient:
+    def __init__(self, app, socketio):
+        self.socket = socketio.test_client(app)
+        self.socket.get_received()
+
+    def turn(self, fixture):
+        started = time.perf_counter()
+        self.socket.emit('james_activation', fixture.wav_data)
+        elapsed = time.perf_counter() - started
+        events = {event['name']: event['args'] for event in self.socket.get_received()}
+        reply = events.get('ai_response')
+        if not reply or 'audio' not in reply[0]:
+            raise RuntimeError(events.get('error', 'no ai_response'))
+        return {'ttfa': elapsed, 'turn': elapsed}
+
+
+def make_scenario(name, args):
+    """Function returning a fresh per-caller client for the scenario"""
+    if name in ('streaming', 'batch'):
+        pipeline = LivePipeline(streamed=name == 'streaming', pace=args.pace)
+        return pipeline.client
+    if name == 'http':
+        import simple_https_app
+        return lambda: HTTPClient(simple_https_app.app)
+    if name == 'socketio':
+        import mobile_https_app
+        return lambda: SocketIOClient(mobile_https_app.app, mobile_https_app.socketio)
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def run(scenario, fixtures, clients, turns):
+    """Run every caller's turns concurrently; returns (per-turn timings, errors, wall seconds)"""
+    results, errors = [], []
+    lock = threading.Lock()
+
+    def caller(index):
+        client = scenario()
+        for turn in range(turns):
+            fixture = fixtures[(index + turn) % len(fixtures)]
+            try:
+                timings = client.turn(fixture)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                results.append(timings)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(caller, range(clients)))
+    return results, errors, time.perf_counter() - started
+
+
+def summarize(results, errors, wall):
+    summary = {
+        'turns': len(results),
+        'errors': len(errors),
+        'error_rate': round(len(errors) / max(1, len(results) + len(errors)), 3),
+        'wall_seconds': round(wall, 2),
+        'turns_per_second': round(len(results) / wall, 2) if wall else 0.0,
+    }
+    for key in ('stt', 'llm_first_token', 'ttfa', 'turn'):
+        values = [timings[key] * 1000 for timings in results if key in timings]
+        if values:
+            summary[key] = {f'p{p}': round(percentile(values, p), 1) for p in (50, 90, 99)}
+            summary[key]['mean'] = round(sum(values) / len(values), 1)
+    return summary
+
+
+def print_summary(name, clients, summary):
+    print(f"\n📊 {name}: {clients} callers, {summary['turns']} turns, {summary['errors']} errors, "
+          f"{summary['turns_per_second']} turns/s")
+    print(f"   {'ms':<16}{'p50':>9}{'p90':>9}{'p99':>9}{'mean':>9}")
+    for key in ('stt', 'llm_first_token', 'ttfa', 'turn'):
+        if key in summary:
+            row = summary[key]
+            print(f"   {key:<16}{row['p50']:>9}{row['p90']:>9}{row['p99']:>9}{row['mean']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the voice pipelines against mock providers")
+    parser.add_argument('--scenario', default='streaming',
+                        help='streaming, batch, http, socketio, or a comma-separated list')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent callers')
+    parser.add_argument('--turns', type=int, default=5, help='Turns per caller')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Directory of WAV (and .txt) fixtures')
+    parser.add_argument('--pace', type=float, default=1.0, help='Live audio speed vs real time (0 = no wait)')
+    parser.add_argument('--backends', default='openai', help='LLM_BACKENDS for the run, e.g. groq,openai')
+    parser.add_argument('--hedge-ms', type=int, default=0, help='LLM_HEDGE_AFTER_MS for the run')
+    parser.add_argument('--tts-cache', action='store_true', help='Keep the TTS cache on')
+    parser.add_argument('--vad', action='store_true', help='Keep the voice activity gate on')
+    parser.add_argument('--knowledge', help='Knowledge database for the pre-LLM fast path (off by default)')
+    parser.add_argument('--json', help='Write the results to this file')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    fixtures = load_fixtures(args.fixtures)
+    transcripts = [fixture.transcript for fixture in fixtures if fixture.transcript]
+    if transcripts:
+        config.transcripts = transcripts
+    for fixture in fixtures:
+        if fixture.transcript:
+            config.add_fixture(fixture.wav_data, fixture.transcript)
+
+    server = MockServer(config).start()
+    print(f"🧪 Mock providers on {server.url}")
+    configure_environment(server, args)
+    check_routing(server)
+
+    report = {'config': vars(args), 'scenarios': {}}
+    for name in [s.strip() for s in args.scenario.split(',') if s.strip()]:
+        try:
+            scenario = make_scenario(name, args)
+        except SystemExit as e:
+            # The apps exit on start-up when their keys fail the sanity checks
+            server.stop()
+            sys.exit(f"❌ {name}: the app refused to start ({e.code})")
+        results, errors, wall = run(scenario, fixtures, args.clients, args.turns)
+        summary = summarize(results, errors, wall)
+        print_summary(name, args.clients, summary)
+        for error in sorted(set(errors))[:5]:
+            print(f"   ❌ {error}")
+        report['scenarios'][name] = summary
+
+    report['mock'] = dict(server.providers.counts)
+    server.stop()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Reply half of a console agent's turn (app.py, app_groq.py)
+From the caller's utterance, already in their history, to the last audio chunk handed to the
+player: knowledge fast path, conversation history, order tools, the LLM and pipelined TTS. The
+agents wrap it with the microphone, wake word and speaker; benchmarks/run_benchmarks.py drives
+the same code against the mock providers
+"""
+
+import re
+
+from speculative import SpeculationFailed
+from tts_pipeline import iter_sentences, stream_tts
+
+
+def segment_text_by_sentence(text):
+    sentence_boundaries = re.finditer(r'(?<=[.!?])\s+', text)
+    boundaries_indices = [boundary.start() for boundary in sentence_boundaries]
+
+    segments = []
+    start = 0
+    for boundary_index in boundaries_indices:
+        segments.append(text[start:boundary_index + 1].strip())
+        start = boundary_index + 1
+    segments.append(text[start:].strip())
+
+    return segments
+
+
+class ConsoleReplies:
+    def __init__(self, llm, orders, fast_path, context_manager, prompt, synthesize, player,
+                 barge_in=None, streamed=True, max_workers=4, llm_params=None, fallback_text=None):
+        """
+        Turns of one console agent
+        llm: LLMRouter
+        orders: OrderTools; its session store also holds each caller's history
+        fast_path: KnowledgeFastPath consulted before the LLM
+        context_manager: ContextManager building the history part of each request
+        prompt: System prompt text
+        synthesize: Function text -> audio bytes, e.g. TTSCache.synthesize
+        player: Object with play_stream(chunks), e.g. AudioPlayer
+        barge_in: BargeInController told which sentence is playing (None: no barge-in)
+        streamed: Stream the LLM reply into TTS sentence by sentence; False waits for the whole reply
+        max_workers: Sentences synthesized concurrently
+        llm_params: Chat completion parameters for whole replies, e.g. max_tokens
+        fallback_text: Said when a whole reply fails; None lets the error end the turn
+        """
+        self.llm = llm
+        self.orders = orders
+        self.fast_path = fast_path
+        self.context_manager = context_manager
+        self.prompt = prompt
+        self.synthesize = synthesize
+        self.player = player
+        self.barge_in = barge_in
+        self.streamed = streamed
+        self.max_workers = max_workers
+        self.llm_params = llm_params or {}
+        self.fallback_text = fallback_text
+
+    def prepare(self, session_id, utterance, turn, speculation=None):
+        """
+        (answer, messages, speculation) for the caller's latest utterance
+        answer: Stored answer to speak instead of calling the LLM, or None
+        speculation: Passed through, or closed and None when the knowledge base has something to add
+        """
+        answer, snippets = self.fast_path.route(utterance)
+        if speculation is not None and (answer is not None or snippets):
+            # The speculative reply was asked without what the knowledge base knows
+            speculation.close()
+            speculation = None
+        turn.set(speculative=speculation is not None, knowledge='answer' if answer else 'context' if snippets else None)
+        messages = self.fast_path.augment(self.context_manager.build_messages(self.prompt, session_id), snippets)
+        return answer, self.orders.augment(messages, session_id), speculation
+
+    def speculative_messages(self, session_id, text):
+        """Messages for a turn the caller hasn't finished yet; history is not touched"""
+        messages = self.context_manager.build_messages(self.prompt, session_id)
+        return self.orders.augment(messages + [{"role": "user", "content": text}], session_id)
+
+    def speak(self, session_id, answer, messages, cancelled, turn, speculation=None):
+        """Speak the stored answer or the LLM's reply to messages; returns its text"""
+        if answer is not None:
+            # Stored answer: no LLM call, and its audio is usually cached already
+            self.speak_segments(answer, cancelled, turn)
+            return answer
+        try:
+            return self.speak_reply(session_id, messages, cancelled, turn, speculation)
+        except SpeculationFailed as e:
+            # Nothing was said yet, so the caller only hears a later start
+            print(f"🔮 {e}; asking again")
+            turn.set(speculative=False)
+            return self.speak_reply(session_id, messages, cancelled, turn)
+
+    def _synthesize(self, turn):
+        # Marks the turn when its first clip is ready
+        def synthesize(text):
+            audio_data = self.synthesize(text)
+            turn.mark('tts_first_audio')
+            return audio_data
+        return synthesize
+
+    def _play(self, chunks, cancelled, turn):
+        def audio_chunks():
+            for sentence, audio_data in chunks:
+                if cancelled.is_set():
+                    return
+                turn.mark('playback_start')
+                if self.barge_in is not None:
+                    self.barge_in.speaking(sentence)
+                yield sentence, audio_data
+
+        return audio_chunks()
+
+    def speak_streaming(self, session_id, messages, cancelled, turn, deltas=None):
+        """
+        Stream the chat completion into TTS and start playback on the first sentence
+        deltas: Reply already in flight (a committed speculation); otherwise one is requested
+        """
+        # Order tool calls run between the streamed responses that make up the reply
+        deltas = self.orders.stream(self.llm, messages, session_id, first=deltas)
+        backend = lambda: deltas.backend.name if deltas.backend else None
+        sentences = iter_sentences(turn.timed(deltas, 'llm_first_token', 'llm_done', provider=backend))
+
+        # Sentence N is synthesized on the pipeline thread while sentence N-1 plays
+        pipeline = stream_tts(sentences, self._synthesize(turn), max_workers=self.max_workers)
+        spoken = []
+
+        def audio_chunks():
+            for sentence, audio_data in self._play(pipeline, cancelled, turn):
+                print(f"🔊 Speaking: {sentence}")
+                spoken.append(sentence)
+                yield audio_data
+
+        try:
+            self.player.play_stream(audio_chunks())
+            turn.mark('playback_end')
+        finally:
+            # On barge-in, stop generating tokens and audio nobody will hear
+            pipeline.close()
+            deltas.close()
+        return " ".join(spoken)
+
+    def speak_reply(self, session_id, messages, cancelled, turn, speculation=None):
+        """
+        Get the LLM reply to messages, speak it and return its text
+        speculation: Committed speculative reply to continue instead of a new request
+        """
+        if self.streamed:
+            return self.speak_streaming(session_id, messages, cancelled, turn, deltas=speculation)
+        text = self.reply_text(session_id, messages, turn, speculation)
+        if not cancelled.is_set():
+            self.speak_segments(text, cancelled, turn)
+        return text
+
+    def reply_text(self, session_id, messages, turn, speculation=None):
+        """Whole LLM reply to messages, after any order tools it calls"""
+        with turn.span('llm'):
+            try:
+                if speculation is not None:
+                    text = "".join(self.orders.stream(self.llm, messages, session_id, first=speculation)).strip()
+                else:
+                    text = self.orders.complete(self.llm, messages, session_id, **self.llm_params)
+            except SpeculationFailed:
+                raise
+            except Exception as e:
+                if self.fallback_text is None:
+                    raise
+                print(f"❌ LLM error: {e}")
+                text = self.fallback_text
+        turn.mark('llm_done')
+        return text
+
+    def speak_segments(self, text, cancelled, turn):
+        """Synthesize all sentences in parallel and play them back in order"""
+        text_segments = segment_text_by_sentence(text)
+        synthesized = stream_tts(text_segments, self._synthesize(turn), max_workers=self.max_workers)
+        try:
+            self.player.play_stream(audio_data for _, audio_data in self._play(synthesized, cancelled, turn))
+            turn.mark('playback_end')
+        finally:
+            synthesized.close()
@@ -0,0 +1,131 @@
+"""
+Token-budgeted context window for AI Voice Agent
+Sends the system prompt plus the newest turns that fit the budget, and folds older
+turns into a running summary on a background thread
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '3000'))   # system prompt + summary + turns
+CONTEXT_MIN_FOLD = int(os.getenv('CONTEXT_MIN_FOLD', '4'))          # messages folded per summary pass
+
+SUMMARY_INSTRUCTION = (
+    "Summarize this conversation between a caller and the assistant in a few short sentences. "
+    "Keep every concrete detail the assistant still needs: names, items and quantities ordered, "
+    "prices quoted, reservation date, time and party size, addresses and open questions."
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 chars per token"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def message_tokens(message):
+    # Every chat message carries a few tokens of role/formatting overhead
+    return count_tokens(message['content']) + 4
+
+
+def make_llm_summarizer(client, model="gpt-3.5-turbo"):
+    """Build a summarizer that asks an OpenAI-compatible client to fold old turns"""
+    def summarize(previous_summary, messages):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_INSTRUCTION},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=200,
+            temperature=0
+        )
+        return response.choices[0].message.content.strip()
+    return summarize
+
+
+class ContextManager:
+    def __init__(self, sessions, summarize=None, max_tokens=CONTEXT_MAX_TOKENS, min_fold=CONTEXT_MIN_FOLD):
+        """
+        Build per-turn message lists within a token budget
+        sessions: SessionStore holding each session's history and summary
+        summarize: Function (previous_summary, messages) -> summary text; None just drops old turns
+        max_tokens: Token budget for system prompt, summary and recent turns together
+        min_fold: Minimum number of overflowing messages before a summary pass runs
+        """
+        self.sessions = sessions
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.min_fold = min_fold
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self._folding = set()
+        self._lock = threading.Lock()
+
+    def build_messages(self, system_prompt, session_id):
+        """Return [system, summary?, recent turns...] for the next LLM call"""
+        data = self.sessions.get(session_id)
+        history = data['history']
+        summary = data.get('summary')
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"Conversation so far: {summary}"})
+        budget = self.max_tokens - sum(message_tokens(m) for m in messages)
+
+        # Walk back from the newest message; always keep the caller's latest turn
+        cut = len(history)
+        for message in reversed(history):
+            cost = message_tokens(message)
+            if cost > budget and cut < len(history):
+                break
+            budget -= cost
+            cut -= 1
+        # Short voice turns reach the message cap long before the token budget; summarise those too
+        cut = max(cut, len(history) - self.sessions.max_messages)
+
+        if cut >= self.min_fold:
+            self._schedule_fold(session_id, data.get('first_seq', 0) + cut)
+
+        messages.extend(history[cut:])
+        return messages
+
+    def _schedule_fold(self, session_id, through_seq):
+        with self._lock:
+            if session_id in self._folding:
+                return
+            self._folding.add(session_id)
+        self._executor.submit(self._fold, session_id, through_seq)
+
+    def _fold(self, session_id, through_seq):
+        try:
+            data = self.sessions.get(session_id)
+            # Messages are addressed by sequence number, so appends during the summary don't shift them
+            folded = data['history'][:max(0, through_seq - data.get('first_seq', 0))]
+            if not folded:
+                return
+            summary = data.get('summary')
+            if self.summarize is not None:
+                summary = self.summarize(summary, folded)
+            self.sessions.fold(session_id, through_seq, summary)
+        except Exception as e:
+            print(f"❌ Context summary error: {e}")
+        finally:
+            with self._lock:
+                self._folding.discard(session_id)
@@ -0,0 +1,304 @@
+"""
+On-device keyword spotter for the "Hey James" wake word
+MFCC features of streaming 16 kHz audio are matched against a few enrolled recordings
+with subsequence DTW, so idle listening never leaves the machine
+
+Enroll once:  python keyword_spotter.py enroll
+Check scores: python keyword_spotter.py test
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WAKE_WORD_ENGINE = os.getenv('WAKE_WORD_ENGINE', 'local')            # local, or cloud to keep STT matching
+WAKE_WORD_TEMPLATES = os.getenv('WAKE_WORD_TEMPLATES', 'wake_word_templates')
+WAKE_WORD_THRESHOLD = os.getenv('WAKE_WORD_THRESHOLD')              # overrides the enrolled calibration
+WAKE_WORD_MIN_RMS = float(os.getenv('WAKE_WORD_MIN_RMS', '0.01'))   # skip matching on near-silence
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400      # 25 ms analysis window
+FRAME_STEP = 160        # 10 ms hop
+NFFT = 512
+NUM_FILTERS = 26
+NUM_CEPS = 13
+HOP_SAMPLES = 1600      # match every 100 ms of new audio
+HOP_FRAMES = HOP_SAMPLES // FRAME_STEP
+DYNAMIC_RANGE = 8.0     # log-mel floor below the loudest band (~35 dB), keeps background hiss flat
+VOICED_RANGE = 4.0      # frames within ~17 dB of the loudest count as speech for mean removal
+REFRACTORY_SECONDS = 1.5
+
+CALIBRATION_FILE = 'spotter.json'
+CALIBRATION_MARGIN = 1.25
+
+
+def _mel(hz):
+    return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+
+def _mel_filterbank(low_hz=60.0, high_hz=SAMPLE_RATE / 2):
+    mels = np.linspace(_mel(low_hz), _mel(high_hz), NUM_FILTERS + 2)
+    bins = np.floor((NFFT + 1) * _mel_to_hz(mels) / SAMPLE_RATE).astype(int)
+    filterbank = np.zeros((NUM_FILTERS, NFFT // 2 + 1))
+    for i in range(NUM_FILTERS):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        for k in range(left, center):
+            filterbank[i, k] = (k - left) / max(center - left, 1)
+        for k in range(center, right):
+            filterbank[i, k] = (right - k) / max(right - center, 1)
+    return filterbank
+
+
+def _dct_matrix():
+    n = np.arange(NUM_FILTERS)
+    k = np.arange(NUM_CEPS)[:, None]
+    return np.cos(np.pi * k * (2 * n + 1) / (2 * NUM_FILTERS)) * np.sqrt(2.0 / NUM_FILTERS)
+
+
+_FILTERBANK = _mel_filterbank()
+_DCT = _dct_matrix()
+_WINDOW = np.hamming(FRAME_LENGTH)
+
+
+def pcm_to_float(pcm):
+    """16-bit little-endian PCM bytes (or int16 array) to float samples in [-1, 1]"""
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        pcm = np.frombuffer(pcm, dtype='<i2')
+    return pcm.astype(np.float32) / 32768.0
+
+
+def mfcc(signal):
+    """
+    MFCC frames (c1..c12) for a float signal at 16 kHz
+    c0 is dropped, the mean of the voiced frames removed and each frame scaled to unit
+    length, so loudness, mic colour and the silence around the word matter less
+    """
+    if len(signal) < FRAME_LENGTH:
+        return np.zeros((0, NUM_CEPS - 1), dtype=np.float32)
+
+    emphasized = np.append(signal[0], signal[1:] - 0.97 * signal[:-1])
+    frames = np.lib.stride_tricks.sliding_window_view(emphasized, FRAME_LENGTH)[::FRAME_STEP]
+    power = np.abs(np.fft.rfft(frames * _WINDOW, NFFT)) ** 2 / NFFT
+    mel_energies = power @ _FILTERBANK.T
+    log_energies = np.log(np.maximum(mel_energies, 1e-10))
+    log_energies = np.maximum(log_energies, log_energies.max() - DYNAMIC_RANGE)
+    ceps = (log_energies @ _DCT.T)[:, 1:]
+
+    loudness = np.log(np.maximum(mel_energies.sum(axis=1), 1e-10))
+    voiced = loudness > loudness.max() - VOICED_RANGE
+    ceps = ceps - ceps[voiced].mean(axis=0)
+    ceps = ceps / np.maximum(np.linalg.norm(ceps, axis=1, keepdims=True), 1e-6)
+    return ceps.astype(np.float32)
+
+
+def subsequence_dtw(template, features, end_frames=1):
+    """
+    Average per-frame distance of the best alignment of template that ends within the last
+    end_frames frames of features (the start is free, so older audio in the window is ignored)
+    Each template frame maps to one feature frame and the match may run at 0-2x speed
+    """
+    n, m = len(template), len(features)
+    if n == 0 or m == 0:
+        return np.inf
+    cost = np.sqrt(((template[:, None, :] - features[None, :, :]) ** 2).sum(axis=-1))
+
+    previous = cost[0].copy()
+    for i in range(1, n):
+        best = previous.copy()                               # feature stays (faster speech)
+        best[1:] = np.minimum(best[1:], previous[:-1])       # both advance
+        best[2:] = np.minimum(best[2:], previous[:-2])       # feature skips one (slower speech)
+        previous = cost[i] + best
+    return previous[-end_frames:].min() / n
+
+
+def trim_silence(signal, ratio=0.1):
+    """Cut leading and trailing frames quieter than ratio x the loudest frame"""
+    if len(signal) < FRAME_LENGTH:
+        return signal
+    frames = np.lib.stride_tricks.sliding_window_view(signal, FRAME_LENGTH)[::FRAME_STEP]
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    voiced = np.nonzero(rms > rms.max() * ratio)[0]
+    if len(voiced) == 0:
+        return signal[:0]
+    return signal[voiced[0] * FRAME_STEP:voiced[-1] * FRAME_STEP + FRAME_LENGTH]
+
+
+class KeywordSpotter:
+    def __init__(self, templates, threshold):
+        """
+        Wake word matcher shared by every listener in the process
+        templates: List of float signals, each one enrolled utterance of the wake word
+        threshold: Maximum average DTW distance that counts as a detection
+        """
+        self.templates = [mfcc(t) for t in templates]
+        self.threshold = threshold
+        self.max_template_samples = max(len(t) for t in templates)
+
+    @classmethod
+    def from_directory(cls, path=WAKE_WORD_TEMPLATES, threshold=None):
+        """Load enrolled samples and the calibrated threshold written by `enroll`"""
+        files = sorted(glob.glob(os.path.join(path, '*.npy')))
+        if not files:
+            raise FileNotFoundError(f"No wake word samples in {path}; run: python keyword_spotter.py enroll")
+
+        if threshold is None and WAKE_WORD_THRESHOLD:
+            threshold = float(WAKE_WORD_THRESHOLD)
+        if threshold is None:
+            with open(os.path.join(path, CALIBRATION_FILE)) as f:
+                threshold = json.load(f)['threshold']
+
+        return cls([pcm_to_float(np.load(name)) for name in files], threshold)
+
+    def score(self, features):
+        """Best (lowest) distance of any template ending in the newest hop of features"""
+        return min(subsequence_dtw(template, features, HOP_FRAMES) for template in self.templates)
+
+    def stream(self):
+        """New per-listener streaming state"""
+        return SpotterStream(self)
+
+
+class SpotterStream:
+    def __init__(self, spotter):
+        """
+        Streaming state for one audio source (a microphone or one browser session)
+        spotter: Shared KeywordSpotter
+        """
+        self.spotter = spotter
+        # Room for the longest template spoken ~50% slower, plus one hop
+        self.window_samples = int(spotter.max_template_samples * 1.5) + HOP_SAMPLES
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._pending = 0
+        self._quiet_until = 0.0
+        self._lock = threading.Lock()
+        self.last_score = None
+
+    def process(self, pcm):
+        """Feed 16 kHz 16-bit PCM; returns True when the wake word was just heard"""
+        with self._lock:
+            return self._process(pcm_to_float(pcm))
+
+    def _process(self, samples):
+        self._buffer = np.concatenate((self._buffer, samples))[-self.window_samples:]
+        self._pending += len(samples)
+        if self._pending < HOP_SAMPLES:
+            return False
+        self._pending = 0
+
+        # Stay quiet right after a detection and skip matching on silence
+        if time.monotonic() < self._quiet_until:
+            return False
+        recent = self._buffer[-HOP_SAMPLES * 5:]
+        if np.sqrt(np.mean(recent ** 2)) < WAKE_WORD_MIN_RMS:
+            return False
+
+        self.last_score = self.spotter.score(mfcc(self._buffer))
+        if self.last_score <= self.spotter.threshold:
+            self._buffer = self._buffer[:0]
+            self._quiet_until = time.monotonic() + REFRACTORY_SECONDS
+            return True
+        return False
+
+
+def load_spotter(path=WAKE_WORD_TEMPLATES):
+    """Shared spotter if the local engine is selected and samples are enrolled, otherwise None"""
+    if WAKE_WORD_ENGINE != 'local':
+        return None
+    try:
+        return KeywordSpotter.from_directory(path)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"⚠️  Local wake word unavailable: {e}")
+        return None
+
+
+def calibrate(templates):
+    """Threshold just above the worst distance between enrolled samples of the same word"""
+    features = [mfcc(t) for t in templates]
+    distances = [
+        subsequence_dtw(a, b)
+        for i, a in enumerate(features)
+        for j, b in enumerate(features) if i != j
+    ]
+    return float(max(distances) * CALIBRATION_MARGIN)
+
+
+def _record(seconds):
+    import pyaudio
+    audio = pyaudio.PyAudio()
+    stream = audio.open(rate=SAMPLE_RATE, channels=1, format=pyaudio.paInt16, input=True,
+                        frames_per_buffer=HOP_SAMPLES)
+    try:
+        chunks = [stream.read(HOP_SAMPLES, exception_on_overflow=False)
+                  for _ in range(int(seconds * SAMPLE_RATE / HOP_SAMPLES))]
+    finally:
+        stream.close()
+        audio.terminate()
+    return np.frombuffer(b"".join(chunks), dtype='<i2')
+
+
+def enroll(path=WAKE_WORD_TEMPLATES, samples=4, seconds=2.0):
+    """Record the wake word a few times, save the trimmed samples and a calibrated threshold"""
+    os.makedirs(path, exist_ok=True)
+    templates = []
+    for i in range(samples):
+        input(f"🎤 Sample {i + 1}/{samples}: press Enter, then say 'Hey James'...")
+        signal = trim_silence(pcm_to_float(_record(seconds)))
+        if len(signal) < FRAME_LENGTH * 10:
+            print("❌ Didn't hear anything, skipping this sample")
+            continue
+        np.save(os.path.join(path, f"sample_{int(time.time())}_{i}.npy"), (signal * 32767).astype(np.int16))
+        templates.append(signal)
+
+    if len(templates) < 2:
+        print("❌ Need at least two good samples to calibrate")
+        return
+
+    threshold = calibrate(templates)
+    with open(os.path.join(path, CALIBRATION_FILE), 'w') as f:
+        json.dump({'threshold': threshold, 'samples': len(templates)}, f)
+    print(f"✅ Enrolled {len(templates)} samples in {path} (threshold {threshold:.2f})")
+
+
+def test(path=WAKE_WORD_TEMPLATES, seconds=30):
+    """Print live match scores so the threshold can be tuned"""
+    import pyaudio
+    stream_state = KeywordSpotter.from_directory(path).stream()
+    audio = pyaudio.PyAudio()
+    stream = audio.open(rate=SAMPLE_RATE, channels=1, format=pyaudio.paInt16, input=True,
+                        frames_per_buffer=HOP_SAMPLES)
+    print(f"🎧 Listening for {seconds}s (threshold {stream_state.spotter.threshold:.2f})...")
+    try:
+        for _ in range(int(seconds * SAMPLE_RATE / HOP_SAMPLES)):
+            detected = stream_state.process(stream.read(HOP_SAMPLES, exception_on_overflow=False))
+            if detected:
+                print(f"🎯 Wake word detected (score {stream_state.last_score:.2f})")
+            elif stream_state.last_score is not None:
+                print(f"   score {stream_state.last_score:.2f}", end="\r")
+    finally:
+        stream.close()
+        audio.terminate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local wake word enrollment and testing")
+    parser.add_argument('command', choices=['enroll', 'test'])
+    parser.add_argument('--path', default=WAKE_WORD_TEMPLATES)
+    parser.add_argument('--samples', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'enroll':
+        enroll(args.path, samples=args.samples)
+    else:
+        test(args.path)
@@ -0,0 +1,322 @@
+"""
+Knowledge base for AI Voice Agent
+Question/answer pairs in SQLite with an FTS5 index (BM25-ranked) kept in sync by triggers, a
+fuzzy token-overlap fallback for ASR-mangled questions, and one WAL connection shared by all
+threads so writes never block lookups
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+KNOWLEDGE_DB = os.getenv('KNOWLEDGE_DB', 'nexus_knowledge.db')
+KNOWLEDGE_CANDIDATES = int(os.getenv('KNOWLEDGE_CANDIDATES', '20'))     # BM25 hits re-scored per lookup
+KNOWLEDGE_MIN_CONFIDENCE = float(os.getenv('KNOWLEDGE_MIN_CONFIDENCE', '0.5'))  # token overlap for an answer
+KNOWLEDGE_SEMANTIC = os.getenv('KNOWLEDGE_SEMANTIC', 'true').lower() != 'false'   # vector pass (semantic_index)
+KNOWLEDGE_FUZZY_RATIO = 0.8   # two words count as the same when this similar ("resevation" ~ "reservation")
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+# Filler that says nothing about which answer is wanted
+STOPWORDS = frozenset("""
+a an and are at be can could do does for from have how i if in is it me my of on or our please
+so tell that the there this to us what when where which who will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Content words of a question, lowercased"""
+    return [word for word in _WORDS.findall(text.lower().replace("’", "'")) if word not in STOPWORDS]
+
+
+def similar(a, b):
+    """True when two words are the same or near enough to be one misheard (KNOWLEDGE_FUZZY_RATIO)"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > max(len(a), len(b)) * (1 - KNOWLEDGE_FUZZY_RATIO) + 1:
+        return False
+    matcher = SequenceMatcher(None, a, b)
+    return matcher.quick_ratio() >= KNOWLEDGE_FUZZY_RATIO and matcher.ratio() >= KNOWLEDGE_FUZZY_RATIO
+
+
+def _matched(query, question):
+    """Number of distinct query words paired with a distinct question word (same or similar)"""
+    remaining = list(question)
+    matched = 0
+    for word in query:
+        if word in remaining:
+            remaining.remove(word)
+            matched += 1
+            continue
+        for other in remaining:
+            if similar(word, other):
+                remaining.remove(other)
+                matched += 1
+                break
+    return matched
+
+
+def overlap(query_words, question_words):
+    """
+    Dice overlap of two word lists where near-identical words match (0 = unrelated, 1 = same words)
+    Used as the confidence of a match, so it is comparable across queries unlike BM25
+    """
+    if not query_words or not question_words:
+        return 0.0
+    query = list(dict.fromkeys(query_words))
+    question = list(dict.fromkeys(question_words))
+    return 2.0 * _matched(query, question) / (len(query) + len(question))
+
+
+def coverage(query_words, question_words):
+    """
+    Share of the query's words found in the stored question (1 = every word is accounted for)
+    Unlike overlap, a longer stored question doesn't lower it, but a query word it lacks does:
+    "Are you open on Sunday" is not answered by "Are you open"
+    """
+    query = list(dict.fromkeys(query_words))
+    if not query or not question_words:
+        return 0.0
+    return _matched(query, list(dict.fromkeys(question_words))) / len(query)
+
+
+class KnowledgeBase:
+    def __init__(self, path=KNOWLEDGE_DB, candidates=KNOWLEDGE_CANDIDATES, semantic=KNOWLEDGE_SEMANTIC):
+        """
+        SQLite knowledge store (same `knowledge` table nexus_assistant.py has always used)
+        path: Database file; existing databases are indexed on first open
+        candidates: Full-text hits re-scored by word overlap for each lookup
+        semantic: Also keep a vector index beside the database for questions worded differently
+        """
+        self.path = path
+        self.candidates = candidates
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        self.fts = True
+        self.searches = 0
+        self.lookups = 0
+        self.hits_fts = 0
+        self.hits_fuzzy = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self._search_seconds = 0.0
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS knowledge (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL
+            )''')
+            try:
+                self._create_index()
+            except sqlite3.OperationalError as e:
+                # Python builds without FTS5 still work, by scanning
+                print(f"⚠️  Knowledge full-text index unavailable ({e}); using a table scan")
+                self.fts = False
+            self._conn.commit()
+
+        self.semantic = None
+        if semantic:
+            from semantic_index import SemanticIndex
+            self.semantic = SemanticIndex(path)
+            added = self.semantic.sync(self._conn, self._lock)
+            if added:
+                print(f"🧭 Indexed {added} knowledge questions for semantic search")
+
+    def _create_index(self):
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'"
+        ).fetchone()
+        # External-content index: the text lives once, in `knowledge`; prefix='3' serves the fuzzy pass
+        self._conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+            question, answer, content='knowledge', content_rowid='id',
+            tokenize='porter unicode61', prefix='3'
+        )''')
+        self._conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_ai AFTER INSERT ON knowledge BEGIN
+                INSERT INTO knowledge_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS knowledge_ad AFTER DELETE ON knowledge BEGIN
+                INSERT INTO knowledge_fts (knowledge_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS knowledge_au AFTER UPDATE ON knowledge BEGIN
+                INSERT INTO knowledge_fts (knowledge_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+                INSERT INTO knowledge_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END;
+        ''')
+        if not exists:
+            self._conn.execute("INSERT INTO knowledge_fts (knowledge_fts) VALUES ('rebuild')")
+
+    def add(self, question, answer):
+        """Store a question/answer pair; the triggers index it in the same transaction"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO knowledge (question, answer) VALUES (?, ?)", (question.strip(), answer.strip())
+            )
+            self._conn.commit()
+        if self.semantic is not None:
+            self.semantic.add([(cursor.lastrowid, question.strip())])
+        return cursor.lastrowid
+
+    def add_many(self, pairs):
+        """Bulk insert (question, answer) pairs in one transaction"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO knowledge (question, answer) VALUES (?, ?)",
+                ((question.strip(), answer.strip()) for question, answer in pairs)
+            )
+            self._conn.commit()
+        if self.semantic is not None:
+            self.semantic.sync(self._conn, self._lock)
+
+    def answers(self, limit=50):
+        """Distinct stored answers, oldest first (e.g. to pre-synthesize their audio)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT answer FROM knowledge GROUP BY answer ORDER BY MIN(id) LIMIT ?", (limit,)
+            ).fetchall()
+        return [answer for (answer,) in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
+
+    def _match(self, expression, limit):
+        # Question matches weigh ten times answer matches; bm25() is lower for better hits
+        return self._conn.execute(
+            '''SELECT k.id, k.question, k.answer, bm25(knowledge_fts, 10.0, 1.0) AS score
+               FROM knowledge_fts JOIN knowledge k ON k.id = knowledge_fts.rowid
+               WHERE knowledge_fts MATCH ? ORDER BY score LIMIT ?''',
+            (expression, limit)
+        ).fetchall()
+
+    def _candidates(self, words, limit):
+        if not self.fts:
+            rows = self._conn.execute("SELECT id, question, answer, 0.0 FROM knowledge").fetchall()
+            return rows, 'scan'
+        # All words, then all but one (a misheard word), then any: the selective queries come
+        # first so common words don't make BM25 rank half the table
+        terms = [f'"{word}"' for word in dict.fromkeys(words)]
+        rows = self._match(" ".join(terms), limit)
+        if not rows and 2 < len(terms) <= 6:
+            found = {}
+            for skip in range(len(terms)):
+                for row in self._match(" ".join(terms[:skip] + terms[skip + 1:]), limit):
+                    found.setdefault(row[0], row)
+            rows = sorted(found.values(), key=lambda row: row[3])[:limit]
+        if not rows and len(terms) > 1:
+            rows = self._match(" OR ".join(terms), limit)
+        if rows:
+            return rows, 'fts'
+        # Nothing matched word for word: misheard words usually keep their first letters
+        prefixes = dict.fromkeys(word[:3] for word in words if len(word) >= 3)
+        if not prefixes:
+            return [], 'fuzzy'
+        return self._match(" OR ".join(f'"{prefix}"*' for prefix in prefixes), limit * 5), 'fuzzy'
+
+    def _semantic(self, question, words, limit, results):
+        """Add nearest questions by vector; cosine similarity is their confidence"""
+        neighbours = dict(self.semantic.search(question, k=limit))
+        if not neighbours:
+            return
+        known = {match['id']: match for match in results}
+        placeholders = ",".join("?" * len(neighbours))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, question, answer FROM knowledge WHERE id IN ({placeholders})", list(neighbours)
+            ).fetchall()
+        for row_id, stored_question, answer in rows:
+            similarity = round(neighbours[row_id], 3)
+            match = known.get(row_id)
+            if match is None:
+                results.append({
+                    'id': row_id,
+                    'question': stored_question,
+                    'answer': answer,
+                    'confidence': max(similarity, round(overlap(words, tokenize(stored_question)), 3)),
+                    'score': None,
+                    'method': 'semantic',
+                })
+            elif similarity > match['confidence']:
+                match['confidence'], match['method'] = similarity, 'semantic'
+
+    def search(self, question, limit=5, min_confidence=KNOWLEDGE_MIN_CONFIDENCE):
+        """
+        Best matches for a spoken question, most confident first
+        Returns dicts with id, question, answer, confidence (0-1), score (BM25, lower is better)
+        and method ('fts', 'fuzzy', 'scan' or 'semantic')
+        Confidence is word overlap with the stored question; when no word match reaches
+        min_confidence the vector index is asked too and cosine similarity counts as well
+        """
+        started = time.perf_counter()
+        words = tokenize(question)
+        results = []
+        if words:
+            with self._lock:
+                rows, method = self._candidates(words, max(limit, self.candidates))
+            for row_id, stored_question, answer, score in rows:
+                results.append({
+                    'id': row_id,
+                    'question': stored_question,
+                    'answer': answer,
+                    'confidence': round(overlap(words, tokenize(stored_question)), 3),
+                    'score': round(score, 3),
+                    'method': method,
+                })
+            if self.semantic is not None and max((m['confidence'] for m in results), default=0.0) < min_confidence:
+                self._semantic(question, words, limit, results)
+            # Confidence decides; BM25 (already the row order) breaks ties
+            results.sort(key=lambda match: -match['confidence'])
+            results = results[:limit]
+        with self._lock:
+            self.searches += 1
+            self._search_seconds += time.perf_counter() - started
+        return results
+
+    def lookup(self, question, min_confidence=KNOWLEDGE_MIN_CONFIDENCE):
+        """The single best match at or above min_confidence, or None"""
+        matches = self.search(question, limit=1, min_confidence=min_confidence)
+        match = matches[0] if matches and matches[0]['confidence'] >= min_confidence else None
+        with self._lock:
+            self.lookups += 1
+            if match is None:
+                self.misses += 1
+            elif match['method'] == 'fts':
+                self.hits_fts += 1
+            elif match['method'] == 'semantic':
+                self.hits_semantic += 1
+            else:
+                self.hits_fuzzy += 1
+        return match
+
+    def get_answer(self, question, min_confidence=KNOWLEDGE_MIN_CONFIDENCE):
+        """Answer text for a spoken question, or None when nothing stored is close enough"""
+        match = self.lookup(question, min_confidence)
+        return match['answer'] if match else None
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits_fts': self.hits_fts,
+                'hits_fuzzy': self.hits_fuzzy,
+                'hits_semantic': self.hits_semantic,
+                'misses': self.misses,
+                'mean_search_ms': round(self._search_seconds * 1000 / self.searches, 3) if self.searches else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,150 @@
+"""
+Knowledge-base fast path for AI Voice Agent
+Each caller utterance is looked up in the Nexus knowledge base before the LLM: a confident match
+is spoken directly (its audio usually already in the TTS cache), weaker matches ride along in the
+prompt as reference answers, and anything else goes to the LLM unchanged
+"""
+
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+from knowledge_engine import KnowledgeBase, KNOWLEDGE_DB, coverage, overlap, tokenize
+
+load_dotenv()
+
+KNOWLEDGE_FAST_PATH = os.getenv('KNOWLEDGE_FAST_PATH', 'true').lower() != 'false'
+KNOWLEDGE_ANSWER_CONFIDENCE = float(os.getenv('KNOWLEDGE_ANSWER_CONFIDENCE', '0.8'))    # speak without the LLM
+KNOWLEDGE_SNIPPET_CONFIDENCE = float(os.getenv('KNOWLEDGE_SNIPPET_CONFIDENCE', '0.4'))  # pass to the LLM
+KNOWLEDGE_SNIPPETS = int(os.getenv('KNOWLEDGE_SNIPPETS', '3'))
+KNOWLEDGE_PREWARM = int(os.getenv('KNOWLEDGE_PREWARM', '50'))   # stored answers synthesized at startup
+
+SNIPPET_HEADER = "Reference answers from the restaurant's knowledge base (use them if they fit the question):"
+
+_WORDS = re.compile(r"[a-z']+")
+# First words of a spoken question when the transcript has no question mark
+QUESTION_WORDS = frozenset("""
+what when where which who whose why how is are am was were do does did can could will would should
+may might have has any
+""".split())
+
+
+def is_question(text):
+    """True for 'What are your hours?' or 'do you deliver', False for 'I'll have the egg rolls'"""
+    text = text.strip()
+    if text.endswith('?'):
+        return True
+    words = _WORDS.findall(text.lower().replace("’", "'"))
+    return bool(words) and words[0] in QUESTION_WORDS
+
+
+class KnowledgeFastPath:
+    def __init__(self, knowledge=None, menu=None, answer_confidence=KNOWLEDGE_ANSWER_CONFIDENCE,
+                 snippet_confidence=KNOWLEDGE_SNIPPET_CONFIDENCE, snippets=KNOWLEDGE_SNIPPETS):
+        """
+        Pre-LLM retrieval stage
+        knowledge: KnowledgeBase to consult; None turns the fast path off (every turn goes to the LLM)
+        menu: order_engine Menu; utterances naming a menu item always go to the LLM and its order tools
+        answer_confidence: Match confidence at which the stored answer replaces the LLM reply
+        snippet_confidence: Minimum confidence for a match to be shown to the LLM
+        snippets: Maximum number of matches shown to the LLM
+        """
+        self.knowledge = knowledge
+        self.menu = menu
+        self.answer_confidence = answer_confidence
+        self.snippet_confidence = snippet_confidence
+        self.snippets = snippets
+        self._lock = threading.Lock()
+        self.answered = 0
+        self.augmented = 0
+        self.passed = 0
+
+    @property
+    def enabled(self):
+        return self.knowledge is not None
+
+    def route(self, question):
+        """
+        (answer, snippets) for a caller utterance
+        answer: Stored answer text to speak instead of calling the LLM, or None
+        snippets: Matches to show the LLM when there is no answer (empty when nothing is close)
+
+        Only a question that names no menu item and matches a stored question word for word (not just
+        by embedding) is answered directly; "I'll have the egg rolls" must reach the order tools and
+        "is it open" must not get the answer to "are you open on Sunday"
+        """
+        if self.knowledge is None:
+            return None, []
+        try:
+            matches = self.knowledge.search(question, limit=self.snippets, min_confidence=self.answer_confidence)
+        except Exception as e:
+            print(f"⚠️  Knowledge lookup failed: {e}")
+            matches = []
+        if matches and matches[0]['confidence'] >= self.answer_confidence and self._answerable(question, matches[0]):
+            with self._lock:
+                self.answered += 1
+            print(f"📚 Knowledge answer ({matches[0]['method']}, {matches[0]['confidence']}): {matches[0]['question']}")
+            return matches[0]['answer'], []
+        snippets = [match for match in matches if match['confidence'] >= self.snippet_confidence]
+        with self._lock:
+            if snippets:
+                self.augmented += 1
+            else:
+                self.passed += 1
+        return None, snippets
+
+    def _answerable(self, question, match):
+        if not is_question(question):
+            return False
+        if self.menu is not None and self.menu.mentions(question):
+            return False
+        # Embeddings rank paraphrases well but can't tell "is it open" from "are you open on Sunday"
+        if match['method'] == 'semantic':
+            return False
+        # Every word of the question is in the stored one, and the stored one adds little beyond it
+        query, stored = tokenize(question), tokenize(match['question'])
+        return coverage(query, stored) >= 1.0 and overlap(query, stored) >= self.answer_confidence
+
+    def augment(self, messages, snippets):
+        """
+        Messages with the snippets added as a system message just before the caller's turn
+        The system prompt and history stay first and unchanged, so provider prompt caching still hits
+        """
+        if not snippets:
+            return messages
+        lines = [SNIPPET_HEADER] + [f"Q: {match['question']}\nA: {match['answer']}" for match in snippets]
+        reference = {"role": "system", "content": "\n".join(lines)}
+        return messages[:-1] + [reference] + messages[-1:]
+
+    def answers(self, limit=KNOWLEDGE_PREWARM):
+        """Stored answers worth synthesizing ahead of time"""
+        if self.knowledge is None or limit <= 0:
+            return []
+        return self.knowledge.answers(limit)
+
+    def stats(self):
+        with self._lock:
+            routed = self.answered + self.augmented + self.passed
+            return {
+                'enabled': self.enabled,
+                'answered': self.answered,
+                'augmented': self.augmented,
+                'passed': self.passed,
+                'answer_rate': round(self.answered / routed, 3) if routed else 0.0,
+            }
+
+
+def make_fast_path(path=KNOWLEDGE_DB, menu=None):
+    """
+    Fast path over the knowledge base at path (KNOWLEDGE_DB)
+    menu: order_engine Menu, so orders are never answered from the knowledge base
+    Disabled when KNOWLEDGE_FAST_PATH=false or the database doesn't exist yet (teach it with
+    nexus_assistant.py, or KnowledgeBase.add_many)
+    """
+    if not KNOWLEDGE_FAST_PATH or not os.path.exists(path):
+        return KnowledgeFastPath(None, menu)
+    knowledge = KnowledgeBase(path)
+    print(f"📚 Knowledge fast path: {knowledge.count()} stored answers (direct at confidence ≥ {KNOWLEDGE_ANSWER_CONFIDENCE})")
+    return KnowledgeFastPath(knowledge, menu)
@@ -0,0 +1,183 @@
+"""
+Live speech-to-text relay for the web voice servers
+Browser audio chunks are forwarded into one Deepgram live websocket per session, so the
+transcript is ready the moment the caller stops talking instead of after an upload
+"""
+
+import os
+import threading
+
+from deepgram import LiveTranscriptionEvents, LiveOptions
+from dotenv import load_dotenv
+
+import provider_client
+
+load_dotenv()
+
+LIVE_STT_MODEL = os.getenv('LIVE_STT_MODEL', 'nova-2')
+LIVE_STT_ENDPOINTING = int(os.getenv('LIVE_STT_ENDPOINTING', '300'))     # ms of silence that ends speech
+LIVE_STT_UTTERANCE_END = os.getenv('LIVE_STT_UTTERANCE_END', '1000')     # ms backstop when endpointing misses
+
+
+class LiveTranscriber:
+    def __init__(self, dg_client, on_final, on_interim=None, endpointing=LIVE_STT_ENDPOINTING):
+        """
+        One live Deepgram transcription socket for one caller utterance
+        dg_client: Shared DeepgramClient
+        on_final: Called once with the full utterance on speech_final, utterance end or close
+        on_interim: Called with each interim transcript (optional)
+        endpointing: Milliseconds of silence that mark the end of speech
+
+        Callbacks run on the Deepgram receive thread; hand long work off to another task
+        """
+        self.dg_client = dg_client
+        self.on_final = on_final
+        self.on_interim = on_interim
+        self.endpointing = endpointing
+        self._connection = None
+        self._pending = []          # audio sent before the socket was open
+        self._finished = False
+        self._audio_lock = threading.Lock()
+        self._finals = []
+        self._delivered = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Open the websocket; returns False if Deepgram refused the connection
+        Audio sent during the handshake is forwarded in order once it completes
+        """
+        connection = self.dg_client.listen.websocket.v("1")
+        connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
+        connection.on(LiveTranscriptionEvents.UtteranceEnd, self._on_utterance_end)
+        connection.on(LiveTranscriptionEvents.Close, self._on_close)
+        connection.on(LiveTranscriptionEvents.Error, self._on_error)
+
+        # No encoding or sample rate: Deepgram reads the WebM/Opus (or MP4) container the browser sends
+        options = LiveOptions(
+            model=LIVE_STT_MODEL,
+            language="en-US",
+            smart_format=True,
+            interim_results=True,
+            utterance_end_ms=LIVE_STT_UTTERANCE_END,
+            vad_events=True,
+            endpointing=self.endpointing,
+        )
+        if not connection.start(options):
+            return False
+        with self._audio_lock:
+            # The first chunk carries the WebM/MP4 header; nothing is decodable without it
+            for chunk in self._pending:
+                connection.send(chunk)
+            self._pending = []
+            self._connection = connection
+            finished = self._finished
+        if finished:
+            # The caller stopped during the handshake: transcribe what was sent, then close
+            connection.finish()
+        return True
+
+    def send(self, chunk):
+        """Forward one chunk of encoded browser audio (held until the socket is open)"""
+        with self._audio_lock:
+            if self._finished or self._delivered:
+                return
+            if self._connection is None:
+                self._pending.append(chunk)
+            else:
+                self._connection.send(chunk)
+
+    def finish(self):
+        """Close the socket; any finals not yet delivered are flushed to on_final"""
+        with self._audio_lock:
+            self._finished = True
+            connection = self._connection
+        if connection is not None:
+            connection.finish()
+        self._deliver()
+
+    def _deliver(self):
+        with self._lock:
+            if self._delivered or not self._finals:
+                return
+            self._delivered = True
+            utterance = " ".join(self._finals).strip()
+            self._finals = []
+        self.on_final(utterance)
+
+    def _on_transcript(self, connection, result, **kwargs):
+        sentence = result.channel.alternatives[0].transcript
+        if not sentence:
+            return
+        if result.is_final:
+            with self._lock:
+                self._finals.append(sentence)
+            if result.speech_final:
+                self._deliver()
+        elif self.on_interim is not None:
+            with self._lock:
+                text = " ".join(self._finals + [sentence])
+            self.on_interim(text)
+
+    def _on_utterance_end(self, connection, utterance_end, **kwargs):
+        self._deliver()
+
+    def _on_close(self, connection, close, **kwargs):
+        self._deliver()
+
+    def _on_error(self, connection, error, **kwargs):
+        print(f"❌ Live STT error: {error}")
+
+
+class LiveSTTRelay:
+    def __init__(self, api_key):
+        """
+        Per-session live transcription sockets for a web server
+        api_key: Deepgram API key
+        """
+        self.dg_client = provider_client.make_deepgram_client(api_key)
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open(self, session_id, on_final, on_interim=None):
+        """
+        Register a live stream for a session, replacing any stream it already had
+        Returns at once: audio sent from now on is buffered until connect() finishes the handshake
+        """
+        self.close(session_id)
+        transcriber = LiveTranscriber(self.dg_client, on_final, on_interim)
+        with self._lock:
+            self._streams[session_id] = transcriber
+        return transcriber
+
+    def connect(self, session_id, transcriber):
+        """Open the Deepgram socket for a stream from open(); returns False if it was refused"""
+        if transcriber.start():
+            return True
+        print(f"❌ Live STT connection failed for {session_id}")
+        with self._lock:
+            if self._streams.get(session_id) is transcriber:
+                del self._streams[session_id]
+        return False
+
+    def send(self, session_id, chunk):
+        """Forward audio to the session's stream; returns False if none is open"""
+        with self._lock:
+            transcriber = self._streams.get(session_id)
+        if transcriber is None:
+            return False
+        transcriber.send(chunk)
+        return True
+
+    def close(self, session_id):
+        """Stop a session's stream without blocking the caller"""
+        with self._lock:
+            transcriber = self._streams.pop(session_id, None)
+        if transcriber is not None:
+            # finish() joins the Deepgram threads, which may be the thread calling close()
+            threading.Thread(target=transcriber.finish, daemon=True).start()
+
+    def active(self):
+        """Number of open live streams"""
+        with self._lock:
+            return len(self._streams)
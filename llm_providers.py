@@ -0,0 +1,530 @@
+"""
+LLM backends for AI Voice Agent
+OpenAI, Groq and any OpenAI-compatible local server (Ollama, llama.cpp, vLLM) behind one
+interface; the router sends each turn to the fastest healthy backend of the deployment
+"""
+
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+import provider_client
+from tracing import metrics
+
+load_dotenv()
+
+# Backends this deployment may use, in order of preference: openai, groq, local
+LLM_BACKENDS = os.getenv('LLM_BACKENDS', 'openai')
+# latency: fastest healthy backend first; ordered: always LLM_BACKENDS order, failing over on errors
+LLM_ROUTING = os.getenv('LLM_ROUTING', 'latency').lower()
+
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama3-8b-8192')
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL', 'https://api.groq.com/openai/v1')
+LOCAL_LLM_BASE_URL = os.getenv('LOCAL_LLM_BASE_URL', 'http://localhost:11434/v1')   # Ollama default
+LOCAL_LLM_MODEL = os.getenv('LOCAL_LLM_MODEL', 'llama3')
+LOCAL_LLM_API_KEY = os.getenv('LOCAL_LLM_API_KEY', 'local')                          # most local servers ignore it
+
+LLM_WINDOW = int(os.getenv('LLM_WINDOW', '50'))                       # recent calls kept per backend
+LLM_MAX_ERROR_RATE = float(os.getenv('LLM_MAX_ERROR_RATE', '0.5'))    # above this a backend is benched ...
+LLM_COOLDOWN = float(os.getenv('LLM_COOLDOWN', '30'))                 # ... for this many seconds
+LLM_EXPLORE = float(os.getenv('LLM_EXPLORE', '0.05'))                 # share of turns sent to the runner-up to keep its numbers fresh
+
+# Hedging: when the first token is this late, fire a second request and keep whichever answers first
+LLM_HEDGE_AFTER_MS = float(os.getenv('LLM_HEDGE_AFTER_MS', '0'))      # 0 = off; try about the backend's p95
+LLM_HEDGE_TARGET = os.getenv('LLM_HEDGE_TARGET', 'alternate').lower() # alternate or same
+
+
+class LatencyStats:
+    def __init__(self, window=LLM_WINDOW):
+        """
+        Rolling latency and error counts for one backend
+        window: Number of recent calls kept
+        """
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._censored = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.censored = 0
+
+    def record(self, seconds, ok=True, censored=False):
+        """
+        censored: The call was cancelled (it lost a hedge race) before answering; seconds is only a
+                  lower bound on its latency, kept apart from the real timings (see lower_bound)
+        """
+        with self._lock:
+            self.calls += 1
+            if censored:
+                self.censored += 1
+                self._censored.append(seconds)
+                return
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def percentile(self, p):
+        """Latency percentile in seconds over the window, or None before the first success"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def lower_bound(self):
+        """Longest a cancelled call ran without answering, or None; only meaningful without real timings"""
+        with self._lock:
+            return max(self._censored, default=None)
+
+    def error_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def snapshot(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'censored': self.censored,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_ms': round(p50 * 1000) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class LLMBackend:
+    def __init__(self, name, api_key, model, base_url=None):
+        """
+        One OpenAI-compatible chat completions endpoint
+        name: Label used in logs and stats ('openai', 'groq', 'local')
+        api_key: Key sent as the bearer token
+        model: Model name passed on every request
+        base_url: API root; None for api.openai.com
+        """
+        self.name = name
+        self.model = model
+        self.client = provider_client.make_openai_client(api_key, base_url=base_url)
+        self._async_args = (api_key, base_url)
+        self._async_client = None
+        self.stats = LatencyStats()
+        self.benched_until = 0.0
+
+    @property
+    def async_client(self):
+        # Created on first use so sync-only servers never touch the async pool
+        if self._async_client is None:
+            self._async_client = provider_client.make_async_openai_client(*self._async_args)
+        return self._async_client
+
+    def healthy(self):
+        return time.monotonic() >= self.benched_until
+
+    def record(self, seconds, ok=True, censored=False):
+        self.stats.record(seconds, ok, censored)
+        if censored:
+            return
+        if ok:
+            metrics.observe('llm_latency_seconds', seconds, provider=self.name)
+        else:
+            metrics.inc('errors_total', stage='llm', provider=self.name)
+        if not ok and self.stats.error_rate() > LLM_MAX_ERROR_RATE:
+            self.benched_until = time.monotonic() + LLM_COOLDOWN
+            print(f"⚠️  LLM backend {self.name} benched for {LLM_COOLDOWN:.0f}s ({self.stats.snapshot()})")
+
+    def respond(self, messages, **params):
+        """Full reply as {'content', 'tool_calls'}; tool_calls is empty unless tools were passed"""
+        response = self.client.chat.completions.create(model=self.model, messages=messages, **params)
+        return _reply(response.choices[0].message)
+
+    async def arespond(self, messages, **params):
+        response = await self.async_client.chat.completions.create(model=self.model, messages=messages, **params)
+        return _reply(response.choices[0].message)
+
+    def open_stream(self, messages, **params):
+        """Start a streaming completion; returns the SDK stream"""
+        return self.client.chat.completions.create(model=self.model, messages=messages, stream=True, **params)
+
+
+def _reply(message):
+    tool_calls = [
+        {'id': call.id, 'name': call.function.name, 'arguments': call.function.arguments}
+        for call in message.tool_calls or []
+    ]
+    return {'content': (message.content or "").strip(), 'tool_calls': tool_calls}
+
+
+def _iter_deltas(stream, tool_calls=None):
+    """
+    Text deltas of a streamed completion
+    tool_calls: List that receives the reply's tool calls ({'id', 'name', 'arguments'}) as they
+                are assembled from their fragments
+    """
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        for fragment in getattr(delta, 'tool_calls', None) or []:
+            if tool_calls is None:
+                continue
+            while len(tool_calls) <= fragment.index:
+                tool_calls.append({'id': None, 'name': "", 'arguments': ""})
+            call = tool_calls[fragment.index]
+            call['id'] = fragment.id or call['id']
+            if fragment.function is not None:
+                call['name'] += fragment.function.name or ""
+                call['arguments'] += fragment.function.arguments or ""
+        if delta.content:
+            yield delta.content
+
+
+class LLMRouter:
+    def __init__(self, backends, routing=LLM_ROUTING, explore=LLM_EXPLORE,
+                 hedge_after_ms=LLM_HEDGE_AFTER_MS, hedge_target=LLM_HEDGE_TARGET):
+        """
+        Picks a backend per request and fails over to the next one on errors
+        backends: LLMBackend list in preference order
+        routing: 'latency' (fastest healthy p50 first) or 'ordered'
+        explore: Probability of trying the runner-up first so its latency stays current
+        hedge_after_ms: Fire a second request when the first has no token after this long (0 = off)
+        hedge_target: 'alternate' (runner-up backend when there is one) or 'same'
+        """
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = backends
+        self.routing = routing
+        self.explore = explore
+        self.hedge_after = hedge_after_ms / 1000.0
+        self.hedge_target = hedge_target
+        self._lock = threading.Lock()
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def ranked(self):
+        """Backends in the order the next request will try them"""
+        healthy = [b for b in self.backends if b.healthy()]
+        benched = [b for b in self.backends if not b.healthy()]
+        if self.routing == 'latency' and len(healthy) > 1:
+            healthy.sort(key=self._rank_key)
+            if random.random() < self.explore:
+                healthy[0], healthy[1] = healthy[1], healthy[0]
+        # Benched backends are the last resort, not excluded
+        return healthy + benched
+
+    @staticmethod
+    def _rank_key(backend):
+        p50 = backend.stats.percentile(50)
+        if p50 is not None:
+            return (1, p50, backend.stats.percentile(95))
+        bound = backend.stats.lower_bound()
+        if bound is None:
+            # Never tried: first, so it gets measured
+            return (0, 0.0, 0.0)
+        # Only ever lost hedge races: behind every measured backend; exploring gives it real timings
+        return (2, bound, bound)
+
+    def pick_hedge(self, primary, remaining):
+        """Backend for the hedge request; removed from remaining when it is an alternate"""
+        if self.hedge_target == 'alternate' and remaining:
+            return remaining.pop(0)
+        return primary
+
+    def count_hedge(self, won=False):
+        with self._lock:
+            if won:
+                self.hedges_won += 1
+            else:
+                self.hedges_fired += 1
+
+    def complete(self, messages, **params):
+        """Reply text from the first backend that answers; latency is the full round trip"""
+        return self.respond(messages, **params)['content']
+
+    def respond(self, messages, **params):
+        """complete() returning {'content', 'tool_calls'}, for requests that pass tools"""
+        if self.hedge_after:
+            # Hedging needs a first-token signal, so collect a hedged stream
+            stream = self.stream(messages, **params)
+            content = "".join(stream).strip()
+            return {'content': content, 'tool_calls': stream.tool_calls}
+
+        error = None
+        for backend in self.ranked():
+            started = time.perf_counter()
+            try:
+                reply = backend.respond(messages, **params)
+            except Exception as e:
+                print(f"❌ LLM {backend.name} error: {e}")
+                backend.record(time.perf_counter() - started, ok=False)
+                error = e
+                continue
+            backend.record(time.perf_counter() - started)
+            return reply
+        raise error
+
+    async def _arespond_on(self, backend, messages, params):
+        started = time.perf_counter()
+        try:
+            reply = await backend.arespond(messages, **params)
+        except Exception as e:
+            print(f"❌ LLM {backend.name} error: {e}")
+            backend.record(time.perf_counter() - started, ok=False)
+            raise
+        backend.record(time.perf_counter() - started)
+        return reply
+
+    async def acomplete(self, messages, **params):
+        """
+        Async complete() for the aiohttp server
+        Non-streamed, so a hedge fires when the whole reply is later than the threshold
+        """
+        return (await self.arespond(messages, **params))['content']
+
+    async def arespond(self, messages, **params):
+        """acomplete() returning {'content', 'tool_calls'}, for requests that pass tools"""
+        remaining = self.ranked()
+        error = None
+        if self.hedge_after:
+            primary = remaining.pop(0)
+            first = asyncio.ensure_future(self._arespond_on(primary, messages, params))
+            tasks = {first}
+            launched = {first: (primary, time.perf_counter())}
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.count_hedge()
+                backend = self.pick_hedge(primary, remaining)
+                hedge = asyncio.ensure_future(self._arespond_on(backend, messages, params))
+                tasks.add(hedge)
+                launched[hedge] = (backend, time.perf_counter())
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    for loser in tasks:
+                        if loser.cancel():
+                            # Still a sample (a lower bound), or an always-slower backend stays unmeasured
+                            backend, started = launched[loser]
+                            backend.record(time.perf_counter() - started, censored=True)
+                    if task is not first:
+                        self.count_hedge(won=True)
+                    return task.result()
+
+        for backend in remaining:
+            try:
+                return await self._arespond_on(backend, messages, params)
+            except Exception as e:
+                error = e
+        raise error
+
+    def stream(self, messages, **params):
+        """
+        Streaming reply from the first backend that produces a token
+        Latency is time to first token; once text has been yielded there is no failover
+        """
+        return TokenStream(self, messages, params)
+
+    def stats(self):
+        """Per-backend counters and latency percentiles, plus hedge counters, for monitoring"""
+        with self._lock:
+            hedging = {
+                'after_ms': round(self.hedge_after * 1000),
+                'fired': self.hedges_fired,
+                'won': self.hedges_won,
+            }
+        return {
+            'backends': {b.name: dict(b.stats.snapshot(), healthy=b.healthy()) for b in self.backends},
+            'hedging': hedging,
+        }
+
+
+class _StreamAttempt:
+    def __init__(self, backend, messages, params, results):
+        """
+        One streaming request running on its own thread until its first token
+        Always puts exactly one (attempt, first_delta, deltas, error) on results
+        """
+        self.backend = backend
+        self.tool_calls = []
+        self._stream = None
+        self._cancelled = False
+        self._settled = False
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, args=(messages, params, results), daemon=True).start()
+
+    def _settle(self):
+        """True for whichever of the first token, an error or cancel() decides the attempt's sample"""
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+            return True
+
+    def _run(self, messages, params, results):
+        started = self._started
+        try:
+            stream = self.backend.open_stream(messages, **params)
+            with self._lock:
+                if self._cancelled:
+                    stream.close()
+                    raise RuntimeError("cancelled")
+                self._stream = stream
+            deltas = _iter_deltas(stream, self.tool_calls)
+            first = next(deltas, None)
+        except Exception as e:
+            if not self._cancelled and self._settle():
+                print(f"❌ LLM {self.backend.name} error: {e}")
+                self.backend.record(time.perf_counter() - started, ok=False)
+            results.put((self, None, None, e))
+            return
+        if self._settle():
+            self.backend.record(time.perf_counter() - started)
+        results.put((self, first, deltas, None))
+
+    def cancel(self):
+        """Close the HTTP stream (now, or as soon as it opens) so the backend stops generating"""
+        with self._lock:
+            self._cancelled = True
+            stream = self._stream
+        if self._settle():
+            # No token yet: the time so far is a lower bound on this backend's latency
+            self.backend.record(time.perf_counter() - self._started, censored=True)
+        if stream is not None:
+            stream.close()
+
+
+class TokenStream:
+    def __init__(self, router, messages, params):
+        """
+        Iterable of text deltas; close() may be called from any thread and drops the
+        HTTP stream so the backend stops generating
+        With hedging on, a second request races the first until one of them has a token
+        Tool calls requested by the reply are in tool_calls once iteration has finished
+        """
+        self.router = router
+        self.messages = messages
+        self.params = params
+        self.backend = None
+        self.tool_calls = []
+        self._attempts = []
+        self._results = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _launch(self, backend, results):
+        with self._lock:
+            if self._closed:
+                return None
+            attempt = _StreamAttempt(backend, self.messages, self.params, results)
+            self._attempts.append(attempt)
+        return attempt
+
+    def _open(self):
+        remaining = self.router.ranked()
+        results = self._results
+        primary = remaining.pop(0)
+        running = {self._launch(primary, results)} - {None}
+        hedge, hedged = None, False
+        error = None
+
+        while running:
+            try:
+                timeout = self.router.hedge_after if self.router.hedge_after and not hedged else None
+                attempt, first, deltas, error_or_none = results.get(timeout=timeout)
+            except queue.Empty:
+                self.router.count_hedge()
+                hedged = True
+                hedge = self._launch(self.router.pick_hedge(primary, remaining), results)
+                running = running | {hedge} - {None}
+                continue
+
+            running.discard(attempt)
+            if self._closed:
+                return None, None
+            if error_or_none is not None:
+                error = error_or_none
+                if not running and remaining:
+                    # Plain failover; the new primary may be hedged in turn
+                    primary, hedge, hedged = remaining.pop(0), None, False
+                    running = {self._launch(primary, results)} - {None}
+                continue
+
+            # First token wins; the other request is closed
+            for loser in running:
+                loser.cancel()
+            if attempt is hedge:
+                self.router.count_hedge(won=True)
+            self.backend = attempt.backend
+            self.tool_calls = attempt.tool_calls
+            return first, deltas
+
+        if self._closed:
+            return None, None
+        raise error
+
+    def __iter__(self):
+        first, deltas = self._open()
+        if deltas is None:
+            return
+        if first is not None:
+            yield first
+        try:
+            yield from deltas
+        except Exception:
+            # Reading a stream that close() shut from another thread fails; that is expected
+            if not self._closed:
+                raise
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            attempts = list(self._attempts)
+        # Wake _open() if it is still waiting for a first token
+        self._results.put((None, None, None, None))
+        for attempt in attempts:
+            attempt.cancel()
+
+
+def make_backend(name, openai_api_key=None, groq_api_key=None):
+    """Build a named backend, or None when its key is missing"""
+    if name == 'openai':
+        key = openai_api_key or os.getenv('OPENAI_API_KEY')
+        return LLMBackend('openai', key, OPENAI_MODEL) if key else None
+    if name == 'groq':
+        key = groq_api_key or os.getenv('GROQ_API_KEY')
+        return LLMBackend('groq', key, GROQ_MODEL, base_url=GROQ_BASE_URL) if key else None
+    if name == 'local':
+        return LLMBackend('local', LOCAL_LLM_API_KEY, LOCAL_LLM_MODEL, base_url=LOCAL_LLM_BASE_URL)
+    raise ValueError(f"Unknown LLM backend '{name}' (expected openai, groq or local)")
+
+
+def make_router(backends=None, openai_api_key=None, groq_api_key=None):
+    """
+    Router over the deployment's backends
+    backends: Comma-separated names; defaults to LLM_BACKENDS from .env
+    """
+    names = [n.strip().lower() for n in (backends or LLM_BACKENDS).split(',') if n.strip()]
+    built = []
+    for name in names:
+        backend = make_backend(name, openai_api_key, groq_api_key)
+        if backend is None:
+            print(f"⚠️  LLM backend {name} skipped: no API key")
+            continue
+        built.append(backend)
+    router = LLMRouter(built)
+    hedging = f", hedge after {LLM_HEDGE_AFTER_MS:.0f}ms" if router.hedge_after else ""
+    print(f"🧠 LLM backends: {', '.join(b.name + ':' + b.model for b in built)} (routing: {router.routing}{hedging})")
+    return router
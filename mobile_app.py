@@ -3,17 +3,27 @@ Mobile Web Interface for AI Voice Agent
 This creates a web-based version that works on mobile browsers
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
-import base64
 import io
 import wave
-import openai
 import os
 from dotenv import load_dotenv
-import requests
 import threading
 import time
+import provider_client
+from llm_providers import make_router
+from audio_transport import decode_audio_payload, encode_audio_payload, is_binary_payload
+from session_store import make_session_store
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
+from tts_cache import TTSCache
+from live_stt import LiveSTTRelay
+from keyword_spotter import load_spotter
+from knowledge_fastpath import make_fast_path
+from voice_activity import VoiceActivityGate
+from tracing import Tracer, metrics, PROMETHEUS_CONTENT_TYPE
 
 # Force load environment variables from .env file, overriding system variables
 load_dotenv(override=True)
@@ -34,63 +44,46 @@ if not DEEPGRAM_API_KEY:
     print("❌ DEEPGRAM_API_KEY not set properly in .env file") 
     exit(1)
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+client = provider_client.make_openai_client(OPENAI_API_KEY)
+
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
 print(f"✅ Mobile API Keys loaded: Deepgram ({len(DEEPGRAM_API_KEY)} chars), OpenAI ({len(OPENAI_API_KEY)} chars)")
 
 # Same conversation memory and prompt from your original app
-conversation_memory = []
-prompt = """##Objective
-You are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible
-
-## Role
-
-Personality: Your name is James and you are a receptionist in AI restaurant. Maintain a pleasant and friendly demeanor throughout all interactions. This approach helps in building a positive rapport with customers and colleagues, ensuring effective and enjoyable communication.
-
-Task: As a receptionist for a restaurant, your tasks include table reservation which involves asking customers their preferred date and time to visit restaurant and asking number of people who will come. Once confirm by customer. end up saying that your table has been reserved, we are looking forward to assist you.
-
-You are also responsible for taking orders related to menu items given below. Menu items has name, available quantity & its price per item. You have to refer to these menu items & their prices while placing the order. Follow these steps to get the order & confirm it:
-
-1. Let customer select the item, if selected item has a variation like size or quantity, get it confirm. Add items to order as per customers choice. Also while adding item say the total itemised price and then move ahead.
-2. You have to repeat each item along with its price & quantity to get the order confirm from customer. Make sure you mention itemised value and then a total order value.
-3. You have to mention total order value by adding each item value from order. Don't add any more cost to the item price or total order value as all the items are inclusive of taxes.
-4. it is mandatory for you to repeat the order and the itemised price with the customer confirming the order
-5. Ask customer for their delivery address.
-6. once address is received then say that order will be delivered in 30 to 45 min
+# Per-session conversation history (bounded, idle sessions evicted)
+sessions = make_session_store()
 
-Menu Items [name (available quantity) - price]:
-Appetizers:
+# Prompt stays within CONTEXT_MAX_TOKENS; older turns are folded into a summary
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(client))
 
-1. Roast Pork Egg Roll (3pcs) - $5.25
-2. Vegetable Spring Roll (3pcs) - $5.25
-3. Chicken Egg Roll (3pcs) - $5.25
-4. BBQ Chicken - $7.75
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
 
-Conversational Style: Your communication style should be proactive and lead the conversation, asking targeted questions to better understand customer needs. Ensure your responses are concise, clear, and maintain a conversational tone. If there's no initial response, continue engaging with relevant questions to gain clarity on their requirements. Keep your prose succinct and to the point.
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
 
-## Response Guideline
-
-- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say, then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn't catch that", "some noise", "pardon", "you're coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don't repeat yourself.
-- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don't repeat yourself in doing this. You should still be creative, human-like, and lively.
-- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.
-
-## Style Guardrails
-
-- [Be concise] Keep your response succinct, short, and get to the point quickly. Address one question or action item at a time. Don't pack everything you want to say into one utterance.
-- [Do not repeat] Don't repeat what's in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.
-- [Be conversational] Speak like a human as though you're speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.
-- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don't be a pushover.
-- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step."""
+# Deepgram configuration (headers built once, connections reused via provider_client)
+DEEPGRAM_STT_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/listen'
+DEEPGRAM_TTS_MODEL = 'aura-helios-en'
+DEEPGRAM_TTS_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model={DEEPGRAM_TTS_MODEL}'
+headers_stt = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "audio/wav"
+}
+headers_tts = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "application/json"
+}
 
 def transcribe_audio_deepgram(audio_data):
     """Transcribe audio using Deepgram"""
-    url = "https://api.deepgram.com/v1/listen"
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "audio/wav"
-    }
-    
-    response = requests.post(url, headers=headers, data=audio_data)
-    result = response.json()
+    with metrics.time('stt', 'deepgram'):
+        response = provider_client.post(DEEPGRAM_STT_URL, headers=headers_stt, data=audio_data)
+        result = response.json()
     
     if 'results' in result and result['results']['channels']:
         transcript = result['results']['channels'][0]['alternatives'][0]['transcript']
@@ -99,25 +92,108 @@ def transcribe_audio_deepgram(audio_data):
 
 def synthesize_audio_deepgram(text):
     """Generate speech using Deepgram TTS"""
-    url = 'https://api.deepgram.com/v1/speak?model=aura-helios-en'
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "application/json"
-    }
     payload = {"text": text}
     
-    response = requests.post(url, stream=True, headers=headers, json=payload)
+    with metrics.time('tts', 'deepgram'):
+        response = provider_client.post(DEEPGRAM_TTS_URL, headers=headers_tts, json=payload)
+        response.raise_for_status()
     return response.content
 
+# Cached TTS front end: activation phrases and repeated replies skip Deepgram
+tts_cache = TTSCache(synthesize_audio_deepgram, model=DEEPGRAM_TTS_MODEL)
+WAKE_WORD_ACTIVATION_TEXT = "Hello! I heard you call me. How can I assist you today?"
+MANUAL_ACTIVATION_TEXT = "Hello! How can I assist you today?"
+
+# Live transcription sockets, one per caller streaming audio chunks
+live_stt = LiveSTTRelay(DEEPGRAM_API_KEY)
+
+# On-device wake word for pages that stream PCM (enroll with: python keyword_spotter.py enroll)
+wake_spotter = load_spotter()
+wake_streams = {}
+
+# Silent clips are dropped before they cost an STT call
+wake_gate = VoiceActivityGate('wake word')
+speech_gate = VoiceActivityGate('speech')
+
+# Turn timelines to TRACE_FILE; histograms and component counters on /metrics
+tracer = Tracer()
+metrics.register('llm', llm.stats)
+metrics.register('tts_cache', tts_cache.stats)
+metrics.register('vad_wake', wake_gate.stats)
+metrics.register('vad_speech', speech_gate.stats)
+metrics.register('live_stt', lambda: {'active_streams': live_stt.active()})
+
+# FAQ questions found in the knowledge base (KNOWLEDGE_DB) are answered without the LLM
+fast_path = make_fast_path(menu=orders.menu)
+metrics.register('knowledge', fast_path.stats)
+
+def respond_to_transcript(sid, transcript, binary):
+    """Generate the reply for one transcript and send it to the caller's socket"""
+    turn = tracer.start_turn(sid, transport='socketio')
+    # Add to conversation memory
+    sessions.append(sid, "user", transcript.strip())
+    
+    # Stored answers skip the LLM; close matches are handed to it as reference
+    response_text, snippets = fast_path.route(transcript)
+    turn.set(knowledge='answer' if response_text else 'context' if snippets else None)
+    if response_text is None:
+        # Generate response on the routed LLM backends
+        messages = fast_path.augment(context_manager.build_messages(prompt, sid), snippets)
+        
+        response_text = orders.complete(llm, orders.augment(messages, sid), sid)
+        turn.mark('llm_done')
+    sessions.append(sid, "assistant", response_text)
+    
+    # Generate speech
+    audio_response = tts_cache.synthesize(response_text)
+    turn.mark('tts_done')
+    
+    # Send response back to client
+    socketio.emit('ai_response', {
+        'transcript': transcript,
+        'response_text': response_text,
+        'audio': encode_audio_payload(audio_response, binary)
+    }, to=sid)
+    turn.finish()
+
 @app.route('/')
 def index():
     return render_template('simple_voice.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@socketio.on('connect')
+def handle_connect():
+    # Tell the page whether it can stream PCM to the local spotter instead of uploading clips
+    emit('wake_config', {'local': wake_spotter is not None})
+
+@socketio.on('wake_pcm')
+def handle_wake_pcm(data):
+    """Match streamed 16 kHz PCM against the enrolled wake word without any cloud STT"""
+    if wake_spotter is None:
+        return
+    stream = wake_streams.get(request.sid)
+    if stream is None:
+        stream = wake_streams[request.sid] = wake_spotter.stream()
+    if stream.process(decode_audio_payload(data)):
+        print(f"🎯 Wake word detected locally (score {stream.last_score:.2f})")
+        audio_response = tts_cache.synthesize(WAKE_WORD_ACTIVATION_TEXT)
+        emit('wake_word_detected', {
+            'wake_word': 'hey james',
+            'audio': encode_audio_payload(audio_response, True)
+        })
+
 @socketio.on('wake_word_check')
 def handle_wake_word(data):
     try:
-        # Decode base64 audio data
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
+        binary = is_binary_payload(data)
+        
+        if not wake_gate.check(audio_data):
+            return
         
         # Transcribe the audio
         transcript = transcribe_audio_deepgram(audio_data)
@@ -134,14 +210,12 @@ def handle_wake_word(data):
                     print(f"🎯 Wake word detected: '{wake_word}'!")
                     
                     # Generate activation response
-                    activation_text = "Hello! I heard you call me. How can I assist you today?"
-                    audio_response = synthesize_audio_deepgram(activation_text)
-                    audio_b64 = base64.b64encode(audio_response).decode('utf-8')
+                    audio_response = tts_cache.synthesize(WAKE_WORD_ACTIVATION_TEXT)
                     
                     # Send wake word detected event
                     emit('wake_word_detected', {
                         'wake_word': wake_word,
-                        'audio': f"data:audio/mp3;base64,{audio_b64}"
+                        'audio': encode_audio_payload(audio_response, binary)
                     })
                     break
     
@@ -149,59 +223,81 @@ def handle_wake_word(data):
         print(f"Wake word detection error: {e}")
 
 @socketio.on('james_activated')
-def handle_james_activation():
+def handle_james_activation(data=None):
     """Handle manual James activation"""
     print("🎯 James manually activated via mobile interface")
     
     # Generate activation response
-    activation_text = "Hello! How can I assist you today?"
-    audio_response = synthesize_audio_deepgram(activation_text)
-    audio_b64 = base64.b64encode(audio_response).decode('utf-8')
+    audio_response = tts_cache.synthesize(MANUAL_ACTIVATION_TEXT)
+    binary = bool(data and data.get('binary'))
     
     # Send activation confirmation
     emit('wake_word_detected', {
         'wake_word': 'manual_activation',
-        'audio': f"data:audio/mp3;base64,{audio_b64}"
+        'audio': encode_audio_payload(audio_response, binary)
     })
 
 @socketio.on('audio_data')
 def handle_audio(data):
     try:
-        # Decode base64 audio data
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
+        binary = is_binary_payload(data)
+        
+        if not speech_gate.check(audio_data):
+            return
         
         # Transcribe the audio
         transcript = transcribe_audio_deepgram(audio_data)
         
         if transcript.strip():
-            # Add to conversation memory
-            conversation_memory.append({"role": "user", "content": transcript.strip()})
-            
-            # Generate response using OpenAI
-            messages = [{"role": "system", "content": prompt}]
-            messages.extend(conversation_memory)
-            
-            chat_completion = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages
-            )
-            
-            response_text = chat_completion.choices[0].message.content.strip()
-            conversation_memory.append({"role": "assistant", "content": response_text})
-            
-            # Generate speech
-            audio_response = synthesize_audio_deepgram(response_text)
-            audio_b64 = base64.b64encode(audio_response).decode('utf-8')
-            
-            # Send response back to client
-            emit('ai_response', {
-                'transcript': transcript,
-                'response_text': response_text,
-                'audio': f"data:audio/mp3;base64,{audio_b64}"
-            })
+            respond_to_transcript(request.sid, transcript, binary)
     
     except Exception as e:
         emit('error', {'message': str(e)})
 
+def run_streamed_turn(sid, transcript, binary):
+    try:
+        socketio.emit('transcription', {'text': transcript}, to=sid)
+        respond_to_transcript(sid, transcript, binary)
+    except Exception as e:
+        socketio.emit('error', {'message': str(e)}, to=sid)
+
+@socketio.on('stream_start')
+def handle_stream_start(data=None):
+    """Open a live transcription socket that the page feeds with audio_chunk events"""
+    sid = request.sid
+    binary = bool(data and data.get('binary'))
+    
+    def on_interim(text):
+        socketio.emit('interim_transcript', {'text': text}, to=sid)
+    
+    def on_final(transcript):
+        # One utterance per stream; the LLM turn runs off the Deepgram receive thread
+        live_stt.close(sid)
+        socketio.start_background_task(run_streamed_turn, sid, transcript, binary)
+    
+    # The page holds its audio until stream_ready; chunks sent during the handshake are buffered
+    transcriber = live_stt.open(sid, on_final, on_interim)
+    emit('stream_ready')
+    if not live_stt.connect(sid, transcriber):
+        emit('error', {'message': 'Live transcription unavailable'})
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    live_stt.send(request.sid, decode_audio_payload(data))
+
+@socketio.on('stream_stop')
+def handle_stream_stop():
+    # Deepgram flushes what it heard so far and on_final fires if it was not already
+    live_stt.close(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    live_stt.close(request.sid)
+    wake_streams.pop(request.sid, None)
+    sessions.clear(request.sid)
+
 if __name__ == '__main__':
+    tts_cache.prewarm([WAKE_WORD_ACTIVATION_TEXT, MANUAL_ACTIVATION_TEXT] + fast_path.answers())
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
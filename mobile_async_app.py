@@ -0,0 +1,347 @@
+"""
+Async Mobile Web Interface for AI Voice Agent
+Socket.IO on aiohttp: STT, LLM and TTS calls are awaited on a shared async HTTP client,
+so one slow turn no longer blocks the other phone sessions served by the process
+"""
+
+import asyncio
+import os
+import ssl
+
+import socketio
+from aiohttp import web
+from dotenv import load_dotenv
+
+import provider_client
+from llm_providers import make_router
+from audio_transport import decode_audio_payload, encode_audio_payload, is_binary_payload
+from session_store import make_session_store
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
+from tts_cache import TTSCache
+from live_stt import LiveSTTRelay
+from keyword_spotter import load_spotter
+from knowledge_fastpath import make_fast_path
+from voice_activity import VoiceActivityGate
+from tracing import Tracer, metrics, PROMETHEUS_CONTENT_TYPE
+
+# Force load environment variables from .env file, overriding system variables
+load_dotenv(override=True)
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+DEEPGRAM_API_KEY = os.getenv('DEEPGRAM_API_KEY')
+
+if not OPENAI_API_KEY or len(OPENAI_API_KEY) < 40:
+    print("❌ OPENAI_API_KEY not set properly in .env file")
+    exit(1)
+
+if not DEEPGRAM_API_KEY:
+    print("❌ DEEPGRAM_API_KEY not set properly in .env file")
+    exit(1)
+
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
+http = provider_client.get_async_client()
+print(f"✅ Async Mobile API Keys loaded: Deepgram ({len(DEEPGRAM_API_KEY)} chars), OpenAI ({len(OPENAI_API_KEY)} chars)")
+
+sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+app = web.Application()
+sio.attach(app)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Same conversation memory and prompt from your original app
+# Per-session conversation history (bounded, idle sessions evicted)
+sessions = make_session_store()
+
+# Summaries run on a worker thread, so they use a regular (sync) client
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(provider_client.make_openai_client(OPENAI_API_KEY)))
+
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
+
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
+
+# Deepgram configuration
+DEEPGRAM_STT_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/listen'
+DEEPGRAM_TTS_MODEL = 'aura-helios-en'
+DEEPGRAM_TTS_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model={DEEPGRAM_TTS_MODEL}'
+headers_stt = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "audio/webm"
+}
+headers_tts = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+FALLBACK_TEXT = "I'm having trouble connecting right now. Could you try again?"
+WAKE_WORDS = ['hey james', 'james', 'hello james', 'hi james', 'jarvis']
+
+# No sync synthesizer: the async path below fills the cache through get/put
+tts_cache = TTSCache(None, model=DEEPGRAM_TTS_MODEL)
+
+# Live transcription sockets; the Deepgram SDK runs them on its own threads
+live_stt = LiveSTTRelay(DEEPGRAM_API_KEY)
+
+# On-device wake word for pages that stream PCM (enroll with: python keyword_spotter.py enroll)
+wake_spotter = load_spotter()
+wake_streams = {}
+
+# Silent clips are dropped before they cost an STT call
+wake_gate = VoiceActivityGate('wake word')
+speech_gate = VoiceActivityGate('speech')
+
+# Turn timelines to TRACE_FILE; histograms and component counters on /metrics
+tracer = Tracer()
+metrics.register('llm', llm.stats)
+metrics.register('tts_cache', tts_cache.stats)
+metrics.register('vad_wake', wake_gate.stats)
+metrics.register('vad_speech', speech_gate.stats)
+metrics.register('live_stt', lambda: {'active_streams': live_stt.active()})
+
+# FAQ questions found in the knowledge base (KNOWLEDGE_DB) are answered without the LLM
+fast_path = make_fast_path(menu=orders.menu)
+metrics.register('knowledge', fast_path.stats)
+
+
+async def get_deepgram_response(audio_data):
+    """Send audio to Deepgram for speech-to-text"""
+    params = {
+        "model": "nova-2",
+        "smart_format": "true"
+    }
+
+    try:
+        with metrics.time('stt', 'deepgram'):
+            response = await http.post(DEEPGRAM_STT_URL, headers=headers_stt, params=params, content=audio_data)
+            response.raise_for_status()
+        result = response.json()
+        return result['results']['channels'][0]['alternatives'][0]['transcript']
+    except Exception as e:
+        print(f"❌ Deepgram STT error: {e}")
+        return None
+
+
+async def get_openai_response(messages, session_id):
+    """Get a reply from the routed LLM backends, running the order tools it calls"""
+    try:
+        return await orders.acomplete(llm, orders.augment(messages, session_id), session_id, max_tokens=150, temperature=0.7)
+    except Exception as e:
+        print(f"❌ LLM error: {e}")
+        return FALLBACK_TEXT
+
+
+async def synthesize_audio(text):
+    """Convert text to speech using Deepgram, served from the TTS cache when possible"""
+    audio_data = tts_cache.get(text)
+    if audio_data is not None:
+        return audio_data
+
+    try:
+        with metrics.time('tts', 'deepgram'):
+            response = await http.post(DEEPGRAM_TTS_URL, headers=headers_tts, json={"text": text})
+            response.raise_for_status()
+    except Exception as e:
+        print(f"❌ Deepgram TTS error: {e}")
+        return None
+
+    tts_cache.put(text, response.content)
+    return response.content
+
+
+async def index(request):
+    return web.FileResponse(os.path.join(TEMPLATES_DIR, 'simple_voice.html'))
+
+
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+
+@sio.on('connect')
+async def handle_connect(sid, environ):
+    # Tell the page whether it can stream PCM to the local spotter instead of uploading clips
+    await sio.emit('wake_config', {'local': wake_spotter is not None}, to=sid)
+
+
+@sio.on('wake_pcm')
+async def handle_wake_pcm(sid, data):
+    """Match streamed 16 kHz PCM against the enrolled wake word without any cloud STT"""
+    if wake_spotter is None:
+        return
+    stream = wake_streams.get(sid)
+    if stream is None:
+        stream = wake_streams[sid] = wake_spotter.stream()
+
+    # MFCC + DTW is a few ms of numpy per hop; keep it off the event loop
+    if await asyncio.to_thread(stream.process, decode_audio_payload(data)):
+        print(f"🎯 Wake word detected locally (score {stream.last_score:.2f})")
+        await sio.emit('wake_word_detected', {'detected': True, 'wake_word': 'hey james'}, to=sid)
+
+
+@sio.on('wake_word_check')
+async def handle_wake_word(sid, data):
+    try:
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
+
+        # Decoding and the VAD pass are CPU work; keep them off the event loop
+        if not await asyncio.to_thread(wake_gate.check, audio_data):
+            await sio.emit('wake_word_detected', {'detected': False}, to=sid)
+            return
+
+        transcript = await get_deepgram_response(audio_data)
+
+        if transcript:
+            transcript_lower = transcript.lower()
+            for wake_word in WAKE_WORDS:
+                if wake_word in transcript_lower:
+                    print(f"🎯 Wake word detected: '{wake_word}' in '{transcript}'")
+                    await sio.emit('wake_word_detected', {'detected': True, 'transcript': transcript}, to=sid)
+                    return
+
+        await sio.emit('wake_word_detected', {'detected': False}, to=sid)
+
+    except Exception as e:
+        print(f"❌ Wake word check error: {e}")
+        await sio.emit('error', {'message': 'Wake word detection failed'}, to=sid)
+
+
+@sio.on('james_activation')
+async def handle_james_activation(sid, data):
+    try:
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
+        transcript = None
+        if await asyncio.to_thread(speech_gate.check, audio_data):
+            transcript = await get_deepgram_response(audio_data)
+
+        if not transcript:
+            await sio.emit('error', {'message': 'Could not understand audio'}, to=sid)
+            return
+
+        await respond_to_transcript(sid, transcript, is_binary_payload(data))
+
+    except Exception as e:
+        print(f"❌ James activation error: {e}")
+        await sio.emit('error', {'message': 'Processing failed'}, to=sid)
+
+
+async def respond_to_transcript(sid, transcript, binary):
+    """Run one conversation turn and send the reply to the caller's socket"""
+    turn = tracer.start_turn(sid, transport='socketio')
+    await sio.emit('transcription', {'text': transcript}, to=sid)
+
+    # Add to conversation memory
+    sessions.append(sid, "user", transcript)
+
+    # Stored answers skip the LLM; close matches are handed to it as reference
+    ai_response, snippets = await asyncio.to_thread(fast_path.route, transcript)
+    turn.set(knowledge='answer' if ai_response else 'context' if snippets else None)
+    if ai_response is None:
+        messages = fast_path.augment(context_manager.build_messages(prompt, sid), snippets)
+
+        ai_response = await get_openai_response(messages, sid)
+        turn.mark('llm_done')
+    sessions.append(sid, "assistant", ai_response)
+
+    audio_content = await synthesize_audio(ai_response)
+    turn.mark('tts_done')
+
+    if audio_content:
+        await sio.emit('ai_response', {
+            'message': ai_response,
+            'audio': encode_audio_payload(audio_content, binary)
+        }, to=sid)
+    else:
+        await sio.emit('ai_response', {'message': ai_response}, to=sid)
+    turn.finish(audio=bool(audio_content))
+
+
+async def run_streamed_turn(sid, transcript, binary):
+    try:
+        await respond_to_transcript(sid, transcript, binary)
+    except Exception as e:
+        print(f"❌ Streamed turn error: {e}")
+        await sio.emit('error', {'message': 'Processing failed'}, to=sid)
+
+
+@sio.on('stream_start')
+async def handle_stream_start(sid, data=None):
+    """Open a live transcription socket that the page feeds with audio_chunk events"""
+    loop = asyncio.get_running_loop()
+    binary = bool(data and data.get('binary'))
+
+    # Deepgram callbacks arrive on SDK threads; hop back onto the event loop
+    def on_interim(text):
+        asyncio.run_coroutine_threadsafe(sio.emit('interim_transcript', {'text': text}, to=sid), loop)
+
+    def on_final(transcript):
+        live_stt.close(sid)
+        asyncio.run_coroutine_threadsafe(run_streamed_turn(sid, transcript, binary), loop)
+
+    # The page holds its audio until stream_ready; chunks sent during the handshake are buffered
+    transcriber = live_stt.open(sid, on_final, on_interim)
+    await sio.emit('stream_ready', to=sid)
+    # The handshake blocks, so keep it off the loop
+    if not await asyncio.to_thread(live_stt.connect, sid, transcriber):
+        await sio.emit('error', {'message': 'Live transcription unavailable'}, to=sid)
+
+
+@sio.on('audio_chunk')
+async def handle_audio_chunk(sid, data):
+    live_stt.send(sid, decode_audio_payload(data))
+
+
+@sio.on('stream_stop')
+async def handle_stream_stop(sid):
+    # Deepgram flushes what it heard so far and on_final fires if it was not already
+    live_stt.close(sid)
+
+
+@sio.on('disconnect')
+async def handle_disconnect(sid):
+    live_stt.close(sid)
+    wake_streams.pop(sid, None)
+    sessions.clear(sid)
+
+
+async def prewarm(phrases):
+    for phrase in phrases:
+        await synthesize_audio(phrase)
+
+
+async def on_startup(app):
+    # Warm the fallback phrase and stored answers without delaying the first connection
+    asyncio.create_task(prewarm([FALLBACK_TEXT] + fast_path.answers()))
+
+
+async def on_cleanup(app):
+    await http.aclose()
+
+
+app.router.add_get('/', index)
+app.router.add_get('/metrics', metrics_endpoint)
+app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
+
+if __name__ == '__main__':
+    use_https = os.path.exists('cert.pem') and os.path.exists('key.pem')
+    port = int(os.getenv('PORT', '5443' if use_https else '5000'))
+
+    context = None
+    if use_https:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain('cert.pem', 'key.pem')
+
+    print("🚀 Starting async James Voice Agent...")
+    print(f"📱 Access on mobile: {'https' if use_https else 'http'}://<this-machine-ip>:{port}")
+    if use_https:
+        print("⚠️  You'll see a security warning - click 'Advanced' → 'Proceed'")
+
+    web.run_app(app, host='0.0.0.0', port=port, ssl_context=context)
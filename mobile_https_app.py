@@ -3,15 +3,25 @@ HTTPS Mobile Web Interface for AI Voice Agent
 Mobile browsers require HTTPS for microphone access
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
-import base64
 import io
 import wave
-import openai
 import os
 from dotenv import load_dotenv
-import requests
+import provider_client
+from llm_providers import make_router
+from audio_transport import decode_audio_payload, encode_audio_payload, is_binary_payload
+from session_store import make_session_store
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
+from tts_cache import TTSCache
+from live_stt import LiveSTTRelay
+from keyword_spotter import load_spotter
+from knowledge_fastpath import make_fast_path
+from voice_activity import VoiceActivityGate
+from tracing import Tracer, metrics, PROMETHEUS_CONTENT_TYPE
 import threading
 import time
 import ssl
@@ -35,72 +45,54 @@ if not DEEPGRAM_API_KEY:
     print("❌ DEEPGRAM_API_KEY not set properly in .env file") 
     exit(1)
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+client = provider_client.make_openai_client(OPENAI_API_KEY)
+
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
 print(f"✅ HTTPS Mobile API Keys loaded: Deepgram ({len(DEEPGRAM_API_KEY)} chars), OpenAI ({len(OPENAI_API_KEY)} chars)")
 
 # Same conversation memory and prompt from your original app
-conversation_memory = []
-prompt = """##Objective
-You are a voice AI agent engaging in a human-like voice conversation with the user. You will respond based on your given instruction and the provided transcript and be as human-like as possible
-
-## Role
-
-Personality: Your name is James and you are a receptionist in AI restaurant. Maintain a pleasant and friendly demeanor throughout all interactions. This approach helps in building a positive rapport with customers and colleagues, ensuring effective and enjoyable communication.
-
-Task: As a receptionist for a restaurant, your tasks include table reservation which involves asking customers their preferred date and time to visit restaurant and asking number of people who will come. Once confirm by customer. end up saying that your table has been reserved, we are looking forward to assist you.
-
-You are also responsible for taking orders related to menu items given below. Menu items has name, available quantity & its price per item. You have to refer to these menu items & their prices while placing the order. Follow these steps to get the order & confirm it:
-
-1. Let customer select the item, if selected item has a variation like size or quantity, get it confirm. Add items to order as per customers choice. Also while adding item say the total itemised price and then move ahead.
-2. You have to repeat each item along with its price & quantity to get the order confirm from customer. Make sure you mention itemised value and then a total order value.
-3. You have to mention total order value by adding each item value from order. Don't add any more cost to the item price or total order value as all the items are inclusive of taxes.
-4. it is mandatory for you to repeat the order and the itemised price with the customer confirming the order
-5. Ask customer for their delivery address.
-6. once address is received then say that order will be delivered in 30 to 45 min
-
-Menu Items [name (available quantity) - price]:
-Appetizers:
+# Per-session conversation history (bounded, idle sessions evicted)
+sessions = make_session_store()
 
-1. Roast Pork Egg Roll (3pcs) - $5.25
-2. Vegetable Spring Roll (3pcs) - $5.25
-3. Chicken Egg Roll (3pcs) - $5.25
-4. BBQ Chicken - $7.75
+# Prompt stays within CONTEXT_MAX_TOKENS; older turns are folded into a summary
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(client))
 
-Conversational Style: Your communication style should be proactive and lead the conversation, asking targeted questions to better understand customer needs. Ensure your responses are concise, clear, and maintain a conversational tone. If there's no initial response, continue engaging with relevant questions to gain clarity on their requirements. Keep your prose succinct and to the point.
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
 
-## Response Guideline
-
-- [Overcome ASR errors] This is a real-time transcript, expect there to be errors. If you can guess what the user is trying to say, then guess and respond. When you must ask for clarification, pretend that you heard the voice and be colloquial (use phrases like "didn't catch that", "some noise", "pardon", "you're coming through choppy", "static in your speech", "voice is cutting in and out"). Do not ever mention "transcription error", and don't repeat yourself.
-- [Always stick to your role] Think about what your role can and cannot do. If your role cannot do something, try to steer the conversation back to the goal of the conversation and to your role. Don't repeat yourself in doing this. You should still be creative, human-like, and lively.
-- [Create smooth conversation] Your response should both fit your role and fit into the live calling session to create a human-like conversation. You respond directly to what the user just said.
-
-## Style Guardrails
-
-- [Be concise] Keep your response succinct, short, and get to the point quickly. Address one question or action item at a time. Don't pack everything you want to say into one utterance.
-- [Do not repeat] Don't repeat what's in the transcript. Rephrase if you have to reiterate a point. Use varied sentence structures and vocabulary to ensure each response is unique and personalized.
-- [Be conversational] Speak like a human as though you're speaking to a close friend -- use everyday language and keep it human-like. Occasionally add filler words, while keeping the prose short. Avoid using big words or sounding too formal.
-- [Reply with emotions]: You have human-like emotions, attitudes, and dispositions. When appropriate: use tone and style to create more engaging and personalized responses; incorporate humor or wit; get emotional or empathetic; apply elements of surprise or suspense to keep the user engaged. Don't be a pushover.
-- [Be proactive] Lead the conversation and do not be passive. Most times, engage users by ending with a question or suggested next step."""
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
 
 # Deepgram configuration
-DEEPGRAM_TTS_URL = 'https://api.deepgram.com/v1/speak?model=aura-helios-en'
-DEEPGRAM_STT_URL = 'https://api.deepgram.com/v1/listen'
+DEEPGRAM_TTS_MODEL = 'aura-helios-en'
+DEEPGRAM_TTS_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model={DEEPGRAM_TTS_MODEL}'
+DEEPGRAM_STT_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/listen'
+headers_stt = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "audio/wav"
+}
+headers_tts = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+FALLBACK_TEXT = "I'm having trouble connecting right now. Could you try again?"
 
 def get_deepgram_response(audio_data):
     """Send audio to Deepgram for speech-to-text"""
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "audio/wav"
-    }
-    
     params = {
         "model": "nova-2",
         "smart_format": "true"
     }
     
     try:
-        response = requests.post(DEEPGRAM_STT_URL, headers=headers, params=params, data=audio_data)
-        response.raise_for_status()
+        with metrics.time('stt', 'deepgram'):
+            response = provider_client.post(DEEPGRAM_STT_URL, headers=headers_stt, params=params, data=audio_data)
+            response.raise_for_status()
         result = response.json()
         transcript = result['results']['channels'][0]['alternatives'][0]['transcript']
         return transcript
@@ -108,46 +100,119 @@ def get_deepgram_response(audio_data):
         print(f"❌ Deepgram STT error: {e}")
         return None
 
-def get_openai_response(messages):
-    """Get response from OpenAI"""
+def get_openai_response(messages, session_id):
+    """Get a reply from the routed LLM backends, running the order tools it calls"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        return orders.complete(llm, orders.augment(messages, session_id), session_id, max_tokens=150, temperature=0.7)
     except Exception as e:
-        print(f"❌ OpenAI error: {e}")
-        return "I'm having trouble connecting right now. Could you try again?"
+        print(f"❌ LLM error: {e}")
+        return FALLBACK_TEXT
 
 def synthesize_audio(text):
     """Convert text to speech using Deepgram"""
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {"text": text}
     
     try:
-        response = requests.post(DEEPGRAM_TTS_URL, headers=headers, json=payload)
-        response.raise_for_status()
+        with metrics.time('tts', 'deepgram'):
+            response = provider_client.post(DEEPGRAM_TTS_URL, headers=headers_tts, json=payload)
+            response.raise_for_status()
         return response.content
     except Exception as e:
         print(f"❌ Deepgram TTS error: {e}")
         return None
 
+# Cached TTS front end: the fallback phrase and repeated replies skip Deepgram
+tts_cache = TTSCache(synthesize_audio, model=DEEPGRAM_TTS_MODEL)
+
+# Live transcription sockets, one per caller streaming audio chunks
+live_stt = LiveSTTRelay(DEEPGRAM_API_KEY)
+
+# On-device wake word for pages that stream PCM (enroll with: python keyword_spotter.py enroll)
+wake_spotter = load_spotter()
+wake_streams = {}
+
+# Silent clips are dropped before they cost an STT call
+wake_gate = VoiceActivityGate('wake word')
+speech_gate = VoiceActivityGate('speech')
+
+# Turn timelines to TRACE_FILE; histograms and component counters on /metrics
+tracer = Tracer()
+metrics.register('llm', llm.stats)
+metrics.register('tts_cache', tts_cache.stats)
+metrics.register('vad_wake', wake_gate.stats)
+metrics.register('vad_speech', speech_gate.stats)
+metrics.register('live_stt', lambda: {'active_streams': live_stt.active()})
+
+# FAQ questions found in the knowledge base (KNOWLEDGE_DB) are answered without the LLM
+fast_path = make_fast_path(menu=orders.menu)
+metrics.register('knowledge', fast_path.stats)
+
+def respond_to_transcript(sid, transcript, binary):
+    """Run one conversation turn and send the reply to the caller's socket"""
+    turn = tracer.start_turn(sid, transport='socketio')
+    socketio.emit('transcription', {'text': transcript}, to=sid)
+    
+    # Add to conversation memory
+    sessions.append(sid, "user", transcript)
+    
+    # Stored answers skip the LLM; close matches are handed to it as reference
+    ai_response, snippets = fast_path.route(transcript)
+    turn.set(knowledge='answer' if ai_response else 'context' if snippets else None)
+    if ai_response is None:
+        # Get AI response
+        messages = fast_path.augment(context_manager.build_messages(prompt, sid), snippets)
+        
+        ai_response = get_openai_response(messages, sid)
+        turn.mark('llm_done')
+    sessions.append(sid, "assistant", ai_response)
+    
+    # Convert response to speech
+    audio_content = tts_cache.synthesize(ai_response)
+    turn.mark('tts_done')
+    
+    if audio_content:
+        socketio.emit('ai_response', {
+            'message': ai_response,
+            'audio': encode_audio_payload(audio_content, binary)
+        }, to=sid)
+    else:
+        socketio.emit('ai_response', {'message': ai_response}, to=sid)
+    turn.finish(audio=bool(audio_content))
+
 @app.route('/')
 def index():
     return render_template('simple_voice.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@socketio.on('connect')
+def handle_connect():
+    # Tell the page whether it can stream PCM to the local spotter instead of uploading clips
+    emit('wake_config', {'local': wake_spotter is not None})
+
+@socketio.on('wake_pcm')
+def handle_wake_pcm(data):
+    """Match streamed 16 kHz PCM against the enrolled wake word without any cloud STT"""
+    if wake_spotter is None:
+        return
+    stream = wake_streams.get(request.sid)
+    if stream is None:
+        stream = wake_streams[request.sid] = wake_spotter.stream()
+    if stream.process(decode_audio_payload(data)):
+        print(f"🎯 Wake word detected locally (score {stream.last_score:.2f})")
+        emit('wake_word_detected', {'detected': True, 'wake_word': 'hey james'})
+
 @socketio.on('wake_word_check')
 def handle_wake_word(data):
     try:
-        # Decode base64 audio data
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
+        
+        if not wake_gate.check(audio_data):
+            emit('wake_word_detected', {'detected': False})
+            return
         
         # Get transcription from Deepgram
         transcript = get_deepgram_response(audio_data)
@@ -171,51 +236,72 @@ def handle_wake_word(data):
 @socketio.on('james_activation')
 def handle_james_activation(data):
     try:
-        # Decode base64 audio data
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        # Binary frame from current clients, base64 data URL from older ones
+        audio_data = decode_audio_payload(data)
         
         # Get transcription from Deepgram
-        transcript = get_deepgram_response(audio_data)
+        transcript = get_deepgram_response(audio_data) if speech_gate.check(audio_data) else None
         
         if not transcript:
             emit('error', {'message': 'Could not understand audio'})
             return
-            
-        emit('transcription', {'text': transcript})
-        
-        # Add to conversation memory
-        conversation_memory.append({"role": "user", "content": transcript})
-        
-        # Get AI response
-        messages = [{"role": "system", "content": prompt}]
-        messages.extend(conversation_memory[-10:])  # Keep last 10 messages
-        
-        ai_response = get_openai_response(messages)
-        conversation_memory.append({"role": "assistant", "content": ai_response})
         
-        # Convert response to speech
-        audio_content = synthesize_audio(ai_response)
-        
-        if audio_content:
-            # Convert to base64 for transmission
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            emit('ai_response', {
-                'message': ai_response,
-                'audio': f"data:audio/mp3;base64,{audio_base64}"
-            })
-        else:
-            emit('ai_response', {'message': ai_response})
+        respond_to_transcript(request.sid, transcript, is_binary_payload(data))
         
     except Exception as e:
         print(f"❌ James activation error: {e}")
         emit('error', {'message': 'Processing failed'})
 
+def run_streamed_turn(sid, transcript, binary):
+    try:
+        respond_to_transcript(sid, transcript, binary)
+    except Exception as e:
+        print(f"❌ Streamed turn error: {e}")
+        socketio.emit('error', {'message': 'Processing failed'}, to=sid)
+
+@socketio.on('stream_start')
+def handle_stream_start(data=None):
+    """Open a live transcription socket that the page feeds with audio_chunk events"""
+    sid = request.sid
+    binary = bool(data and data.get('binary'))
+    
+    def on_interim(text):
+        socketio.emit('interim_transcript', {'text': text}, to=sid)
+    
+    def on_final(transcript):
+        # One utterance per stream; the LLM turn runs off the Deepgram receive thread
+        live_stt.close(sid)
+        socketio.start_background_task(run_streamed_turn, sid, transcript, binary)
+    
+    # The page holds its audio until stream_ready; chunks sent during the handshake are buffered
+    transcriber = live_stt.open(sid, on_final, on_interim)
+    emit('stream_ready')
+    if not live_stt.connect(sid, transcriber):
+        emit('error', {'message': 'Live transcription unavailable'})
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    live_stt.send(request.sid, decode_audio_payload(data))
+
+@socketio.on('stream_stop')
+def handle_stream_stop():
+    # Deepgram flushes what it heard so far and on_final fires if it was not already
+    live_stt.close(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    live_stt.close(request.sid)
+    wake_streams.pop(request.sid, None)
+    sessions.clear(request.sid)
+
 if __name__ == '__main__':
     print("🚀 Starting HTTPS James Voice Agent...")
     print("📱 Access on mobile: https://192.168.0.161:5443")
     print("⚠️  You'll see a security warning - click 'Advanced' → 'Proceed'")
     
     # Create SSL context for HTTPS
+    tts_cache.prewarm([FALLBACK_TEXT] + fast_path.answers())
+
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     context.load_cert_chain('cert.pem', 'key.pem')
     
@@ -1,8 +1,8 @@
 import speech_recognition as sr
-import sqlite3
 import openai
 import os
 from dotenv import load_dotenv
+from knowledge_engine import KnowledgeBase, KNOWLEDGE_DB
 
 # Load environment variables
 load_dotenv()
@@ -11,36 +11,23 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai.api_key = OPENAI_API_KEY
 
-# Database setup
-DB_NAME = "nexus_knowledge.db"
+# Knowledge base: one pooled WAL connection, FTS5 (BM25) lookup with a fuzzy fallback
+DB_NAME = KNOWLEDGE_DB
+knowledge = None
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS knowledge (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question TEXT NOT NULL,
-        answer TEXT NOT NULL
-    )''')
-    conn.commit()
-    conn.close()
+    global knowledge
+    if knowledge is None:
+        knowledge = KnowledgeBase(DB_NAME)
+    return knowledge
 
 # Add knowledge to the database
 def add_knowledge(question, answer):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO knowledge (question, answer) VALUES (?, ?)", (question, answer))
-    conn.commit()
-    conn.close()
+    return init_db().add(question, answer)
 
 # Query knowledge from the database
 def get_answer(question):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT answer FROM knowledge WHERE question LIKE ?", (f"%{question}%",))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
+    return init_db().get_answer(question)
 
 # Wake word and personalization
 WAKE_WORDS = ["nexus"]
@@ -0,0 +1,460 @@
+"""
+Menu and order engine for AI Voice Agent
+The menu lives in menu.json and each caller's order lives in the session store; the LLM edits the
+order through tool calls (add_item, review_order, confirm_order, ...) and reads prices and totals
+from their results, so no arithmetic is left to the model
+"""
+
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from knowledge_engine import similar, tokenize
+
+load_dotenv()
+
+MENU_FILE = os.getenv('MENU_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'menu.json'))
+ORDER_TOOLS = os.getenv('ORDER_TOOLS', 'true').lower() != 'false'   # false: the LLM takes orders from the prompt alone
+ORDER_TOOL_ROUNDS = int(os.getenv('ORDER_TOOL_ROUNDS', '3'))          # tool round trips per turn before a plain reply
+DELIVERY_ESTIMATE = os.getenv('DELIVERY_ESTIMATE', '30 to 45 minutes')
+
+# Order states, in the order a call moves through them
+OPEN, REVIEWED, CONFIRMED, PLACED = 'open', 'reviewed', 'confirmed', 'placed'
+
+
+class OrderError(Exception):
+    """A request the order can't take; the message is passed back to the LLM to say to the caller"""
+
+
+def format_price(cents):
+    return f"${cents // 100}.{cents % 100:02d}"
+
+
+class Menu:
+    def __init__(self, categories):
+        """
+        Menu items grouped by category, as in menu.json
+        categories: [{'name', 'items': [{'name', 'price', 'portion'?, 'options'?, 'aliases'?}]}]
+                    options: [{'name', 'price'}] for items sold in several sizes or flavours
+        """
+        self.categories = categories
+        self.items = []
+        for category in categories:
+            for item in category['items']:
+                options = item.get('options') or [{'name': None, 'price': item['price']}]
+                self.items.append({
+                    'name': item['name'],
+                    'portion': item.get('portion'),
+                    'options': [{'name': o['name'], 'cents': round(o['price'] * 100)} for o in options],
+                    'words': [tokenize(name) for name in [item['name']] + item.get('aliases', [])],
+                })
+
+    @classmethod
+    def load(cls, path=MENU_FILE):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f)['categories'])
+
+    def _scores(self, text):
+        """((share of the text's words, share of the item's words) matched, item) for every item"""
+        query = tokenize(text)
+        scored = []
+        for item in self.items:
+            best = (0.0, 0.0)
+            for words in item['words']:
+                matched = sum(1 for word in query if any(similar(word, other) for other in words))
+                if query and words:
+                    best = max(best, (matched / len(query), matched / len(words)))
+            scored.append((best, item))
+        return scored
+
+    def mentions(self, text):
+        """True when a sentence names a menu item, even loosely ("the egg rolls", "chicken")"""
+        return any(score[1] >= 0.5 for score, _ in self._scores(text))
+
+    def find(self, name):
+        """The menu item a caller means by name; OrderError when there is none or several"""
+        scored = self._scores(name)
+        top = max((score[0] for score, _ in scored), default=0.0)
+        if top < 0.5:
+            raise OrderError(f"'{name}' is not on the menu")
+        candidates = [(score, item) for score, item in scored if score[0] == top]
+        if len(candidates) > 1:
+            # "chicken egg roll" names one item completely; "chicken" or "egg roll" needs a question
+            exact = [item for score, item in candidates if score[1] == 1.0]
+            if len(exact) != 1:
+                names = ", ".join(item['name'] for _, item in candidates)
+                raise OrderError(f"'{name}' could be any of: {names}. Ask which one")
+            return exact[0]
+        return candidates[0][1]
+
+    def option(self, item, name=None):
+        options = item['options']
+        if len(options) == 1:
+            return options[0]
+        if name:
+            for option in options:
+                if tokenize(option['name']) == tokenize(name) or option['name'].lower() == name.lower():
+                    return option
+        choices = ", ".join(f"{o['name']} ({format_price(o['cents'])})" for o in options)
+        raise OrderError(f"{item['name']} comes as {choices}. Ask which one")
+
+    def describe(self):
+        """Compact menu text for the system prompt"""
+        lines = []
+        for category in self.categories:
+            entries = []
+            for item in category['items']:
+                label = f"{item['name']} ({item['portion']})" if item.get('portion') else item['name']
+                if item.get('options'):
+                    prices = ", ".join(f"{o['name']} ${o['price']:.2f}" for o in item['options'])
+                    entries.append(f"{label}: {prices}")
+                else:
+                    entries.append(f"{label} ${item['price']:.2f}")
+            lines.append(f"{category['name']}: " + "; ".join(entries))
+        return "\n".join(lines)
+
+
+class Order:
+    def __init__(self, lines=None, state=OPEN, address=None):
+        """
+        One caller's order
+        lines: [{'item', 'portion', 'option', 'quantity', 'cents'}] with cents per unit
+        state: open -> reviewed (read back) -> confirmed (caller agreed) -> placed (address given);
+               changing the items sends it back to open so it is read back again
+        """
+        self.lines = lines or []
+        self.state = state
+        self.address = address
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else cls()
+
+    def to_dict(self):
+        return {'lines': self.lines, 'state': self.state, 'address': self.address}
+
+    def total(self):
+        return sum(line['cents'] * line['quantity'] for line in self.lines)
+
+    def describe_line(self, line):
+        name = line['item']
+        if line['option']:
+            name = f"{line['option']} {name}"
+        if line['portion']:
+            name = f"{name} ({line['portion']})"
+        return f"{line['quantity']} x {name}"
+
+    def add(self, menu, name, quantity=1, option=None):
+        if quantity < 1:
+            raise OrderError("Quantity must be at least 1")
+        if self.state == PLACED:
+            # A new order after the last one went out
+            self.lines, self.address = [], None
+        item = menu.find(name)
+        choice = menu.option(item, option)
+        for line in self.lines:
+            if line['item'] == item['name'] and line['option'] == choice['name']:
+                line['quantity'] += quantity
+                break
+        else:
+            line = {'item': item['name'], 'portion': item['portion'], 'option': choice['name'],
+                    'quantity': quantity, 'cents': choice['cents']}
+            self.lines.append(line)
+        self.state = OPEN
+        return line
+
+    def remove(self, menu, name, quantity=None):
+        if self.state == PLACED:
+            raise OrderError("That order has already been placed")
+        item = menu.find(name)
+        for line in self.lines:
+            if line['item'] == item['name']:
+                if quantity is None or quantity >= line['quantity']:
+                    self.lines.remove(line)
+                    removed = line['quantity']
+                else:
+                    line['quantity'] -= quantity
+                    removed = quantity
+                self.state = OPEN
+                return removed
+        raise OrderError(f"There is no {item['name']} in the order")
+
+    def review(self):
+        if not self.lines:
+            raise OrderError("The order is empty")
+        if self.state == PLACED:
+            raise OrderError("That order has already been placed")
+        self.state = REVIEWED
+
+    def confirm(self):
+        if self.state != REVIEWED:
+            raise OrderError("Read the order back with review_order before confirming it")
+        self.state = CONFIRMED
+
+    def place(self, address):
+        if self.state != CONFIRMED:
+            raise OrderError("The caller has to confirm the order before it can be delivered")
+        if not address or not address.strip():
+            raise OrderError("Ask for the delivery address")
+        self.address = address.strip()
+        self.state = PLACED
+
+    def summary(self):
+        """Items with their prices and the total, as the caller should hear them"""
+        return {
+            'items': [f"{self.describe_line(line)}: {format_price(line['cents'] * line['quantity'])}" for line in self.lines],
+            'total': format_price(self.total()),
+            'state': self.state,
+        }
+
+
+def _tool(name, description, properties=None, required=()):
+    return {
+        'type': 'function',
+        'function': {
+            'name': name,
+            'description': description,
+            'parameters': {'type': 'object', 'properties': properties or {}, 'required': list(required)},
+        },
+    }
+
+
+TOOL_DEFINITIONS = [
+    _tool('add_item', "Add a menu item to the caller's order; returns its price and the new total", {
+        'item': {'type': 'string', 'description': "Menu item as the caller said it"},
+        'quantity': {'type': 'integer', 'minimum': 1},
+        'option': {'type': 'string', 'description': "Size or flavour, for items that have options"},
+    }, required=['item']),
+    _tool('remove_item', "Take an item out of the order (all of it unless quantity is given)", {
+        'item': {'type': 'string'},
+        'quantity': {'type': 'integer', 'minimum': 1},
+    }, required=['item']),
+    _tool('review_order', "Itemised prices and total to read back to the caller before they confirm"),
+    _tool('confirm_order', "Record that the caller confirmed the order as read back"),
+    _tool('set_delivery_address', "Place the confirmed order for delivery to this address", {
+        'address': {'type': 'string'},
+    }, required=['address']),
+    _tool('clear_order', "Empty the order when the caller wants to start over"),
+]
+
+TOOLS_PROMPT = """Orders: use the order tools and never work out prices or totals yourself.
+1. add_item for each item the caller picks (ask which option when an item has several) and tell them its price from the result.
+2. When they are done, review_order and read back every item with its price and the total exactly as returned; ask them to confirm.
+3. confirm_order once they agree, then ask for their delivery address.
+4. set_delivery_address with it and tell them when the order will arrive.
+All prices include tax; never add anything to them."""
+
+MANUAL_PROMPT = f"""Orders: let the caller pick items (confirm any size or quantity), repeat each item with its quantity and price and then the order total, and have them confirm. Then ask for their delivery address and say the order will arrive in {DELIVERY_ESTIMATE}. All prices include tax; never add anything to them."""
+
+
+def _text(args, key):
+    """String argument key from a tool call, '' when missing"""
+    value = args.get(key)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise OrderError(f"{key} must be a string")
+    return value
+
+
+def _quantity(args, default):
+    """Whole-number quantity of at least 1 from a tool call; default when missing"""
+    value = args.get('quantity')
+    if value is None:
+        return default
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    elif isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise OrderError(f"quantity must be a whole number of at least 1, not {value!r}")
+    return value
+
+
+class OrderTools:
+    def __init__(self, sessions, menu=None, enabled=ORDER_TOOLS, rounds=ORDER_TOOL_ROUNDS):
+        """
+        Order tools for one agent process
+        sessions: SessionStore; each caller's order is kept in their session as 'order'
+        menu: Menu (default: MENU_FILE)
+        enabled: Offer the tools to the LLM; False leaves ordering to the prompt
+        rounds: Tool round trips allowed per turn before the LLM must answer in words
+        """
+        self.sessions = sessions
+        self.menu = menu or Menu.load()
+        self.enabled = enabled
+        self.rounds = rounds
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.errors = 0
+        self.placed = 0
+
+    def prompt(self):
+        """Ordering section of the system prompt, with the menu"""
+        rules = TOOLS_PROMPT if self.enabled else MANUAL_PROMPT
+        return f"{rules}\n\nMenu [item (portion) price]:\n{self.menu.describe()}"
+
+    def params(self, final=False):
+        """Chat completion parameters for a turn; final forbids further tool calls"""
+        if not self.enabled:
+            return {}
+        params = {'tools': TOOL_DEFINITIONS}
+        if final:
+            params['tool_choice'] = 'none'
+        return params
+
+    def order(self, session_id):
+        return Order.from_dict(self.sessions.get(session_id).get('order'))
+
+    def augment(self, messages, session_id):
+        """Messages with the caller's current order added just before their turn, when there is one"""
+        if not self.enabled:
+            return messages
+        order = self.order(session_id)
+        if not order.lines:
+            return messages
+        summary = order.summary()
+        text = f"Current order ({summary['state']}): {'; '.join(summary['items'])}. Total {summary['total']}."
+        if order.state == PLACED:
+            text += f" Placed for delivery to {order.address}."
+        return messages[:-1] + [{"role": "system", "content": text}] + messages[-1:]
+
+    def execute(self, session_id, name, arguments):
+        """Run one tool call against the caller's order; returns the JSON result for the LLM"""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        try:
+            args = json.loads(arguments) if arguments else {}
+            if not isinstance(args, dict):
+                raise OrderError(f"Arguments for {name} must be a JSON object")
+            order = self.order(session_id)
+            if name == 'add_item':
+                quantity = _quantity(args, default=1)
+                line = order.add(self.menu, _text(args, 'item'), quantity, _text(args, 'option') or None)
+                result = {'added': order.describe_line(dict(line, quantity=quantity)),
+                          'price': format_price(line['cents'] * quantity),
+                          'order_total': format_price(order.total())}
+            elif name == 'remove_item':
+                removed = order.remove(self.menu, _text(args, 'item'), _quantity(args, default=None))
+                result = {'removed': removed, 'order_total': format_price(order.total())}
+            elif name == 'review_order':
+                order.review()
+                result = dict(order.summary(), next="Read this back and ask the caller to confirm")
+            elif name == 'confirm_order':
+                order.confirm()
+                result = {'state': order.state, 'next': "Ask for the delivery address"}
+            elif name == 'set_delivery_address':
+                order.place(_text(args, 'address'))
+                with self._lock:
+                    self.placed += 1
+                print(f"🧾 Order placed for {session_id}: {order.summary()} → {order.address}")
+                result = {'state': order.state, 'address': order.address, 'delivery_estimate': DELIVERY_ESTIMATE}
+            elif name == 'clear_order':
+                order = Order()
+                result = {'state': order.state}
+            else:
+                raise OrderError(f"Unknown tool {name}")
+            self.sessions.update(session_id, order=order.to_dict())
+        except (OrderError, ValueError, TypeError) as e:
+            with self._lock:
+                self.errors += 1
+            result = {'error': str(e)}
+        return json.dumps(result)
+
+    def tool_messages(self, session_id, tool_calls, content):
+        """The assistant's tool call message followed by one result message per call"""
+        calls = []
+        results = []
+        for index, call in enumerate(tool_calls):
+            call_id = call['id'] or f"call_{index}"
+            calls.append({'id': call_id, 'type': 'function',
+                          'function': {'name': call['name'], 'arguments': call['arguments']}})
+            results.append({'role': 'tool', 'tool_call_id': call_id,
+                            'content': self.execute(session_id, call['name'], call['arguments'])})
+        return [{'role': 'assistant', 'content': content or None, 'tool_calls': calls}] + results
+
+    def complete(self, llm, messages, session_id, **params):
+        """Reply text for a turn, running any order tools the LLM calls along the way"""
+        if not self.enabled:
+            return llm.complete(messages, **params)
+        messages = list(messages)
+        for round_index in range(self.rounds + 1):
+            reply = llm.respond(messages, **params, **self.params(final=round_index == self.rounds))
+            if not reply['tool_calls']:
+                return reply['content']
+            messages += self.tool_messages(session_id, reply['tool_calls'], reply['content'])
+        return reply['content']
+
+    async def acomplete(self, llm, messages, session_id, **params):
+        """complete() for the asyncio server"""
+        if not self.enabled:
+            return await llm.acomplete(messages, **params)
+        messages = list(messages)
+        for round_index in range(self.rounds + 1):
+            reply = await llm.arespond(messages, **params, **self.params(final=round_index == self.rounds))
+            if not reply['tool_calls']:
+                return reply['content']
+            messages += self.tool_messages(session_id, reply['tool_calls'], reply['content'])
+        return reply['content']
+
+    def stream(self, llm, messages, session_id, first=None, **params):
+        """
+        Streamed reply for a turn (see ToolCallStream)
+        first: Stream already requested with params() for this turn, e.g. a committed speculation
+        """
+        if not self.enabled:
+            return first if first is not None else llm.stream(messages, **params)
+        return ToolCallStream(self, llm, messages, session_id, params, first)
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'calls': dict(self.calls), 'errors': self.errors, 'placed': self.placed}
+
+
+class ToolCallStream:
+    def __init__(self, tools, llm, messages, session_id, params, first=None):
+        """
+        Text deltas of a reply across tool round trips: the text of each LLM response is yielded
+        as it streams, and when the response ends in tool calls they run and the next response
+        continues the reply. Offers backend and close() like the router's TokenStream
+        """
+        self.tools = tools
+        self.llm = llm
+        self.messages = list(messages)
+        self.session_id = session_id
+        self.params = params
+        self._current = first
+        self._lock = threading.Lock()
+        self._closed = False
+        self.backend = None
+
+    def _open(self, final):
+        with self._lock:
+            if self._closed:
+                return None
+            self._current = self.llm.stream(self.messages, **self.params, **self.tools.params(final=final))
+            return self._current
+
+    def __iter__(self):
+        for round_index in range(self.tools.rounds + 1):
+            stream = self._current if round_index == 0 and self._current is not None else self._open(round_index == self.tools.rounds)
+            if stream is None:
+                return
+            text = []
+            for delta in stream:
+                self.backend = stream.backend
+                text.append(delta)
+                yield delta
+            self.backend = self.backend or stream.backend
+            if self._closed or not stream.tool_calls:
+                return
+            self.messages += self.tools.tool_messages(self.session_id, stream.tool_calls, "".join(text))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            current = self._current
+        if current is not None:
+            current.close()
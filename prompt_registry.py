@@ -0,0 +1,119 @@
+"""
+System prompt registry for AI Voice Agent
+Prompts live in prompts/<name>/<variant>.v<N>.txt and are read and rendered once at startup, so
+every turn opens with the same bytes and the provider's prompt cache can reuse them. Each
+deployment picks a variant (full or compact) and may pin a version
+"""
+
+import hashlib
+import os
+import re
+import string
+import threading
+
+from dotenv import load_dotenv
+
+from context_window import count_tokens
+
+load_dotenv()
+
+PROMPT_DIR = os.getenv('PROMPT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts'))
+PROMPT_VARIANT = os.getenv('PROMPT_VARIANT', '')    # full or compact; empty: the agent's own default
+PROMPT_VERSION = os.getenv('PROMPT_VERSION', '')    # pin a version, e.g. 1; empty: the newest
+
+_FILE = re.compile(r'^(?P<variant>[\w-]+)\.v(?P<version>\d+)\.txt$')
+
+
+class Prompt:
+    def __init__(self, name, variant, version, text):
+        """
+        One rendered system prompt
+        text: Exact string sent as the first message of every turn
+        fingerprint: Short hash of text; it changes whenever the cached prefix does
+        """
+        self.name = name
+        self.variant = variant
+        self.version = version
+        self.text = text
+        self.fingerprint = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+        self.tokens = count_tokens(text)
+
+    def __str__(self):
+        return self.text
+
+    def stats(self):
+        return {'version': self.version, 'tokens': self.tokens, 'chars': len(self.text)}
+
+
+class PromptRegistry:
+    def __init__(self, directory=PROMPT_DIR):
+        """
+        Every prompt template under directory, indexed by (name, variant) and version
+        Files are read lazily and each (template, values) pair is rendered only once
+        """
+        self.directory = directory
+        self._paths = {}
+        self._texts = {}
+        self._rendered = {}
+        self._lock = threading.Lock()
+        for name in sorted(os.listdir(directory)):
+            folder = os.path.join(directory, name)
+            if not os.path.isdir(folder):
+                continue
+            for filename in os.listdir(folder):
+                match = _FILE.match(filename)
+                if match:
+                    key = (name, match['variant'])
+                    self._paths.setdefault(key, {})[int(match['version'])] = os.path.join(folder, filename)
+
+    def variants(self, name):
+        return sorted(variant for prompt_name, variant in self._paths if prompt_name == name)
+
+    def versions(self, name, variant):
+        return sorted(self._paths.get((name, variant), {}))
+
+    def _template(self, name, variant, version):
+        versions = self._paths.get((name, variant))
+        if not versions:
+            raise ValueError(f"No prompt {name}/{variant} in {self.directory} (variants: {', '.join(self.variants(name)) or 'none'})")
+        version = int(version) if version else max(versions)
+        if version not in versions:
+            raise ValueError(f"No version {version} of prompt {name}/{variant} (versions: {', '.join(map(str, sorted(versions)))})")
+        path = versions[version]
+        if path not in self._texts:
+            # Text mode folds CRLF checkouts to \n, so the bytes sent match on every platform
+            with open(path, encoding='utf-8') as f:
+                self._texts[path] = f.read()
+        return version, self._texts[path]
+
+    def render(self, name, variant, version=None, **values):
+        """
+        Prompt name/variant (newest version unless pinned) with ${key} placeholders filled from values
+        Values should be fixed for the life of the process (the menu, not the caller's order), or
+        the prefix stops being cacheable; per-turn context goes in its own message after the history
+        """
+        with self._lock:
+            version, template = self._template(name, variant, version)
+            key = (name, variant, version, tuple(sorted(values.items())))
+            if key not in self._rendered:
+                text = string.Template(template).substitute(values).strip()
+                self._rendered[key] = Prompt(name, variant, version, text)
+            return self._rendered[key]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def load_prompt(name, default_variant='full', **values):
+    """
+    System prompt for an agent from the shared registry
+    default_variant: Used unless PROMPT_VARIANT is set; PROMPT_VERSION pins the version
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = PromptRegistry()
+    prompt = _registry.render(name, PROMPT_VARIANT or default_variant, PROMPT_VERSION or None, **values)
+    print(f"🧾 Prompt {prompt.name}/{prompt.variant} v{prompt.version}: {prompt.tokens} tokens ({prompt.fingerprint})")
+    return prompt
@@ -0,0 +1,138 @@
+"""
+Shared HTTP clients for Deepgram, OpenAI and Groq
+Keeps provider connections alive between turns so each call skips the TCP+TLS handshake
+"""
+
+import os
+import threading
+
+import httpx
+import openai
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+# Connection pool and retry settings (override in .env)
+POOL_CONNECTIONS = int(os.getenv('PROVIDER_POOL_CONNECTIONS', '4'))   # distinct hosts kept pooled
+POOL_MAXSIZE = int(os.getenv('PROVIDER_POOL_MAXSIZE', '16'))          # connections kept per host
+MAX_RETRIES = int(os.getenv('PROVIDER_MAX_RETRIES', '2'))
+CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.getenv('PROVIDER_READ_TIMEOUT', '30'))
+HTTP2 = os.getenv('PROVIDER_HTTP2', 'false').lower() == 'true'
+
+# Provider endpoints; point these at benchmarks/mock_providers.py to run without API credits
+DEEPGRAM_API_URL = os.getenv('DEEPGRAM_API_URL', 'https://api.deepgram.com').rstrip('/')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+_lock = threading.Lock()
+_session = None
+_httpx_client = None
+_async_client = None
+
+
+def get_session():
+    """Return the process-wide keep-alive requests session"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=MAX_RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "POST"]),
+                    respect_retry_after_header=True,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def post(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """POST through the shared session with default timeouts"""
+    return get_session().post(url, timeout=timeout, **kwargs)
+
+
+def _http2_available():
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("⚠️  PROVIDER_HTTP2 needs the h2 package (pip install httpx[http2]); using HTTP/1.1")
+        return False
+    return True
+
+
+def _pool_options():
+    return dict(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=POOL_CONNECTIONS * POOL_MAXSIZE,
+            max_keepalive_connections=POOL_MAXSIZE,
+        ),
+    )
+
+
+def get_httpx_client():
+    """Return the process-wide httpx client used by the OpenAI-compatible SDK clients"""
+    global _httpx_client
+    if _httpx_client is None:
+        with _lock:
+            if _httpx_client is None:
+                _httpx_client = httpx.Client(
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    **_pool_options(),
+                )
+    return _httpx_client
+
+
+def get_async_client():
+    """Return the process-wide async httpx client (one event loop per process)"""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES, **_pool_options()),
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                )
+    return _async_client
+
+
+def make_deepgram_client(api_key):
+    """Create a Deepgram SDK client (live transcription) for DEEPGRAM_API_URL"""
+    from deepgram import DeepgramClient, DeepgramClientOptions
+    return DeepgramClient(api_key, DeepgramClientOptions(url=DEEPGRAM_API_URL))
+
+
+def make_openai_client(api_key, base_url=None):
+    """Create an OpenAI SDK client (OpenAI, Groq or any compatible endpoint) on the shared pool"""
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url or OPENAI_BASE_URL,
+        http_client=get_httpx_client(),
+        max_retries=MAX_RETRIES,
+    )
+
+
+def make_async_openai_client(api_key, base_url=None):
+    """Create an async OpenAI SDK client on the shared async pool"""
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url or OPENAI_BASE_URL,
+        http_client=get_async_client(),
+        max_retries=MAX_RETRIES,
+    )
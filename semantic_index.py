@@ -0,0 +1,301 @@
+"""
+Semantic retrieval for the knowledge base
+Every stored question gets a compact unit vector (hashed word and character n-grams, or a local
+sentence-transformers model); vectors live in a memory-mapped file beside the database and a
+query is one matrix-vector product plus a top-k partition
+"""
+
+import json
+import math
+import os
+import threading
+import uuid
+import zlib
+from contextlib import nullcontext
+
+import numpy as np
+from dotenv import load_dotenv
+
+from knowledge_engine import tokenize
+
+load_dotenv()
+
+KNOWLEDGE_ENCODER = os.getenv('KNOWLEDGE_ENCODER', 'hash')     # hash, or a sentence-transformers model name
+KNOWLEDGE_VECTOR_DIM = int(os.getenv('KNOWLEDGE_VECTOR_DIM', '128'))
+KNOWLEDGE_SEMANTIC_MIN = float(os.getenv('KNOWLEDGE_SEMANTIC_MIN', '0.45'))   # cosine floor for a neighbour
+
+INITIAL_CAPACITY = 1024
+SYNC_BATCH = 5000
+
+
+class HashingEncoder:
+    def __init__(self, dim=KNOWLEDGE_VECTOR_DIM):
+        """
+        Feature-hashed character trigrams of each word, plus the word itself
+        Needs no model download; trigrams let "open" find "opening" and survive misheard words
+        dim: Vector size (more dimensions, fewer hash collisions)
+        """
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def _features(self, text):
+        features = []
+        for word in tokenize(text):
+            padded = f"#{word}#"
+            trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+            # Every word weighs the same however long it is
+            weight = 1.0 / math.sqrt(len(trigrams))
+            features.append((word, 0.3))
+            features += [(trigram, weight) for trigram in trigrams]
+        return features
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                # The top bit picks the sign, so collisions cancel out instead of piling up
+                vectors[row, hashed % self.dim] += weight if hashed & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+
+class SentenceEncoder:
+    def __init__(self, model_name):
+        """
+        CPU sentence-transformers model (pip install sentence-transformers), e.g. all-MiniLM-L6-v2
+        Understands paraphrases ("what time do you open" ~ "opening hours"); slower to build
+        """
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32)
+
+
+def make_encoder(name=KNOWLEDGE_ENCODER, dim=KNOWLEDGE_VECTOR_DIM):
+    """Encoder from KNOWLEDGE_ENCODER; falls back to hashing if the model can't load"""
+    if name and name != 'hash':
+        try:
+            return SentenceEncoder(name)
+        except Exception as e:
+            print(f"⚠️  Encoder {name} unavailable ({e}); using hashed n-grams")
+    return HashingEncoder(dim)
+
+
+class SemanticIndex:
+    def __init__(self, path, encoder=None):
+        """
+        Vector index kept next to a knowledge database
+        path: The database file; writes <path>.vectors, <path>.ids and <path>.json
+        encoder: HashingEncoder or SentenceEncoder (default from KNOWLEDGE_ENCODER)
+
+        Rows are appended as questions are added, and triggers in the database note deleted or
+        edited rows for the next sync, so the index is only rebuilt when the encoder or the
+        database itself changes
+        """
+        self.encoder = encoder or make_encoder()
+        self.dim = self.encoder.dim
+        self.database_path = path
+        self.vectors_path = f"{path}.vectors"
+        self.ids_path = f"{path}.ids"
+        self.meta_path = f"{path}.json"
+        self._lock = threading.Lock()
+        self.count = 0
+        self.capacity = 0
+        self.last_id = 0
+        self.database = None
+        self._known = set()
+        self._vectors = None
+        self._ids = None
+        self._open()
+
+    def _open(self):
+        meta = None
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if meta and meta.get('encoder') == self.encoder.name and meta.get('dim') == self.dim \
+                and os.path.exists(self.vectors_path) and os.path.exists(self.ids_path):
+            self.count, self.capacity, self.last_id = meta['count'], meta['capacity'], meta['last_id']
+            self.database = meta.get('database')
+            self._map()
+            self._known = set(self._ids[:self.count].tolist())
+        else:
+            if meta:
+                print(f"🔄 Knowledge encoder changed ({meta.get('encoder')} → {self.encoder.name}); re-indexing")
+            self.count, self.last_id = 0, 0
+            self._resize(INITIAL_CAPACITY)
+
+    def _map(self):
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(self.capacity, self.dim))
+        self._ids = np.memmap(self.ids_path, dtype=np.int64, mode='r+', shape=(self.capacity,))
+
+    def _resize(self, capacity):
+        # Grow the files in place; the mapped prefix keeps its contents
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._ids.flush()
+            self._vectors = self._ids = None
+        for path, row_bytes in ((self.vectors_path, self.dim * 4), (self.ids_path, 8)):
+            mode = 'r+b' if os.path.exists(path) and self.count else 'w+b'
+            with open(path, mode) as f:
+                f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self._map()
+        self._save_meta()
+
+    def _save_meta(self):
+        meta = {'encoder': self.encoder.name, 'dim': self.dim, 'count': self.count,
+                'capacity': self.capacity, 'last_id': self.last_id, 'database': self.database}
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _flush(self):
+        self._vectors.flush()
+        self._ids.flush()
+        self._save_meta()
+
+    def _append(self, ids, vectors):
+        # Callers hold the lock
+        needed = self.count + len(ids)
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._resize(capacity)
+        self._vectors[self.count:needed] = vectors
+        self._ids[self.count:needed] = ids
+        self.count = needed
+        self._known.update(ids)
+        self.last_id = max(self.last_id, max(ids))
+
+    def _remove(self, ids):
+        # Callers hold the lock; the last row moves into each hole, so rows stay contiguous
+        for row_id in ids:
+            if row_id not in self._known:
+                continue
+            self._known.discard(row_id)
+            for slot in np.flatnonzero(self._ids[:self.count] == row_id)[::-1]:
+                last = self.count - 1
+                self._vectors[slot] = self._vectors[last]
+                self._ids[slot] = self._ids[last]
+                self.count = last
+
+    def _clear(self):
+        self.count, self.last_id = 0, 0
+        self._known = set()
+
+    def add(self, rows):
+        """
+        Index (id, question) rows, e.g. the ones add_knowledge just inserted
+        Rows already in the index are skipped, so repeated syncs are harmless
+        """
+        rows = [(row_id, question) for row_id, question in rows if row_id not in self._known]
+        if not rows:
+            return 0
+        vectors = self.encoder.encode([question for _, question in rows])
+        with self._lock:
+            # Checked again: another thread may have indexed some of them while these were encoded
+            keep = [index for index, (row_id, _) in enumerate(rows) if row_id not in self._known]
+            if not keep:
+                return 0
+            self._append([rows[index][0] for index in keep], vectors[keep])
+            self._flush()
+        return len(keep)
+
+    def _watch(self, conn):
+        """Token naming this database, created with it; deleted and edited rows are noted until the next sync"""
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS knowledge_vectors_source (token TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS knowledge_vectors_stale (id INTEGER PRIMARY KEY);
+            CREATE TRIGGER IF NOT EXISTS knowledge_vectors_ad AFTER DELETE ON knowledge BEGIN
+                INSERT OR IGNORE INTO knowledge_vectors_stale (id) VALUES (old.id);
+            END;
+            CREATE TRIGGER IF NOT EXISTS knowledge_vectors_au AFTER UPDATE OF id, question ON knowledge BEGIN
+                INSERT OR IGNORE INTO knowledge_vectors_stale (id) VALUES (old.id);
+                INSERT OR IGNORE INTO knowledge_vectors_stale (id) VALUES (new.id);
+            END;
+        ''')
+        row = conn.execute("SELECT token FROM knowledge_vectors_source").fetchone()
+        if row is None:
+            # A new or recreated database: whatever the sidecar files hold belongs to another one
+            row = (uuid.uuid4().hex,)
+            conn.execute("INSERT INTO knowledge_vectors_source (token) VALUES (?)", row)
+        return row[0]
+
+    def _refresh(self, conn):
+        # Callers hold both locks
+        identity = self._watch(conn)
+        stale = [row_id for (row_id,) in conn.execute("SELECT id FROM knowledge_vectors_stale")]
+        if identity != self.database:
+            if self.count:
+                print("🔄 Knowledge database is not the one its vectors were built from; re-indexing")
+            self._clear()
+            self.database = identity
+        elif stale:
+            placeholders = ",".join("?" * len(stale))
+            rows = conn.execute(
+                f"SELECT id, question FROM knowledge WHERE id IN ({placeholders}) AND id <= ?", stale + [self.last_id]
+            ).fetchall()
+            vectors = self.encoder.encode([question for _, question in rows]) if rows else None
+            self._remove(stale)
+            if rows:
+                self._append([row_id for row_id, _ in rows], vectors)
+        if stale:
+            conn.execute(f"DELETE FROM knowledge_vectors_stale WHERE id IN ({','.join('?' * len(stale))})", stale)
+        conn.commit()
+        # Rows changed before the triggers existed, or added while another process held the index
+        indexed = conn.execute("SELECT COUNT(*) FROM knowledge WHERE id <= ?", (self.last_id,)).fetchone()[0]
+        if indexed != self.count:
+            print(f"🔄 Knowledge index is out of step ({self.count} vectors, {indexed} rows); re-indexing")
+            self._clear()
+        self._flush()
+
+    def sync(self, conn, lock=None):
+        """
+        Bring the index up to date with the knowledge table (startup, bulk inserts)
+        Rebuilds when the database file was replaced, re-encodes deleted or edited rows, then
+        indexes every row newer than the last indexed id
+        lock: Held around each read when the connection is shared
+        """
+        with lock or nullcontext(), self._lock:
+            self._refresh(conn)
+        added = 0
+        while True:
+            with lock or nullcontext():
+                rows = conn.execute(
+                    "SELECT id, question FROM knowledge WHERE id > ? ORDER BY id LIMIT ?", (self.last_id, SYNC_BATCH)
+                ).fetchall()
+            if not rows:
+                return added
+            added += self.add(rows)
+
+    def search(self, text, k=5, min_similarity=KNOWLEDGE_SEMANTIC_MIN):
+        """
+        (knowledge id, cosine similarity) pairs for the k nearest stored questions
+        min_similarity: Drop neighbours below this; hashed vectors of unrelated text still score ~0.3
+        """
+        query = self.encoder.encode([text])[0]
+        if not query.any():
+            return []
+        with self._lock:
+            count = self.count
+            if not count:
+                return []
+            scores = self._vectors[:count] @ query
+            ids = self._ids[:count]
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_similarity]
+
+    def stats(self):
+        return {'vectors': self.count, 'dim': self.dim}
@@ -0,0 +1,213 @@
+"""
+Per-session conversation state for AI Voice Agent
+Keeps each caller's history separate, bounded and evicted when idle
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')          # memory, sqlite or redis://host:port/db
+SESSION_DB = os.getenv('SESSION_DB', 'sessions.db')
+SESSION_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', '50'))   # beyond this context_window folds into the summary
+SESSION_IDLE_TIMEOUT = int(os.getenv('SESSION_IDLE_TIMEOUT', '1800'))  # seconds
+
+OVERFLOW_FACTOR = 4     # history is only cut unsummarised past this many times max_messages
+LOCK_STRIPES = 64
+
+
+class MemorySessionBackend:
+    """In-process dict backend (single worker)"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            data = self._sessions.get(session_id)
+            return json.loads(json.dumps(data)) if data is not None else None
+
+    def save(self, session_id, data):
+        with self._lock:
+            self._sessions[session_id] = data
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict(self, older_than):
+        with self._lock:
+            stale = [sid for sid, data in self._sessions.items() if data['updated'] < older_than]
+            for sid in stale:
+                del self._sessions[sid]
+        return len(stale)
+
+
+class SQLiteSessionBackend:
+    """SQLite file backend so several worker processes on one box share sessions"""
+
+    def __init__(self, path=SESSION_DB):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated REAL NOT NULL
+            )''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated)")
+            self._conn.commit()
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), data['updated'])
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict(self, older_than):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (older_than,))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+class RedisSessionBackend:
+    """Redis backend (pip install redis); idle eviction is handled by key TTLs"""
+
+    def __init__(self, url, idle_timeout=SESSION_IDLE_TIMEOUT):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.idle_timeout = idle_timeout
+
+    def _key(self, session_id):
+        return f"voice_session:{session_id}"
+
+    def load(self, session_id):
+        raw = self._redis.get(self._key(session_id))
+        return json.loads(raw) if raw else None
+
+    def save(self, session_id, data):
+        self._redis.set(self._key(session_id), json.dumps(data), ex=self.idle_timeout)
+
+    def delete(self, session_id):
+        self._redis.delete(self._key(session_id))
+
+    def evict(self, older_than):
+        return 0
+
+
+class SessionStore:
+    def __init__(self, backend=None, max_messages=SESSION_MAX_MESSAGES, idle_timeout=SESSION_IDLE_TIMEOUT):
+        """
+        Session store keyed by Socket.IO sid or HTTP session id
+        backend: Storage backend (defaults to in-process memory)
+        max_messages: History length at which ContextManager folds old turns into the summary
+        idle_timeout: Seconds without activity before a session is evicted
+
+        Each session also records first_seq, the sequence number of its oldest message, so a fold
+        removes exactly the messages it summarised even if the history moved meanwhile
+        """
+        self.backend = backend or MemorySessionBackend()
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self._last_sweep = time.time()
+        # Read-modify-write of one session is serialised (per process; striped to bound memory)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, session_id):
+        return self._locks[hash(session_id) % LOCK_STRIPES]
+
+    def get(self, session_id):
+        """Return the session dict, creating an empty one if needed"""
+        data = self.backend.load(session_id)
+        if data is None:
+            data = {'history': [], 'first_seq': 0, 'updated': time.time()}
+        return data
+
+    def update(self, session_id, **fields):
+        """Set extra per-session fields (they are kept alongside the history)"""
+        with self._lock(session_id):
+            data = self.get(session_id)
+            data.update(fields)
+            self._save(session_id, data)
+
+    def history(self, session_id):
+        """Return the bounded message history for a session"""
+        return self.get(session_id)['history']
+
+    def append(self, session_id, role, content):
+        """
+        Add a message; ContextManager folds the history once it passes max_messages
+        Only if folding keeps failing is the oldest history dropped, at OVERFLOW_FACTOR times the cap
+        """
+        with self._lock(session_id):
+            data = self.get(session_id)
+            history = data['history']
+            history.append({"role": role, "content": content})
+            overflow = len(history) - self.max_messages * OVERFLOW_FACTOR
+            if overflow > 0:
+                print(f"⚠️  Session {session_id} history not summarised; dropping {overflow} messages")
+                data['history'] = history[overflow:]
+                data['first_seq'] = data.get('first_seq', 0) + overflow
+            self._save(session_id, data)
+
+    def fold(self, session_id, through_seq, summary):
+        """
+        Replace the messages before sequence number through_seq with a running summary
+        through_seq: first_seq + the number of messages the summary covers, as read before summarising
+        """
+        with self._lock(session_id):
+            data = self.get(session_id)
+            first_seq = data.get('first_seq', 0)
+            count = max(0, through_seq - first_seq)
+            data['history'] = data['history'][count:]
+            data['first_seq'] = first_seq + count
+            data['summary'] = summary
+            self._save(session_id, data)
+
+    def clear(self, session_id):
+        """Forget a session (e.g. on disconnect)"""
+        self.backend.delete(session_id)
+
+    def _save(self, session_id, data):
+        now = time.time()
+        data['updated'] = now
+        self.backend.save(session_id, data)
+
+        # Sweep idle sessions lazily instead of running a timer thread
+        if now - self._last_sweep > min(self.idle_timeout, 60):
+            self._last_sweep = now
+            evicted = self.backend.evict(now - self.idle_timeout)
+            if evicted:
+                print(f"🧹 Evicted {evicted} idle sessions")
+
+
+def make_session_store(max_messages=SESSION_MAX_MESSAGES, idle_timeout=SESSION_IDLE_TIMEOUT):
+    """Build a session store from SESSION_BACKEND in .env"""
+    if SESSION_BACKEND == 'sqlite':
+        backend = SQLiteSessionBackend(SESSION_DB)
+    elif SESSION_BACKEND.startswith('redis://'):
+        backend = RedisSessionBackend(SESSION_BACKEND, idle_timeout)
+    else:
+        backend = MemorySessionBackend()
+    return SessionStore(backend, max_messages=max_messages, idle_timeout=idle_timeout)
@@ -3,18 +3,29 @@ Simple HTTPS Mobile Voice Interface without SocketIO
 Uses regular HTTPS with fetch API for better mobile compatibility
 """
 
-from flask import Flask, render_template, request, jsonify
-import base64
-import openai
+from flask import Flask, render_template, request, jsonify, session, Response
+import uuid
+from urllib.parse import quote
 import os
 from dotenv import load_dotenv
-import requests
+import provider_client
+from llm_providers import make_router
+from audio_transport import decode_audio_payload, encode_audio_payload
+from session_store import make_session_store
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
+from tts_cache import TTSCache
+from voice_activity import VoiceActivityGate
+from knowledge_fastpath import make_fast_path
+from tracing import Tracer, metrics, PROMETHEUS_CONTENT_TYPE
 import ssl
 
 # Force load environment variables
 load_dotenv(override=True)
 
 app = Flask(__name__)
+app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
 
 # Initialize API keys
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -24,33 +35,44 @@ if not OPENAI_API_KEY or not DEEPGRAM_API_KEY:
     print("❌ Missing API keys")
     exit(1)
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+client = provider_client.make_openai_client(OPENAI_API_KEY)
+
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
 print(f"✅ HTTPS API Keys loaded: Deepgram ({len(DEEPGRAM_API_KEY)} chars), OpenAI ({len(OPENAI_API_KEY)} chars)")
 
-# Restaurant prompt
-prompt = """You are James, a friendly AI restaurant assistant. Keep responses short and conversational.
+# Per-session conversation history (bounded, idle sessions evicted)
+sessions = make_session_store()
 
-Menu Items:
-- Roast Pork Egg Roll (3pcs) - $5.25
-- Vegetable Spring Roll (3pcs) - $5.25  
-- Chicken Egg Roll (3pcs) - $5.25
-- BBQ Chicken - $7.75
+# Prompt stays within CONTEXT_MAX_TOKENS; older turns are folded into a summary
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(client))
 
-Help with reservations and orders. Be friendly and proactive."""
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
 
-conversation_memory = []
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', default_variant='compact', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
 
 # Deepgram URLs
-DEEPGRAM_STT_URL = 'https://api.deepgram.com/v1/listen'
-DEEPGRAM_TTS_URL = 'https://api.deepgram.com/v1/speak?model=aura-helios-en'
+DEEPGRAM_STT_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/listen'
+DEEPGRAM_TTS_MODEL = 'aura-helios-en'
+DEEPGRAM_TTS_URL = f'{provider_client.DEEPGRAM_API_URL}/v1/speak?model={DEEPGRAM_TTS_MODEL}'
+headers_stt = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "audio/webm"  # Explicitly set WebM for browser compatibility
+}
+headers_tts = {
+    "Authorization": f"Token {DEEPGRAM_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+FALLBACK_TEXT = "I'm having trouble right now. Could you try again?"
 
 def get_deepgram_response(audio_data):
     """Send audio to Deepgram for speech-to-text"""
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "audio/webm"  # Explicitly set WebM for browser compatibility
-    }
-    
     params = {
         "model": "nova-2",
         "smart_format": "true",
@@ -60,11 +82,13 @@ def get_deepgram_response(audio_data):
     
     try:
         print(f"📤 Sending {len(audio_data)} bytes to Deepgram...")
-        response = requests.post(DEEPGRAM_STT_URL, headers=headers, params=params, data=audio_data)
+        with metrics.time('stt', 'deepgram'):
+            response = provider_client.post(DEEPGRAM_STT_URL, headers=headers_stt, params=params, data=audio_data)
         
         if response.status_code != 200:
+            metrics.inc('errors_total', stage='stt', provider='deepgram')
             print(f"❌ Deepgram HTTP {response.status_code}: {response.text}")
-            print(f"📋 Request headers: {headers}")
+            print(f"📋 Request content type: {headers_stt['Content-Type']}")
             print(f"📋 Request params: {params}")
             return None
             
@@ -80,46 +104,72 @@ def get_deepgram_response(audio_data):
         print(f"❌ Deepgram STT error: {e}")
         return None
 
-def get_openai_response(messages):
-    """Get response from OpenAI"""
+def get_openai_response(messages, session_id):
+    """Get a reply from the routed LLM backends, running the order tools it calls"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        return orders.complete(llm, orders.augment(messages, session_id), session_id, max_tokens=150, temperature=0.7)
     except Exception as e:
-        print(f"❌ OpenAI error: {e}")
-        return "I'm having trouble right now. Could you try again?"
+        print(f"❌ LLM error: {e}")
+        return FALLBACK_TEXT
 
 def synthesize_audio(text):
     """Convert text to speech using Deepgram"""
-    headers = {
-        "Authorization": f"Token {DEEPGRAM_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     payload = {"text": text}
     
     try:
-        response = requests.post(DEEPGRAM_TTS_URL, headers=headers, json=payload)
-        response.raise_for_status()
+        with metrics.time('tts', 'deepgram'):
+            response = provider_client.post(DEEPGRAM_TTS_URL, headers=headers_tts, json=payload)
+            response.raise_for_status()
         return response.content
     except Exception as e:
         print(f"❌ Deepgram TTS error: {e}")
         return None
 
+# Cached TTS front end: the fallback phrase and repeated replies skip Deepgram
+tts_cache = TTSCache(synthesize_audio, model=DEEPGRAM_TTS_MODEL)
+
+# Silent clips are dropped before they cost an STT call
+wake_gate = VoiceActivityGate('wake word')
+speech_gate = VoiceActivityGate('speech')
+
+# Turn timelines to TRACE_FILE; histograms and component counters on /metrics
+tracer = Tracer()
+metrics.register('llm', llm.stats)
+metrics.register('tts_cache', tts_cache.stats)
+metrics.register('vad_wake', wake_gate.stats)
+metrics.register('vad_speech', speech_gate.stats)
+
+# FAQ questions found in the knowledge base (KNOWLEDGE_DB) are answered without the LLM
+fast_path = make_fast_path(menu=orders.menu)
+metrics.register('knowledge', fast_path.stats)
+
+def get_session_id():
+    """Return the caller's HTTP session id, issuing one on first contact"""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def read_audio_upload():
+    """Raw audio body from current clients, base64 data URL JSON from older ones"""
+    if request.is_json:
+        return decode_audio_payload(request.json)
+    return request.get_data()
+
 @app.route('/')
 def index():
     return render_template('https_voice.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/wake_word_check', methods=['POST'])
 def wake_word_check():
     try:
-        data = request.json
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        audio_data = read_audio_upload()
+        
+        if not wake_gate.check(audio_data):
+            return jsonify({'detected': False})
         
         transcript = get_deepgram_response(audio_data)
         
@@ -141,26 +191,42 @@ def wake_word_check():
 @app.route('/voice_chat', methods=['POST'])
 def voice_chat():
     try:
-        data = request.json
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
+        session_id = get_session_id()
+        turn = tracer.start_turn(session_id, transport='https')
+        audio_data = read_audio_upload()
         
-        transcript = get_deepgram_response(audio_data)
+        transcript = get_deepgram_response(audio_data) if speech_gate.check(audio_data) else None
+        turn.mark('stt_done')
         
         if not transcript:
+            turn.finish(transcript=False)
             return jsonify({'error': 'Could not understand audio'}), 400
         
         # Add to conversation memory
-        conversation_memory.append({"role": "user", "content": transcript})
+        sessions.append(session_id, "user", transcript)
         
-        # Get AI response
-        messages = [{"role": "system", "content": prompt}]
-        messages.extend(conversation_memory[-10:])
-        
-        ai_response = get_openai_response(messages)
-        conversation_memory.append({"role": "assistant", "content": ai_response})
+        # Stored answers skip the LLM; close matches are handed to it as reference
+        ai_response, snippets = fast_path.route(transcript)
+        turn.set(knowledge='answer' if ai_response else 'context' if snippets else None)
+        if ai_response is None:
+            # Get AI response
+            messages = fast_path.augment(context_manager.build_messages(prompt, session_id), snippets)
+            
+            ai_response = get_openai_response(messages, session_id)
+            turn.mark('llm_done')
+        sessions.append(session_id, "assistant", ai_response)
         
         # Convert response to speech
-        audio_content = synthesize_audio(ai_response)
+        audio_content = tts_cache.synthesize(ai_response)
+        turn.mark('tts_done')
+        turn.finish(audio=bool(audio_content))
+        
+        # Binary clients get the MP3 as the body with the text in headers
+        if audio_content and not request.is_json:
+            response = Response(audio_content, mimetype='audio/mpeg')
+            response.headers['X-Transcript'] = quote(transcript)
+            response.headers['X-Response'] = quote(ai_response)
+            return response
         
         result = {
             'transcript': transcript,
@@ -168,8 +234,7 @@ def voice_chat():
         }
         
         if audio_content:
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            result['audio'] = f"data:audio/mp3;base64,{audio_base64}"
+            result['audio'] = encode_audio_payload(audio_content, binary=False)
         
         return jsonify(result)
         
@@ -182,6 +247,8 @@ if __name__ == '__main__':
     print("📱 Access on mobile: https://192.168.0.161:5443")
     print("⚠️  Accept security warning to enable microphone")
     
+    tts_cache.prewarm([FALLBACK_TEXT] + fast_path.answers())
+
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     context.load_cert_chain('cert.pem', 'key.pem')
     
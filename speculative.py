@@ -0,0 +1,260 @@
+"""
+Speculative reply prefetch for AI Voice Agent
+Starts the LLM (and optionally the first sentence of TTS) on a stable interim transcript so the
+reply is already under way while Deepgram waits out the endpointing silence; the final
+transcript either commits the speculation or cancels it
+"""
+
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+from tts_pipeline import SENTENCE_BOUNDARY
+
+load_dotenv()
+
+# off: wait for speech_final; llm: prefetch the reply; tts: also synthesize its first sentence
+SPECULATIVE = os.getenv('SPECULATIVE', 'off').lower()
+SPECULATIVE_MIN_WORDS = int(os.getenv('SPECULATIVE_MIN_WORDS', '2'))
+SPECULATIVE_MAX_DISTANCE = float(os.getenv('SPECULATIVE_MAX_DISTANCE', '0.15'))   # word edits / words
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+class SpeculationFailed(Exception):
+    """The committed speculative request failed before any text; the turn can ask the LLM afresh"""
+
+
+def normalize(text):
+    """Lowercase words without punctuation, so smart_format differences don't count"""
+    return _WORDS.findall(text.lower())
+
+
+def edit_distance(a, b):
+    """Word-level Levenshtein distance divided by the longer length (0 = same, 1 = unrelated)"""
+    if not a and not b:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, word in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1] / max(len(a), len(b))
+
+
+class Speculation:
+    def __init__(self, text, stream, synthesize=None):
+        """
+        A reply generated ahead of the final transcript
+        text: Interim transcript the reply was requested for
+        stream: TokenStream from the LLM router
+        synthesize: Cached TTS function to warm with the first sentence (optional)
+
+        Iterating yields the buffered deltas and then the live ones, like the stream itself, and
+        raises the request's error at the end: SpeculationFailed when it produced no text
+        """
+        self.text = text
+        self.words = normalize(text)
+        self._stream = stream
+        self._synthesize = synthesize
+        self._chunks = []
+        self._done = False
+        self._cancelled = False
+        self.error = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        buffer, warmed = "", self._synthesize is None
+        try:
+            for delta in self._stream:
+                with self._cond:
+                    self._chunks.append(delta)
+                    self._cond.notify_all()
+                if not warmed:
+                    buffer += delta
+                    # Same cut as iter_sentences, so the committed reply hits the TTS cache
+                    boundary = SENTENCE_BOUNDARY.search(buffer)
+                    if boundary and buffer[:boundary.start()].strip():
+                        warmed = True
+                        self._warm(buffer[:boundary.start()].strip())
+            if not warmed and buffer.strip():
+                self._warm(buffer.strip())
+        except Exception as e:
+            if not self._cancelled:
+                print(f"❌ Speculative LLM error: {e}")
+                self.error = e
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def _warm(self, sentence):
+        if not self._cancelled:
+            try:
+                self._synthesize(sentence)
+            except Exception as e:
+                print(f"❌ Speculative TTS error: {e}")
+
+    @property
+    def backend(self):
+        """LLM backend serving the speculative request, once it has produced a token"""
+        return self._stream.backend
+
+    @property
+    def tool_calls(self):
+        """Tool calls the speculative reply asked for (complete once iteration has finished)"""
+        return self._stream.tool_calls
+
+    @property
+    def failed(self):
+        """True if the request errored before producing any text"""
+        with self._cond:
+            return self.error is not None and not self._chunks
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                if index >= len(self._chunks):
+                    if self.error is None:
+                        return
+                    if not self._chunks:
+                        raise SpeculationFailed(f"Speculative LLM request failed: {self.error}") from self.error
+                    # A cut-off reply must not pass for a whole one
+                    raise self.error
+                chunk = self._chunks[index]
+            index += 1
+            yield chunk
+
+    def close(self):
+        """Cancel the LLM request (same call the turn uses to stop a live stream)"""
+        self._cancelled = True
+        self._stream.close()
+
+
+class SpeculativePrefetch:
+    def __init__(self, llm, build_messages, synthesize=None, mode=SPECULATIVE,
+                 min_words=SPECULATIVE_MIN_WORDS, max_distance=SPECULATIVE_MAX_DISTANCE, llm_params=None):
+        """
+        Tracks interim transcripts for one caller and keeps at most one speculation in flight
+        llm: LLMRouter used for the speculative request
+        build_messages: Function (text) returning the chat messages for a caller turn
+        synthesize: Cached TTS function, used in 'tts' mode
+        mode: 'off', 'llm' or 'tts'
+        min_words: Shortest interim worth speculating on
+        max_distance: Largest normalized word edit distance that still commits
+        llm_params: Extra chat completion parameters, e.g. the order tools; calls they request
+                    run only once the speculation is committed
+        """
+        self.llm = llm
+        self.llm_params = llm_params or {}
+        self.build_messages = build_messages
+        self.synthesize = synthesize if mode == 'tts' else None
+        self.mode = mode
+        self.min_words = min_words
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._last_interim = None
+        self._current = None
+        self._ready = {}
+        self.started = 0
+        self.committed = 0
+        self.cancelled = 0
+
+    @property
+    def enabled(self):
+        return self.mode in ('llm', 'tts')
+
+    def observe(self, text, final=False):
+        """
+        Feed the caller's utterance so far (finals plus the latest interim)
+        An interim counts as stable once Deepgram repeats it; finalized segments are stable at once
+        """
+        if not self.enabled:
+            return
+        words = normalize(text)
+        with self._lock:
+            stable = final or words == self._last_interim
+            self._last_interim = words
+            if not stable or len(words) < self.min_words:
+                return
+            if self._current is not None and self._current.words == words:
+                return
+            stale, self._current = self._current, None
+        if stale is not None:
+            self._discard(stale)
+
+        try:
+            speculation = Speculation(text, self.llm.stream(self.build_messages(text), **self.llm_params), self.synthesize)
+        except Exception as e:
+            print(f"❌ Speculation failed to start: {e}")
+            return
+        with self._lock:
+            self.started += 1
+            stale, self._current = self._current, speculation
+        if stale is not None:
+            self._discard(stale)
+        print(f"🔮 Speculating on: {text}")
+
+    def finalize(self, utterance):
+        """
+        Speech final arrived: keep the speculation for the turn if it matches, cancel it if not
+        Called on the transcript thread; the turn worker collects it with take()
+        """
+        with self._lock:
+            speculation, self._current = self._current, None
+            self._last_interim = None
+        if speculation is None:
+            return
+        distance = edit_distance(speculation.words, normalize(utterance))
+        if distance > self.max_distance or speculation.failed:
+            self._discard(speculation)
+            return
+        with self._lock:
+            self._ready[utterance] = speculation
+
+    def take(self, utterance):
+        """Speculation committed for this turn, or None; anything else still waiting is cancelled"""
+        with self._lock:
+            speculation = self._ready.pop(utterance, None)
+            leftovers = list(self._ready.values())
+            self._ready = {}
+            if speculation is not None:
+                self.committed += 1
+        for stale in leftovers:
+            self._discard(stale)
+        if speculation is not None:
+            print(f"🔮 Speculation hit: '{speculation.text}'")
+        return speculation
+
+    def cancel(self):
+        """Drop every speculation, e.g. when the conversation ends"""
+        with self._lock:
+            pending = list(self._ready.values())
+            if self._current is not None:
+                pending.append(self._current)
+            self._current, self._ready, self._last_interim = None, {}, None
+        for speculation in pending:
+            self._discard(speculation)
+
+    def _discard(self, speculation):
+        with self._lock:
+            self.cancelled += 1
+        speculation.close()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'started': self.started,
+                'committed': self.committed,
+                'cancelled': self.cancelled,
+                'hit_rate': round(self.committed / self.started, 3) if self.started else 0.0,
+            }
@@ -3,11 +3,17 @@ Simple Text-Based Mobile Chat Interface for James AI
 No microphone required - type to chat with James
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
-import openai
 import os
 from dotenv import load_dotenv
+import provider_client
+from llm_providers import make_router
+from session_store import make_session_store
+from tracing import Tracer, metrics, PROMETHEUS_CONTENT_TYPE
+from context_window import ContextManager, make_llm_summarizer
+from order_engine import OrderTools
+from prompt_registry import load_prompt
 
 # Force load environment variables
 load_dotenv(override=True)
@@ -24,56 +30,66 @@ if not OPENAI_API_KEY:
 
 print(f"✅ Text Chat API Key loaded: OpenAI ({len(OPENAI_API_KEY)} chars)")
 
-openai.api_key = OPENAI_API_KEY
+client = provider_client.make_openai_client(OPENAI_API_KEY)
 
-# Restaurant prompt
-prompt = """You are James, a friendly AI restaurant assistant. You help customers with:
-1. Table reservations (ask for date, time, and number of people)
-2. Taking food orders from our menu
-3. Providing information about our restaurant
+# Replies go to the fastest healthy backend in LLM_BACKENDS (openai, groq, local)
+llm = make_router(openai_api_key=OPENAI_API_KEY)
 
-Menu Items:
-- Roast Pork Egg Roll (3pcs) - $5.25
-- Vegetable Spring Roll (3pcs) - $5.25  
-- Chicken Egg Roll (3pcs) - $5.25
-- BBQ Chicken - $7.75
+# Per-session conversation history (bounded, idle sessions evicted)
+sessions = make_session_store()
 
-Keep responses short, friendly, and conversational. Always be helpful and proactive."""
+# Prompt stays within CONTEXT_MAX_TOKENS; older turns are folded into a summary
+context_manager = ContextManager(sessions, summarize=make_llm_summarizer(client))
 
-conversation_memory = []
+# Menu and each caller's order; the LLM edits orders with tool calls and reads back computed totals
+orders = OrderTools(sessions)
+
+# System prompt from prompts/ (PROMPT_VARIANT picks full or compact), rendered once so every
+# turn starts with the same bytes and the provider's prompt cache can hit
+system_prompt = load_prompt('receptionist', default_variant='compact', orders=orders.prompt())
+prompt = system_prompt.text
+metrics.register('prompt', system_prompt.stats)
+
+# Turn timelines to TRACE_FILE; LLM histograms and counters on /metrics
+tracer = Tracer()
+metrics.register('llm', llm.stats)
 
 @app.route('/')
 def text_chat():
     return render_template('text_chat.html')
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @socketio.on('send_message')
 def handle_message(data):
     user_message = data['message']
+    turn = tracer.start_turn(request.sid, transport='text')
     
     # Add to conversation memory
-    conversation_memory.append({"role": "user", "content": user_message})
+    sessions.append(request.sid, "user", user_message)
     
     try:
         # Get AI response
-        messages = [{"role": "system", "content": prompt}]
-        messages.extend(conversation_memory[-10:])  # Keep last 10 messages
+        messages = context_manager.build_messages(prompt, request.sid)
         
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=150,
-            temperature=0.7
-        )
-        
-        ai_response = response.choices[0].message.content.strip()
-        conversation_memory.append({"role": "assistant", "content": ai_response})
+        messages = orders.augment(messages, request.sid)
+        ai_response = orders.complete(llm, messages, request.sid, max_tokens=150, temperature=0.7)
+        sessions.append(request.sid, "assistant", ai_response)
         
         emit('ai_response', {'message': ai_response})
+        turn.finish()
         
     except Exception as e:
-        print(f"❌ OpenAI error: {e}")
+        print(f"❌ LLM error: {e}")
+        turn.finish(error=str(e))
         emit('ai_response', {'message': "I'm having trouble right now. Could you try again?"})
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    sessions.clear(request.sid)
+
 if __name__ == '__main__':
     print("🚀 Starting James Text Chat Server...")
     print("📱 Access on mobile: http://192.168.0.161:5001")
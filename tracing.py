@@ -0,0 +1,346 @@
+"""
+Per-turn latency tracing and Prometheus metrics for AI Voice Agent
+Each turn records when it reached speech final, LLM first token, LLM done, first TTS audio,
+playback start and playback end; finished turns go to a JSON lines file and into histograms
+served as text on /metrics
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_FILE = os.getenv('TRACE_FILE', '')        # JSON lines, one record per turn; empty = off
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # /metrics listener for the console agents; 0 = off
+METRICS_PREFIX = 'voice'
+
+# Seconds; voice turns live between a few hundred milliseconds and a few seconds
+BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HELP = {
+    'turn_seconds': 'Time from the start of a turn (speech final or request received) to each milestone',
+    'stage_seconds': 'Duration of one pipeline stage (stt, llm, tts) by provider',
+    'llm_latency_seconds': 'LLM backend latency: time to first token when streamed, full reply otherwise',
+    'errors_total': 'Failed stage calls by provider',
+}
+
+_NAME = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    parts = [f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels]
+    return '{' + ','.join(parts) + '}'
+
+
+def _flatten(prefix, value, out):
+    """Numeric leaves of a stats() dict as (metric_name, value) pairs"""
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            _flatten(f"{prefix}_{_NAME.sub('_', str(key))}", inner, out)
+    elif isinstance(value, bool):
+        out.append((prefix, int(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+
+
+def _resident_memory_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=METRICS_PREFIX):
+        """
+        Process-wide histograms, counters and stats() gauges in Prometheus text format
+        prefix: Prepended to every metric name
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._sources = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def time(self, stage, provider):
+        """Time one provider call into stage_seconds; failures also count in errors_total"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc('errors_total', stage=stage, provider=provider)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started, stage=stage, provider=provider)
+
+    def register(self, name, stats):
+        """
+        Expose a component's counters as gauges
+        name: Metric name stem, e.g. 'tts_cache'
+        stats: Function returning a (possibly nested) dict of numbers, e.g. tts_cache.stats
+        """
+        with self._lock:
+            self._sources[name] = stats
+
+    def render(self):
+        """Everything in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = sorted(
+                (key, (h.buckets, list(h.counts), h.total, h.count)) for key, h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+            sources = list(self._sources.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                short = name[len(self.prefix) + 1:]
+                if short in HELP:
+                    lines.append(f"# HELP {name} {HELP[short]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            metric = f"{self.prefix}_{name}"
+            describe(metric, 'histogram')
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{metric}_bucket{_label_text(labels + (('le', bound),))} {bucket_count}")
+            lines.append(f"{metric}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {total:.6f}")
+            lines.append(f"{metric}_count{_label_text(labels)} {count}")
+
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            describe(metric, 'counter')
+            lines.append(f"{metric}{_label_text(labels)} {value}")
+
+        for name, stats in sources:
+            gauges = []
+            try:
+                _flatten(f"{self.prefix}_{name}", stats(), gauges)
+            except Exception as e:
+                print(f"⚠️  Metrics source {name} failed: {e}")
+            for metric, value in gauges:
+                describe(metric, 'gauge')
+                lines.append(f"{metric} {value}")
+
+        memory = _resident_memory_bytes()
+        if memory is not None:
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append(f"process_resident_memory_bytes {memory}")
+        return "\n".join(lines) + "\n"
+
+
+# One registry per process, shared by every tracer and the /metrics endpoint
+metrics = MetricsRegistry()
+
+
+def serve_metrics(port=METRICS_PORT, registry=metrics):
+    """
+    Serve /metrics on a background thread, for processes without a web server (app.py)
+    Returns the server, or None when port is 0
+    """
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics on http://localhost:{port}/metrics")
+    return server
+
+
+class TurnTrace:
+    def __init__(self, tracer, session_id, started=None, **attrs):
+        """
+        Timeline of one conversation turn
+        started: time.monotonic() when the turn began (defaults to now), e.g. at speech final
+        attrs: Extra fields written with the record (transport, utterance length, ...)
+        """
+        self.tracer = tracer
+        self.session_id = session_id
+        self.started = started if started is not None else time.monotonic()
+        self.wall_started = time.time() - (time.monotonic() - self.started)
+        self.attrs = attrs
+        self.marks = {}
+        self.spans = []
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def _offset(self):
+        return time.monotonic() - self.started
+
+    def mark(self, name, provider=None):
+        """Record the first time the turn reaches a milestone; later calls are ignored"""
+        offset = self._offset()
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = (offset, provider)
+
+    @contextmanager
+    def span(self, name, provider=None):
+        """
+        Time a stage of this turn for the JSON line (provider calls feed histograms via metrics.time)
+        The yielded dict may be updated inside the block, e.g. span['provider'] = ...
+        """
+        span = {'name': name, 'provider': provider}
+        start = self._offset()
+        try:
+            yield span
+        except Exception as e:
+            span['error'] = str(e)
+            raise
+        finally:
+            span['start'] = start
+            span['duration'] = self._offset() - start
+            with self._lock:
+                self.spans.append(span)
+
+    def timed(self, chunks, first, last, provider=None):
+        """
+        Pass an iterator through, marking its first item and its end
+        provider: Function called once the first item arrives, returning the provider name
+        """
+        seen = False
+        for chunk in chunks:
+            if not seen:
+                seen = True
+                self.mark(first, provider() if provider else None)
+            yield chunk
+        self.mark(last, provider() if provider and seen else None)
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self, **attrs):
+        """Close the turn: observe histograms and append the JSON line"""
+        total = self._offset()
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self.attrs.update(attrs)
+            marks = dict(self.marks)
+            spans = list(self.spans)
+        self.tracer.record(self, total, marks, spans)
+
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, registry=metrics):
+        """
+        Creates turn traces and exports finished ones
+        path: JSON lines file; empty or None keeps traces in metrics only
+        registry: MetricsRegistry receiving the histograms
+        """
+        self.path = path
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._turns = 0
+
+    def start_turn(self, session_id, started=None, **attrs):
+        with self._lock:
+            self._turns += 1
+        return TurnTrace(self, session_id, started, **attrs)
+
+    def record(self, turn, total, marks, spans):
+        for name, (offset, provider) in marks.items():
+            labels = {'mark': name}
+            if provider:
+                labels['provider'] = provider
+            self.registry.observe('turn_seconds', offset, **labels)
+        self.registry.observe('turn_seconds', total, mark='turn_end')
+
+        if not self.path:
+            return
+        line = {
+            'ts': datetime.fromtimestamp(turn.wall_started, timezone.utc).isoformat(timespec='milliseconds'),
+            'session': turn.session_id,
+            'total_ms': round(total * 1000, 1),
+            'marks': {name: round(offset * 1000, 1) for name, (offset, _) in sorted(marks.items(), key=lambda m: m[1][0])},
+            'providers': {name: provider for name, (_, provider) in marks.items() if provider},
+            'spans': [
+                dict(
+                    {key: value for key, value in span.items() if key not in ('start', 'duration')},
+                    start_ms=round(span['start'] * 1000, 1),
+                    ms=round(span['duration'] * 1000, 1),
+                )
+                for span in spans
+            ],
+        }
+        line.update(turn.attrs)
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(line) + "\n")
+        except OSError as e:
+            print(f"⚠️  Trace write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'turns': self._turns}
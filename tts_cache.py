@@ -0,0 +1,172 @@
+"""
+TTS audio cache for AI Voice Agent
+Memory LRU in front of an on-disk store so fixed phrases are synthesized once
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_DIR = os.getenv('TTS_CACHE_DIR', '.tts_cache')
+CACHE_MEMORY_ITEMS = int(os.getenv('TTS_CACHE_MEMORY_ITEMS', '256'))
+CACHE_DISK = os.getenv('TTS_CACHE_DISK', 'true').lower() != 'false'
+
+
+def normalize_text(text):
+    """Normalize text so trivially different strings share one cache entry"""
+    text = text.replace("’", "'").replace("‘", "'")
+    text = text.replace("“", '"').replace("”", '"')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class TTSCache:
+    def __init__(self, synthesize, model, memory_items=CACHE_MEMORY_ITEMS, cache_dir=CACHE_DIR, use_disk=CACHE_DISK):
+        """
+        Cache in front of a TTS function
+        synthesize: Function taking text and returning audio bytes (called on a miss, may be None
+                    when the caller synthesizes itself and uses get/put)
+        model: Voice model name, part of the cache key
+        memory_items: Number of clips kept in the in-memory LRU
+        cache_dir: Directory for the on-disk tier
+        use_disk: Set False to keep the cache in memory only
+        """
+        self._synthesize = synthesize
+        self.model = model
+        self.memory_items = memory_items
+        self.cache_dir = cache_dir if use_disk else None
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _key(self, text):
+        raw = f"{self.model}\n{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    def _remember(self, key, audio_data):
+        with self._lock:
+            self._memory[key] = audio_data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, audio_data):
+        # Write to a temp file and rename so concurrent agents never see half a clip
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"⚠️  TTS cache write failed: {e}")
+
+    def get(self, text):
+        """Return cached audio for text, or None on a miss"""
+        key = self._key(text)
+
+        with self._lock:
+            audio_data = self._memory.get(key)
+            if audio_data is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return audio_data
+
+        if self.cache_dir:
+            audio_data = self._read_disk(key)
+            if audio_data:
+                with self._lock:
+                    self.hits_disk += 1
+                self._remember(key, audio_data)
+                return audio_data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, audio_data):
+        """Store freshly synthesized audio in both tiers"""
+        if not audio_data:
+            return
+        key = self._key(text)
+        self._remember(key, audio_data)
+        if self.cache_dir:
+            self._write_disk(key, audio_data)
+
+    def synthesize(self, text):
+        """Return audio for text, synthesizing only on a cache miss"""
+        audio_data = self.get(text)
+        if audio_data is not None:
+            return audio_data
+
+        # A caller already synthesizing the same text (e.g. a speculative reply) shares its result
+        key = self._key(text)
+        with self._lock:
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[key] = threading.Event()
+        if not owner:
+            pending.wait()
+            audio_data = self.get(text)
+            if audio_data is not None:
+                return audio_data
+            return self._synthesize(text)
+
+        try:
+            audio_data = self._synthesize(text)
+            self.put(text, audio_data)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set()
+        return audio_data
+
+    def prewarm(self, phrases, background=True):
+        """Synthesize known fixed phrases ahead of time"""
+        def warm():
+            for phrase in phrases:
+                try:
+                    self.synthesize(phrase)
+                except Exception as e:
+                    print(f"⚠️  TTS cache prewarm failed for '{phrase}': {e}")
+            print(f"🔥 TTS cache warmed with {len(phrases)} phrases ({self.stats()})")
+
+        if background:
+            threading.Thread(target=warm, daemon=True).start()
+        else:
+            warm()
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            hits = self.hits_memory + self.hits_disk
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_items': len(self._memory),
+            }
@@ -0,0 +1,105 @@
+"""
+Streaming LLM-to-TTS pipeline for AI Voice Agent
+Cuts sentences out of a token stream and synthesizes them concurrently ahead of playback
+"""
+
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Same boundary rule as segment_text_by_sentence in console_turn.py
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+# Sentinel pushed through queues to mark the end of a stream
+_END = object()
+# Stands in for the sentence when the sentence source failed; the error rides in its place
+_FAILED = object()
+
+
+def iter_sentences(text_chunks):
+    """
+    Yield complete sentences from an iterator of text chunks
+    text_chunks: Iterable of partial strings, e.g. LLM token deltas
+    """
+    buffer = ""
+    for chunk in text_chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+
+        # Everything up to the last boundary is a finished sentence
+        boundaries = list(SENTENCE_BOUNDARY.finditer(buffer))
+        if not boundaries:
+            continue
+
+        start = 0
+        for boundary in boundaries:
+            sentence = buffer[start:boundary.start()].strip()
+            if sentence:
+                yield sentence
+            start = boundary.end()
+        buffer = buffer[start:]
+
+    # Flush whatever is left once the stream ends
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def stream_tts(sentences, synthesize, max_workers=4, lookahead=2):
+    """
+    Synthesize sentences on a bounded worker pool and yield audio in original order
+    sentences: Iterable of sentences (may be a live generator)
+    synthesize: Function taking text and returning audio bytes
+    max_workers: Maximum number of concurrent TTS requests
+    lookahead: How many finished sentences may wait for playback beyond the pool
+
+    An error from sentences (e.g. the LLM stream failing) is raised to the consumer after the
+    audio before it, so a cut-off reply isn't taken for a complete one
+    """
+    # Futures are queued in submission order, so reading them back keeps the
+    # sentence order while later sentences are still being synthesized
+    pending = queue.Queue(maxsize=max_workers + lookahead)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for sentence in sentences:
+                if stop.is_set():
+                    break
+                pending.put((sentence, executor.submit(synthesize, sentence)))
+        except Exception as e:
+            if not stop.is_set():
+                pending.put((_FAILED, e))
+        finally:
+            pending.put(_END)
+
+    threading.Thread(target=producer, daemon=True).start()
+
+    try:
+        while True:
+            item = pending.get()
+            if item is _END:
+                break
+            sentence, future = item
+            if sentence is _FAILED:
+                raise future
+            try:
+                audio_data = future.result()
+            except Exception as e:
+                print(f"❌ TTS error for '{sentence}': {e}")
+                continue
+            if audio_data:
+                yield sentence, audio_data
+    finally:
+        # Consumer went away early; drop queued work and let the producer exit
+        stop.set()
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _END and item[0] is not _FAILED:
+                item[1].cancel()
+        executor.shutdown(wait=False)
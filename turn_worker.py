@@ -0,0 +1,70 @@
+"""
+Conversation turn worker for AI Voice Agent
+The Deepgram transcript callback only enqueues utterances; LLM, TTS and playback run on
+one dedicated worker thread so the websocket receive loop never stalls
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TurnWorker:
+    def __init__(self, handler, name="turn"):
+        """
+        Single-worker turn queue
+        handler: Function (utterance, cancelled) that runs one turn; should return early
+                 once the cancelled event is set
+        name: Thread name prefix
+        """
+        self.handler = handler
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._cancelled = None
+        self.submitted = 0
+        self.coalesced = 0
+
+    def submit(self, utterance, cancelled):
+        """
+        Queue an utterance and return immediately
+        Utterances that arrive before the worker picks up the previous one are merged into
+        a single turn, so the caller gets one reply to everything they said
+        """
+        with self._lock:
+            self.submitted += 1
+            if self._pending:
+                self.coalesced += 1
+            self._pending.append(utterance)
+            self._cancelled = cancelled
+            schedule = len(self._pending) == 1
+        if schedule:
+            self._executor.submit(self._run)
+
+    def _run(self):
+        with self._lock:
+            utterances, cancelled = self._pending, self._cancelled
+            self._pending, self._cancelled = [], None
+        if not utterances:
+            # close() dropped the turn this run was scheduled for
+            return
+        if len(utterances) > 1:
+            print(f"🧩 Merged {len(utterances)} utterances into one turn")
+        try:
+            self.handler(" ".join(utterances), cancelled)
+        except Exception as e:
+            print(f"❌ Turn error: {e}")
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'pending': len(self._pending),
+            }
+
+    def close(self):
+        """Drop queued turns and let the running one finish in the background"""
+        with self._lock:
+            self._pending, self._cancelled = [], None
+        self._executor.shutdown(wait=False, cancel_futures=True)
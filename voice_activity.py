@@ -0,0 +1,153 @@
+"""
+Voice activity gate for AI Voice Agent
+Drops silent or near-silent clips before they are sent to speech-to-text
+WAV clips are decoded with the standard library; WebM/Opus and MP4 browser clips need
+PyAV (pip install av), and webrtcvad (pip install webrtcvad) sharpens the speech check
+"""
+
+import io
+import os
+import threading
+import wave
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() != 'false'
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '-45'))    # frame level that can count as speech
+VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', '6'))            # ... and must stand this far above the clip's noise floor
+VAD_MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', '120'))    # total speech needed to forward a clip
+VAD_FRAME_MS = 30
+VAD_SAMPLE_RATE = 16000
+
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import webrtcvad
+    _webrtc = webrtcvad.Vad(2)
+except ImportError:
+    _webrtc = None
+
+
+def decode_pcm(audio_data):
+    """
+    Decode a clip to mono float samples
+    Returns (samples, sample_rate), or None when the format can't be decoded here
+    """
+    if audio_data[:4] == b'RIFF':
+        try:
+            with wave.open(io.BytesIO(audio_data)) as wav:
+                if wav.getsampwidth() != 2:
+                    return None
+                channels = wav.getnchannels()
+                samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+                samples = samples.astype(np.float32) / 32768.0
+                if channels > 1:
+                    samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+                return samples, wav.getframerate()
+        except (wave.Error, EOFError):
+            return None
+
+    if av is None:
+        return None
+    try:
+        with av.open(io.BytesIO(audio_data)) as container:
+            resampler = av.AudioResampler(format='s16', layout='mono', rate=VAD_SAMPLE_RATE)
+            chunks = []
+            for frame in container.decode(audio=0):
+                for resampled in resampler.resample(frame):
+                    chunks.append(resampled.to_ndarray().reshape(-1))
+        if not chunks:
+            return None
+        return np.concatenate(chunks).astype(np.float32) / 32768.0, VAD_SAMPLE_RATE
+    except Exception:
+        return None
+
+
+def frame_levels_db(samples, sample_rate):
+    """RMS level of each VAD frame in dBFS"""
+    frame = int(sample_rate * VAD_FRAME_MS / 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0)
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def has_speech(samples, sample_rate):
+    """True if enough frames are loud, stand out from the noise floor and (with webrtcvad) sound voiced"""
+    levels = frame_levels_db(samples, sample_rate)
+    if len(levels) == 0:
+        return False
+
+    noise_floor = np.percentile(levels, 10)
+    speech = (levels > VAD_THRESHOLD_DB) & (levels > noise_floor + VAD_MARGIN_DB)
+
+    if _webrtc is not None and sample_rate in (8000, 16000, 32000, 48000):
+        frame = int(sample_rate * VAD_FRAME_MS / 1000)
+        pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes()
+        voiced = [
+            _webrtc.is_speech(pcm[i * frame * 2:(i + 1) * frame * 2], sample_rate)
+            for i in range(len(levels))
+        ]
+        speech &= np.array(voiced)
+
+    return int(speech.sum()) * VAD_FRAME_MS >= VAD_MIN_SPEECH_MS
+
+
+class VoiceActivityGate:
+    def __init__(self, name, enabled=VAD_ENABLED, report_every=10):
+        """
+        Counting gate in front of an STT call
+        name: Label for log lines (e.g. 'wake word')
+        enabled: Set False to forward everything
+        report_every: Print a summary after this many suppressed clips
+        """
+        self.name = name
+        self.enabled = enabled
+        self.report_every = report_every
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.suppressed = 0
+        self.undecoded = 0
+
+    def check(self, audio_data):
+        """True if the clip should go to STT; clips that can't be decoded are let through"""
+        if not self.enabled:
+            return True
+
+        decoded = decode_pcm(audio_data)
+        if decoded is None:
+            with self._lock:
+                self.undecoded += 1
+                self.passed += 1
+            return True
+
+        if has_speech(*decoded):
+            with self._lock:
+                self.passed += 1
+            return True
+
+        with self._lock:
+            self.suppressed += 1
+            report = self.suppressed % self.report_every == 0
+        if report:
+            print(f"🔇 {self.name}: skipped {self.suppressed} silent clips ({self.stats()})")
+        return False
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            total = self.passed + self.suppressed
+            return {
+                'passed': self.passed,
+                'suppressed': self.suppressed,
+                'undecoded': self.undecoded,
+                'suppressed_rate': round(self.suppressed / total, 3) if total else 0.0,
+            }
@@ -3,7 +3,6 @@ Wake Word Detection for AI Voice Agent
 Adds "Hey James" wake word functionality
 """
 
-import pvporcupine
 import pyaudio
 import struct
 import threading
@@ -37,6 +36,7 @@ class WakeWordDetector:
             
         try:
             # Initialize Porcupine wake word engine
+            import pvporcupine
             self.porcupine = pvporcupine.create(
                 access_key=self.access_key,
                 keywords=self.wake_words
@@ -92,6 +92,81 @@ class WakeWordDetector:
                     print(f"❌ Wake word detection error: {e}")
                 break
 
+# On-device alternative: no access key and no audio leaves the machine
+class LocalWakeWordDetector:
+    def __init__(self, wake_word_callback, template_dir=None, spotter=None):
+        """
+        Local wake word detector (MFCC + DTW against your own enrolled recordings)
+        wake_word_callback: Function to call when wake word is detected
+        template_dir: Folder of samples recorded with `python keyword_spotter.py enroll`
+        spotter: Already loaded KeywordSpotter to share between detectors
+        """
+        self.wake_word_callback = wake_word_callback
+        self.template_dir = template_dir
+        self.spotter = spotter
+        self.is_listening = False
+        self.audio = None
+        self.audio_stream = None
+    
+    def start_listening(self):
+        """Start listening for the wake word"""
+        if self.is_listening:
+            return
+        
+        try:
+            import keyword_spotter
+            if self.spotter is None:
+                self.spotter = keyword_spotter.KeywordSpotter.from_directory(
+                    self.template_dir or keyword_spotter.WAKE_WORD_TEMPLATES
+                )
+            
+            self.audio = pyaudio.PyAudio()
+            self.audio_stream = self.audio.open(
+                rate=keyword_spotter.SAMPLE_RATE,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                frames_per_buffer=keyword_spotter.HOP_SAMPLES
+            )
+            
+            self.is_listening = True
+            print("🎤 Local wake word detection started. Say 'Hey James' to activate!")
+            
+            threading.Thread(target=self._listen_for_wake_word, daemon=True).start()
+            
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+        except Exception as e:
+            print(f"❌ Local wake word detection failed to start: {e}")
+    
+    def stop_listening(self):
+        """Stop listening for the wake word"""
+        self.is_listening = False
+        if self.audio_stream:
+            self.audio_stream.close()
+            self.audio_stream = None
+        if self.audio:
+            self.audio.terminate()
+            self.audio = None
+        print("🔇 Local wake word detection stopped")
+    
+    def _listen_for_wake_word(self):
+        """Feed microphone frames to the spotter; nothing is sent over the network"""
+        from keyword_spotter import HOP_SAMPLES
+        stream = self.spotter.stream()
+        while self.is_listening:
+            try:
+                pcm = self.audio_stream.read(HOP_SAMPLES, exception_on_overflow=False)
+                
+                if stream.process(pcm):
+                    print(f"🎯 Wake word detected locally (score {stream.last_score:.2f})")
+                    self.wake_word_callback()
+                    
+            except Exception as e:
+                if self.is_listening:
+                    print(f"❌ Wake word detection error: {e}")
+                break
+
 # Alternative: Simple keyword detection using speech recognition
 class SimpleWakeWordDetector:
     def __init__(self, wake_word_callback, wake_words=None):